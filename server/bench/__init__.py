@@ -0,0 +1,7 @@
+"""Reproducible throughput benchmarks without network access.
+
+``python -m server.bench.run`` starts :mod:`server.bench.fake_cdn` and the API
+server (with :mod:`server.bench.fake_extractor` in place of yt-dlp's network
+extraction) as local subprocesses, drives each endpoint at increasing
+concurrency and writes the results as JSON.
+"""
@@ -0,0 +1,187 @@
+"""Local stand-in for media CDNs.
+
+A small ASGI app serving deterministic bodies with the behaviours the proxy
+has to cope with. Query parameters select them per URL:
+
+- ``/media/<name>?size=N``: ``N`` bytes, honouring ``Range`` (206/416)
+- ``rate=B``: throttle each response to ``B`` bytes per second
+- ``ttfb=S``: wait ``S`` seconds before sending the response headers
+- ``antibot=1``: answer 403 unless the request carries the ``sec-ch-ua``
+  header of a real browser, which ``curl_cffi``'s impersonation sends and
+  plain httpx does not, so every download goes 403 first, then OK
+- ``/hls/<name>.m3u8?segments=N&segment_size=B``: a VOD media playlist whose
+  segments are ``/hls/<name>/<i>.ts`` (the other parameters are passed on)
+- ``/subs/<name>.vtt``: a short WebVTT file
+
+Run it on its own with ``python -m server.bench.fake_cdn --port 8900``.
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlencode
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_SIZE = 8 * 1024 * 1024
+
+# Every body is a slice of this repeating pattern, so any range can be checked
+_PATTERN = bytes(range(256)) * (CHUNK_SIZE // 256)
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def body_slice(start: int, end: int) -> bytes:
+    """Bytes ``start``..``end`` (inclusive) of every fake media body."""
+    out = bytearray()
+    position = start
+    while position <= end:
+        offset = position % len(_PATTERN)
+        take = min(len(_PATTERN) - offset, end - position + 1)
+        out += _PATTERN[offset : offset + take]
+        position += take
+    return bytes(out)
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) of a single ``Range`` header; None to serve the whole body.
+
+    Raises ValueError for unsatisfiable ranges.
+    """
+    match = _RANGE_RE.match((value or "").strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+def _param(query: Dict[str, list], name: str, default: float) -> float:
+    try:
+        return float(query[name][0])
+    except (KeyError, IndexError, ValueError):
+        return default
+
+
+class FakeCDN:
+    """The ASGI app; ``requests`` counts responses per route and status."""
+
+    def __init__(self):
+        self.requests: Dict[str, int] = defaultdict(int)
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        path = scope["path"]
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers") or ()}
+
+        ttfb = _param(query, "ttfb", 0.0)
+        if ttfb > 0:
+            await asyncio.sleep(ttfb)
+
+        if path == "/stats":
+            await self._respond(send, 200, "application/json", json.dumps(self.requests).encode())
+            return
+        route = path.split("/")[1] if path.count("/") >= 2 else ""
+        if _param(query, "antibot", 0) and "sec-ch-ua" not in headers:
+            self.requests[f"{route} 403"] += 1
+            await self._respond(send, 403, "text/plain", b"Forbidden")
+            return
+
+        if route == "media":
+            await self._media(send, query, headers, int(_param(query, "size", DEFAULT_SIZE)))
+        elif route == "hls" and path.endswith(".m3u8"):
+            await self._playlist(send, path, query)
+        elif route == "hls" and path.endswith(".ts"):
+            await self._media(send, query, headers, int(_param(query, "size", 512 * 1024)), "video/mp2t")
+        elif route == "subs":
+            body = b"WEBVTT\n\n00:00:00.000 --> 00:00:02.000\nHello\n\n00:00:02.000 --> 00:00:04.000\nWorld\n"
+            await self._respond(send, 200, "text/vtt", body)
+        else:
+            await self._respond(send, 404, "text/plain", b"Not found")
+            return
+        self.requests[route] += 1
+
+    async def _respond(self, send, status: int, content_type: str, body: bytes, extra: Optional[list] = None) -> None:
+        headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers + (extra or [])})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _media(self, send, query, headers, size: int, content_type: str = "video/mp4") -> None:
+        try:
+            span = parse_range(headers.get("range"), size)
+        except ValueError:
+            await self._respond(send, 416, "text/plain", b"", [(b"content-range", f"bytes */{size}".encode())])
+            return
+        start, end = span if span is not None else (0, size - 1)
+        response_headers = [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(end - start + 1).encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if span is not None:
+            response_headers.append((b"content-range", f"bytes {start}-{end}/{size}".encode()))
+        await send({"type": "http.response.start", "status": 206 if span else 200, "headers": response_headers})
+
+        rate = _param(query, "rate", 0.0)
+        started = time.perf_counter()
+        sent = 0
+        position = start
+        while position <= end:
+            chunk = body_slice(position, min(end, position + CHUNK_SIZE - 1))
+            position += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": position <= end})
+            sent += len(chunk)
+            if rate > 0:
+                ahead = sent / rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+        if start > end:
+            await send({"type": "http.response.body", "body": b""})
+
+    async def _playlist(self, send, path: str, query) -> None:
+        segments = int(_param(query, "segments", 8))
+        name = path[len("/hls/") : -len(".m3u8")]
+        passed = urlencode({k: v[0] for k, v in query.items() if k in {"rate", "antibot"}})
+        segment_query = f"size={int(_param(query, 'segment_size', 512 * 1024))}" + (f"&{passed}" if passed else "")
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:4", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for i in range(segments):
+            lines += ["#EXTINF:4.0,", f"/hls/{name}/{i}.ts?{segment_query}"]
+        lines.append("#EXT-X-ENDLIST")
+        await self._respond(send, 200, "application/vnd.apple.mpegurl", ("\n".join(lines) + "\n").encode())
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args(argv)
+    # curl_cffi asks for an h2c upgrade on every request, which uvicorn warns about
+    uvicorn.run(FakeCDN(), host=args.host, port=args.port, log_level="error", lifespan="on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Replays recorded yt-dlp info dicts instead of extracting from the network.
+
+:func:`install` replaces ``YoutubeDL.extract_info`` so that
+``https://bench.invalid/watch?v=<name>`` returns the recording ``<name>`` from
+``recordings.json`` with ``{cdn}`` in every string replaced by the fake CDN's
+base URL. Everything around it (the ``YoutubeDL`` pool, the extraction cache,
+header merging, format selection in the endpoints) runs as in production.
+"""
+
+import copy
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+RECORDINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings.json")
+SOURCE_HOST = "bench.invalid"
+
+
+def source_url(name: str) -> str:
+    return f"https://{SOURCE_HOST}/watch?v={name}"
+
+
+def load_recordings(path: str = RECORDINGS_PATH) -> Dict[str, dict]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def render(value: Any, cdn: str) -> Any:
+    """Copy of ``value`` with ``{cdn}`` substituted in every string."""
+    if isinstance(value, str):
+        return value.replace("{cdn}", cdn)
+    if isinstance(value, dict):
+        return {k: render(v, cdn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [render(v, cdn) for v in value]
+    return copy.copy(value)
+
+
+def install(cdn: str, recordings: Optional[Dict[str, dict]] = None) -> Callable[[], None]:
+    """Patch ``YoutubeDL.extract_info``; returns a function undoing it."""
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import DownloadError
+
+    recordings = load_recordings() if recordings is None else recordings
+    rendered = {name: render(info, cdn.rstrip("/")) for name, info in recordings.items()}
+    original = YoutubeDL.extract_info
+
+    def extract_info(self, url, download=True, *args, **kwargs):
+        parsed = urlparse(url)
+        name = (parse_qs(parsed.query).get("v") or [""])[0]
+        if parsed.hostname != SOURCE_HOST or name not in rendered:
+            raise DownloadError(f"ERROR: [bench] No recording for {url}")
+        self.to_screen(f"[bench] {name}: Replaying recorded info")
+        return copy.deepcopy(rendered[name])
+
+    YoutubeDL.extract_info = extract_info
+
+    def uninstall() -> None:
+        YoutubeDL.extract_info = original
+
+    return uninstall
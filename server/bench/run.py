@@ -0,0 +1,257 @@
+"""Drive the API endpoints at increasing concurrency and record the results.
+
+``python -m server.bench.run --levels 1,8,32 --duration 10 --output bench.json``
+
+The fake CDN and the API server run as subprocesses, so the load generator
+does not share their event loops; the server's resident set size is sampled
+from ``/proc`` while each level runs. Each level is a closed loop: every
+client issues its next request as soon as the previous response body has
+been read completely, for ``--duration`` seconds.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from .fake_extractor import source_url
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    params: Dict[str, str] = field(default_factory=dict)
+    json: Optional[dict] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "extract": Scenario("POST", "/api/extract", json={"url": source_url("progressive")}),
+    "download": Scenario("GET", "/api/download", {"source": source_url("progressive"), "format_id": "18"}),
+    "download_range": Scenario(
+        "GET", "/api/download", {"source": source_url("progressive"), "format_id": "137"}, headers={"Range": "bytes=0-1048575"}
+    ),
+    "download_accelerated": Scenario(
+        "GET", "/api/download", {"source": source_url("progressive"), "format_id": "137", "accelerate": "true"}
+    ),
+    "download_throttled": Scenario("GET", "/api/download", {"source": source_url("throttled"), "format_id": "18"}),
+    "download_antibot": Scenario("GET", "/api/download", {"source": source_url("antibot"), "format_id": "18"}),
+    "download_slow_ttfb": Scenario("GET", "/api/download", {"source": source_url("slow_ttfb"), "format_id": "18"}),
+    "download_hls": Scenario("GET", "/api/download", {"source": source_url("hls"), "format_id": "hls-720"}),
+    "subtitle": Scenario("GET", "/api/subtitle", {"source": source_url("progressive"), "lang": "en"}),
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (``q`` in 0..100) of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(-(-q * len(ordered) // 100))))
+    return ordered[rank - 1]
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status", "r") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not become ready")
+            await asyncio.sleep(0.1)
+
+
+async def run_level(base_url: str, scenario: Scenario, concurrency: int, duration: float, pid: Optional[int]) -> dict:
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    errors: Dict[str, int] = {}
+    received = 0
+    peak_rss = rss_bytes(pid) if pid else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def worker() -> None:
+            nonlocal received
+            while time.perf_counter() < deadline:
+                sent_at = time.perf_counter()
+                try:
+                    async with client.stream(
+                        scenario.method, scenario.path, params=scenario.params, json=scenario.json, headers=scenario.headers
+                    ) as response:
+                        first_byte = None
+                        async for chunk in response.aiter_raw():
+                            if first_byte is None:
+                                first_byte = time.perf_counter()
+                            received += len(chunk)
+                        status = response.status_code
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                done = time.perf_counter()
+                if status >= 400:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+                    continue
+                latencies.append(done - sent_at)
+                ttfbs.append((first_byte or done) - sent_at)
+
+        async def sample_rss() -> None:
+            nonlocal peak_rss
+            while True:
+                await asyncio.sleep(0.2)
+                rss = rss_bytes(pid)
+                if rss is not None:
+                    peak_rss = max(peak_rss or 0, rss)
+
+        sampler = asyncio.ensure_future(sample_rss()) if pid else None
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            if sampler is not None:
+                sampler.cancel()
+        elapsed = time.perf_counter() - started
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "mb_per_second": round(received / elapsed / 1e6, 2),
+        "latency_ms": {"p50": ms(percentile(latencies, 50)), "p99": ms(percentile(latencies, 99))},
+        "ttfb_ms": {"p50": ms(percentile(ttfbs, 50)), "p99": ms(percentile(ttfbs, 99))},
+        "rss_bytes": rss_bytes(pid) if pid else None,
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def _start(args: List[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=REPO_ROOT, env=env)
+
+
+async def run(scenarios: List[str], levels: List[int], duration: float, server_env: Dict[str, str]) -> dict:
+    cdn_port, api_port = _free_port(), _free_port()
+    cdn_url = f"http://127.0.0.1:{cdn_port}"
+    api_url = f"http://127.0.0.1:{api_port}"
+    env = {**os.environ, **server_env}
+    cdn = _start(["server.bench.fake_cdn", "--port", str(cdn_port)], env)
+    api = _start(["server.bench.serve", "--port", str(api_port), "--cdn", cdn_url], env)
+    results = []
+    try:
+        await _wait_until_ready(f"{cdn_url}/stats")
+        await _wait_until_ready(f"{api_url}/api/ready")
+        for name in scenarios:
+            for level in levels:
+                result = await run_level(api_url, SCENARIOS[name], level, duration, api.pid)
+                result["scenario"] = name
+                results.append(result)
+                print(
+                    f"{name:<22} c={level:<4} {result['requests_per_second']:>9.2f} req/s "
+                    f"{result['mb_per_second']:>9.2f} MB/s  p50={result['latency_ms']['p50']} ms "
+                    f"p99={result['latency_ms']['p99']} ms  rss={(result['peak_rss_bytes'] or 0) / 2**20:.0f} MiB"
+                    + (f"  errors={result['errors']}" if result["errors"] else ""),
+                    file=sys.stderr,
+                )
+    finally:
+        for proc in (api, cdn):
+            proc.terminate()
+        for proc in (api, cdn):
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "duration": duration,
+            "levels": levels,
+            "server_env": server_env,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario and level")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument(
+        "--extract-cache", action="store_true", help="keep the extraction cache on (off so every request extracts)"
+    )
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra server environment")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    server_env = {"AOI_WARMUP": "1", "AOI_TRACING": "0"}
+    if not args.extract_cache:
+        server_env["AOI_EXTRACT_CACHE_TTL"] = "0"
+    for item in args.env:
+        name, _, value = item.partition("=")
+        server_env[name] = value
+    with tempfile.TemporaryDirectory(prefix="aoi-bench-") as scratch:
+        server_env.setdefault("AOI_USERS_DB", os.path.join(scratch, "users.db"))
+        report = asyncio.run(run(scenarios, levels, args.duration, server_env))
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""The API server with the fake extractor installed, for benchmark runs.
+
+``python -m server.bench.serve --port 8901 --cdn http://127.0.0.1:8900``
+"""
+
+import argparse
+
+from .fake_extractor import install
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--cdn", required=True, help="base URL of the running fake CDN")
+    args = parser.parse_args(argv)
+    install(args.cdn)
+    uvicorn.run("server.main:app", host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Shared, pre-parsed cookie jar for the configured Netscape cookie file.
+
+Without this, every ``YoutubeDL`` instance parses the cookie file again and
+every download scans the whole jar to build its ``Cookie`` header. The file is
+now parsed once per change, indexed by domain, and handed to extractions as a
+cheap copy. Lookups walk the suffixes of the request host, so they cost
+O(domain depth) instead of O(cookies).
+"""
+
+import copy
+import logging
+import os
+import threading
+import time
+import weakref
+from http.cookiejar import Cookie, CookieJar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _host_suffixes(host: str) -> List[str]:
+    """``a.b.example.com`` -> ``[a.b.example.com, b.example.com, example.com]``."""
+    host = (host or "").lower().rstrip(".")
+    parts = host.split(".")
+    return [".".join(parts[i:]) for i in range(len(parts) - 1)]
+
+
+class DomainIndex:
+    """Cookies grouped by their domain (without the leading dot)."""
+
+    def __init__(self, cookies):
+        self._by_domain: Dict[str, List[Cookie]] = {}
+        self.size = 0
+        for c in cookies:
+            domain = (getattr(c, "domain", None) or "").lstrip(".").lower()
+            if not domain or "." not in domain:
+                continue
+            self._by_domain.setdefault(domain, []).append(c)
+            self.size += 1
+
+    def cookies_for_host(self, host: str, now: Optional[float] = None) -> List[Cookie]:
+        """Unexpired cookies whose domain is ``host`` or one of its parents."""
+        now = time.time() if now is None else now
+        result: List[Cookie] = []
+        for suffix in _host_suffixes(host):
+            for c in self._by_domain.get(suffix, ()):
+                if c.expires is not None and c.expires <= now:
+                    continue
+                result.append(c)
+        return result
+
+    def cookie_header(self, host: str) -> Optional[str]:
+        pairs = [f"{c.name}={c.value}" for c in self.cookies_for_host(host)]
+        return "; ".join(pairs) if pairs else None
+
+
+_jar_indexes: "weakref.WeakKeyDictionary[CookieJar, DomainIndex]" = weakref.WeakKeyDictionary()
+_jar_indexes_lock = threading.Lock()
+
+
+def index_for_jar(jar) -> DomainIndex:
+    """Return a domain index of ``jar``, built on first use.
+
+    Meant for jars that no longer change, such as the jar an extraction
+    returned and the extraction cache keeps for later downloads.
+    """
+    try:
+        with _jar_indexes_lock:
+            index = _jar_indexes.get(jar)
+    except TypeError:
+        return DomainIndex(jar)
+    if index is None:
+        index = DomainIndex(jar)
+        with _jar_indexes_lock:
+            _jar_indexes[jar] = index
+    return index
+
+
+def copy_jar(jar: CookieJar, factory: Callable[[], CookieJar]) -> CookieJar:
+    """Copy ``jar`` so an extraction may add cookies without touching the shared one."""
+    clone = factory()
+    for c in jar:
+        clone.set_cookie(copy.copy(c))
+    return clone
+
+
+def _load_netscape(path: str) -> CookieJar:
+    from yt_dlp.cookies import YoutubeDLCookieJar
+
+    # yt-dlp's loader understands the #HttpOnly_ prefix browsers export and
+    # treats expires=0 as a session cookie; expiry is enforced at lookup time
+    jar = YoutubeDLCookieJar(path)
+    jar.load(ignore_discard=True, ignore_expires=True)
+    return jar
+
+
+class CookieSnapshot:
+    def __init__(self, path: str, jar: CookieJar, signature: Tuple[int, int]):
+        self.path = path
+        self.jar = jar
+        self.signature = signature
+        self.index = DomainIndex(jar)
+        self.loaded_at = time.time()
+
+    def copy_jar(self) -> CookieJar:
+        from yt_dlp.cookies import YoutubeDLCookieJar
+
+        return copy_jar(self.jar, YoutubeDLCookieJar)
+
+
+class SharedCookies:
+    """The first existing cookie file among ``candidates``, reloaded when it changes.
+
+    The file system is checked at most every ``check_interval`` seconds, so a
+    request normally costs a clock read.
+    """
+
+    def __init__(self, candidates: Callable[[], Sequence[str]], check_interval: float = 2.0):
+        self._candidates = candidates
+        self.check_interval = check_interval
+        self._snapshot: Optional[CookieSnapshot] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.load_errors = 0
+
+    def _resolve(self) -> Optional[Tuple[str, Tuple[int, int]]]:
+        for path in self._candidates():
+            if not path:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return path, (st.st_mtime_ns, st.st_size)
+        return None
+
+    def current(self) -> Optional[CookieSnapshot]:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self._snapshot
+            resolved = self._resolve()
+            snapshot = self._snapshot
+            if resolved is None:
+                snapshot = None
+            elif snapshot is None or (snapshot.path, snapshot.signature) != resolved:
+                path, signature = resolved
+                try:
+                    snapshot = CookieSnapshot(path, _load_netscape(path), signature)
+                    self.loads += 1
+                    logger.info("Loaded %d cookies from %s", snapshot.index.size, path)
+                except Exception as e:
+                    self.load_errors += 1
+                    logger.warning("Failed to load cookie file %s: %s", path, e)
+                    snapshot = None
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._checked_at = float("-inf")
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "path": snapshot.path if snapshot else None,
+            "cookies": snapshot.index.size if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+        }
+
+
+_shared_by_path: Dict[str, SharedCookies] = {}
+_shared_by_path_lock = threading.Lock()
+
+
+def shared_cookies_for(path: str) -> SharedCookies:
+    """Process-wide :class:`SharedCookies` for a fixed file path."""
+    with _shared_by_path_lock:
+        shared = _shared_by_path.get(path)
+        if shared is None:
+            shared = _shared_by_path[path] = SharedCookies(lambda: (path,))
+        return shared
+
+
+def ydl_with_shared_cookies(youtube_dl_cls, ydl_opts: dict, shared: Optional[SharedCookies] = None):
+    """Build a YoutubeDL that uses a copy of the shared jar instead of reading ``cookiefile``.
+
+    ``cookiefile`` is dropped from the options so yt-dlp neither parses the
+    file again nor writes it back on close.
+    """
+    cookiefile = ydl_opts.get("cookiefile")
+    if not cookiefile:
+        return youtube_dl_cls(ydl_opts)
+    snapshot = (shared or shared_cookies_for(cookiefile)).current()
+    if snapshot is None or snapshot.path != cookiefile:
+        return youtube_dl_cls(ydl_opts)
+    opts = {k: v for k, v in ydl_opts.items() if k != "cookiefile"}
+    ydl = youtube_dl_cls(opts)
+    # YoutubeDL.cookiejar is a cached_property; seed it before first use
+    ydl.__dict__["cookiejar"] = snapshot.copy_jar()
+    return ydl
@@ -0,0 +1,269 @@
+"""In-process cache of yt-dlp extraction results.
+
+Entries are keyed by a normalized source URL plus the subset of yt-dlp options
+that influence what an extraction returns. Every endpoint resolves its target
+format from ``info["formats"]`` itself, so the format selector is deliberately
+not part of the key: a preview via ``/api/extract`` can be reused by the
+following ``/api/download`` for any of the listed formats.
+
+Signed CDN URLs expire, so an entry never outlives the earliest expiry found in
+the media URLs it contains (minus a safety margin).
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Query parameters that only carry tracking/attribution data
+_TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "si", "feature", "_r", "_t"}
+
+# yt-dlp options that change the result of an extraction
+_KEY_OPTS = (
+    "http_headers",
+    "cookiefile",
+    "proxy",
+    "source_address",
+    "extractor_args",
+    "noplaylist",
+    "extract_flat",
+    "playlist_items",
+)
+
+# Unix-timestamp expiry parameters used by common CDNs
+# (googlevideo: expire, TikTok: x-expires, CloudFront: Expires)
+_EXPIRY_PARAMS = {"expire", "expires", "x-expires"}
+# Facebook / Instagram CDNs encode expiry as hex seconds in "oe"
+_HEX_EXPIRY_PARAMS = {"oe"}
+# Path-style expiry (googlevideo manifests) and Akamai tokens (hdnts=exp=...)
+_PATH_EXPIRY_RE = re.compile(r"/expire/(\d{9,11})(?:/|$)")
+_TOKEN_EXPIRY_RE = re.compile(r"(?:^|[~&])exp=(\d{9,11})")
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_source_url(url: str) -> str:
+    """Canonicalize a source URL so equivalent links share a cache entry."""
+    try:
+        parsed = urlparse((url or "").strip())
+    except Exception:
+        return url
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    netloc = host
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    if port and _DEFAULT_PORTS.get(scheme) != port:
+        netloc = f"{host}:{port}"
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k not in _TRACKING_PARAMS and not k.lower().startswith("utm_")
+    ]
+    query.sort()
+    return urlunparse((scheme, netloc, parsed.path or "/", parsed.params, urlencode(query), ""))
+
+
+def extraction_cache_key(url: str, ydl_opts: dict) -> str:
+    """Build the cache key for a source URL and its yt-dlp options."""
+    relevant = {name: ydl_opts.get(name) for name in _KEY_OPTS if name in ydl_opts}
+    return normalize_source_url(url) + "|" + json.dumps(relevant, sort_keys=True, default=str)
+
+
+def _parse_expiry(url: str) -> Optional[float]:
+    try:
+        parsed = urlparse(url)
+    except Exception:
+        return None
+    found = []
+    for k, v in parse_qsl(parsed.query, keep_blank_values=True):
+        name = k.lower()
+        try:
+            if name in _EXPIRY_PARAMS:
+                found.append(float(v))
+            elif name in _HEX_EXPIRY_PARAMS:
+                found.append(float(int(v, 16)))
+            elif name in {"hdnts", "__token__"}:
+                m = _TOKEN_EXPIRY_RE.search(v)
+                if m:
+                    found.append(float(m.group(1)))
+        except ValueError:
+            continue
+    m = _PATH_EXPIRY_RE.search(parsed.path or "")
+    if m:
+        found.append(float(m.group(1)))
+    # Ignore values that are clearly not unix timestamps
+    found = [ts for ts in found if 1_000_000_000 <= ts <= 10_000_000_000]
+    return min(found) if found else None
+
+
+def _iter_media_urls(info: dict) -> Iterator[str]:
+    if not isinstance(info, dict):
+        return
+    for key in ("url", "manifest_url"):
+        if isinstance(info.get(key), str):
+            yield info[key]
+    for list_key in ("formats", "requested_formats"):
+        for f in info.get(list_key) or []:
+            if isinstance(f, dict):
+                for key in ("url", "manifest_url"):
+                    if isinstance(f.get(key), str):
+                        yield f[key]
+    for subs_key in ("subtitles", "automatic_captions"):
+        subs = info.get(subs_key)
+        if isinstance(subs, dict):
+            for tracks in subs.values():
+                for t in tracks or []:
+                    if isinstance(t, dict) and isinstance(t.get("url"), str):
+                        yield t["url"]
+    entries = info.get("entries")
+    if isinstance(entries, list):
+        for entry in entries:
+            yield from _iter_media_urls(entry)
+
+
+def earliest_url_expiry(info: dict) -> Optional[float]:
+    """Return the earliest expiry timestamp of any signed URL in an info dict."""
+    earliest = None
+    for url in _iter_media_urls(info):
+        ts = _parse_expiry(url)
+        if ts is not None and (earliest is None or ts < earliest):
+            earliest = ts
+    return earliest
+
+
+def _estimate_size(info: dict, cookiejar) -> int:
+    try:
+        size = len(json.dumps(info, default=str))
+    except Exception:
+        size = 64 * 1024
+    try:
+        size += 256 * len(cookiejar or [])
+    except Exception:
+        pass
+    return size
+
+
+class ExtractionCache:
+    """Byte-bounded LRU cache of ``(info, cookiejar)`` extraction results.
+
+    Cached info dicts are shared between callers and must be treated as
+    read-only.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, expiry_margin_seconds: float = 60.0):
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.expiry_margin_seconds = max(0.0, float(expiry_margin_seconds))
+        self._entries: "OrderedDict[str, Tuple[float, int, Any, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.uncacheable = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def __contains__(self, key: str) -> bool:
+        """Whether ``key`` holds an unexpired entry (not counted as a lookup)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.time()
+
+    def get(self, key: str):
+        """Return the cached ``(info, cookiejar)`` pair or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, info, cookiejar = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return info, cookiejar
+
+    def measure(self, info: dict, cookiejar=None) -> Optional[Tuple[int, Optional[float]]]:
+        """Return ``(size, url_expiry)`` of a result for :meth:`put`; None when disabled.
+
+        Serializes the whole info dict and scans every format URL, which takes
+        tens of milliseconds for large dicts; call it off the event loop.
+        """
+        if not self.enabled or not isinstance(info, dict):
+            return None
+        return _estimate_size(info, cookiejar), earliest_url_expiry(info)
+
+    def put(self, key: str, info: dict, cookiejar=None, measured: Optional[Tuple[int, Optional[float]]] = None) -> bool:
+        """Store an extraction result; return whether it was cached.
+
+        ``measured`` is the result of :meth:`measure`, computed here when omitted.
+        """
+        if not self.enabled or not isinstance(info, dict):
+            return False
+        size, url_expiry = measured if measured is not None else self.measure(info, cookiejar)
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        if url_expiry is not None:
+            expires_at = min(expires_at, url_expiry - self.expiry_margin_seconds)
+        if expires_at <= now or size > self.max_bytes:
+            with self._lock:
+                self.uncacheable += 1
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (expires_at, size, info, cookiejar)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size, _, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key: str) -> bool:
+        """Drop ``key`` (e.g. its URLs stopped working); return whether it was cached."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._bytes -= entry[1]
+            self.invalidations += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "uncacheable": self.uncacheable,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,305 @@
+"""Extraction backend running yt-dlp in a pool of recyclable worker processes.
+
+yt-dlp parsing is CPU-heavy and GIL-bound; running it in worker processes lets
+extraction throughput scale with cores and keeps it off the shared anyio thread
+limiter. Workers are recycled after a number of tasks or once their resident
+memory crosses a limit. Results cross the process boundary as plain dicts.
+"""
+
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import Cookie, CookieJar
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteExtractionError(Exception):
+    """An extraction failed inside a worker process."""
+
+    def __init__(self, message: str, error_type: str = "Exception"):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def cookies_to_dicts(cookiejar) -> List[dict]:
+    """Serialize a cookie jar into picklable dicts."""
+    result: List[dict] = []
+    for c in cookiejar or []:
+        result.append({
+            "name": c.name,
+            "value": c.value,
+            "domain": c.domain,
+            "path": c.path,
+            "secure": bool(c.secure),
+            "expires": c.expires,
+        })
+    return result
+
+
+def cookiejar_from_dicts(cookies: Sequence[dict]) -> CookieJar:
+    """Rebuild a cookie jar from :func:`cookies_to_dicts` output."""
+    jar = CookieJar()
+    for c in cookies or []:
+        domain = c.get("domain") or ""
+        jar.set_cookie(Cookie(
+            version=0,
+            name=c.get("name"),
+            value=c.get("value"),
+            port=None,
+            port_specified=False,
+            domain=domain,
+            domain_specified=bool(domain),
+            domain_initial_dot=domain.startswith("."),
+            path=c.get("path") or "/",
+            path_specified=True,
+            secure=bool(c.get("secure")),
+            expires=c.get("expires"),
+            discard=c.get("expires") is None,
+            comment=None,
+            comment_url=None,
+            rest={},
+            rfc2109=False,
+        ))
+    return jar
+
+
+_worker_ydl_pool = None
+
+
+def extract_info_plain(url: str, ydl_opts: dict) -> Tuple[dict, List[dict]]:
+    """Default worker task: run yt-dlp and return a JSON-safe info dict and cookies."""
+    global _worker_ydl_pool
+    import yt_dlp
+
+    from .ydl_pool import YoutubeDLPool
+
+    if _worker_ydl_pool is None:
+        # Each worker process keeps its own warm instances
+        _worker_ydl_pool = YoutubeDLPool(yt_dlp.YoutubeDL)
+    with _worker_ydl_pool.checkout(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        return ydl.sanitize_info(info), cookies_to_dicts(getattr(ydl, "cookiejar", None))
+
+
+def _current_rss() -> int:
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        try:
+            import resource
+
+            # ru_maxrss is a peak value (KiB on Linux); better than nothing
+            return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+        except Exception:
+            return 0
+
+
+def _worker_main(conn, task_fn: Callable, max_tasks: int, max_rss_bytes: int, preload: Sequence[str]) -> None:
+    for module_name in preload:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            pass
+    completed = 0
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        url, ydl_opts = task
+        try:
+            info, cookies = task_fn(url, ydl_opts)
+            reply = {"ok": True, "info": info, "cookies": cookies}
+        except BaseException as e:  # noqa: BLE001 - everything is reported to the parent
+            reply = {"ok": False, "error": str(e), "error_type": type(e).__name__}
+        completed += 1
+        rss = _current_rss()
+        retire = bool((max_tasks and completed >= max_tasks) or (max_rss_bytes and rss > max_rss_bytes))
+        reply.update(rss=rss, retire=retire)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send({"ok": False, "error": f"Unserializable result: {e}", "error_type": type(e).__name__,
+                       "rss": rss, "retire": retire})
+        if retire:
+            break
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.tasks = 0
+        self.rss = 0
+
+    def call(self, task) -> dict:
+        self.conn.send(task)
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            raise RemoteExtractionError("Extraction worker exited unexpectedly", "WorkerCrashed")
+
+    def kill(self) -> None:
+        try:
+            self.process.kill()
+        except Exception:
+            pass
+        self.close()
+
+    def close(self, timeout: float = 5.0) -> None:
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        try:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join(timeout)
+        except Exception:
+            pass
+
+
+class ProcessExtractionPool:
+    """Fixed-size pool of extraction worker processes.
+
+    Each worker handles one task at a time. Blocking pipe reads happen on a
+    private thread pool sized to the worker count, so waiting on a worker never
+    takes a token from the anyio default limiter.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_tasks_per_worker: int = 0,
+        max_rss_bytes: int = 0,
+        task_timeout: Optional[float] = None,
+        task_fn: Callable[[str, dict], Tuple[dict, List[dict]]] = extract_info_plain,
+        mp_context: str = "spawn",
+        preload: Sequence[str] = ("yt_dlp",),
+    ):
+        self.size = max(1, int(size))
+        self.max_tasks_per_worker = max(0, int(max_tasks_per_worker))
+        self.max_rss_bytes = max(0, int(max_rss_bytes))
+        self.task_timeout = task_timeout if task_timeout and task_timeout > 0 else None
+        self._task_fn = task_fn
+        self._ctx = multiprocessing.get_context(mp_context)
+        self._preload = tuple(preload)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="aoi-extract-io")
+        self._idle: List[_Worker] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._busy = 0
+        self._closed = False
+        self.spawned = 0
+        self.completed = 0
+        self.failed = 0
+        self.recycled_tasks = 0
+        self.recycled_rss = 0
+        self.crashed = 0
+
+    def _spawn_sync(self) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self._task_fn, self.max_tasks_per_worker, self.max_rss_bytes, self._preload),
+            name="aoi-extract-worker",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self.spawned += 1
+        return _Worker(process, parent_conn)
+
+    async def start(self) -> None:
+        """Spawn every worker up front instead of on first use."""
+        loop = asyncio.get_running_loop()
+        missing = self.size - len(self._idle) - self._busy
+        workers = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self._spawn_sync) for _ in range(max(0, missing)))
+        )
+        self._idle.extend(workers)
+
+    async def run(self, url: str, ydl_opts: dict) -> Tuple[dict, CookieJar]:
+        """Extract ``url`` in a worker process; return ``(info, cookiejar)``."""
+        if self._closed:
+            raise RuntimeError("Extraction pool is closed")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            worker = self._idle.pop() if self._idle else await loop.run_in_executor(self._executor, self._spawn_sync)
+            self._busy += 1
+            try:
+                call = loop.run_in_executor(self._executor, worker.call, (url, ydl_opts))
+                reply = await asyncio.wait_for(call, self.task_timeout)
+            except BaseException as e:
+                # Cancelled, timed out or crashed: the worker state is unknown
+                if isinstance(e, RemoteExtractionError):
+                    self.crashed += 1
+                await loop.run_in_executor(None, worker.kill)
+                raise
+            finally:
+                self._busy -= 1
+
+            worker.tasks += 1
+            worker.rss = reply.get("rss") or 0
+            if reply.get("retire"):
+                if self.max_rss_bytes and worker.rss > self.max_rss_bytes:
+                    self.recycled_rss += 1
+                    logger.info("Recycling extraction worker %s at %d bytes RSS", worker.process.pid, worker.rss)
+                else:
+                    self.recycled_tasks += 1
+                loop.run_in_executor(self._executor, worker.close)
+            elif self._closed:
+                loop.run_in_executor(self._executor, worker.close)
+            else:
+                self._idle.append(worker)
+
+        if not reply.get("ok"):
+            self.failed += 1
+            raise RemoteExtractionError(reply.get("error") or "Extraction failed", reply.get("error_type") or "Exception")
+        self.completed += 1
+        return reply.get("info") or {}, cookiejar_from_dicts(reply.get("cookies") or [])
+
+    async def aclose(self) -> None:
+        self._closed = True
+        idle, self._idle = self._idle, []
+        loop = asyncio.get_running_loop()
+
+        def _shutdown():
+            for worker in idle:
+                try:
+                    worker.conn.send(None)
+                except Exception:
+                    pass
+                worker.close()
+
+        await loop.run_in_executor(None, _shutdown)
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "busy": self._busy,
+            "spawned": self.spawned,
+            "completed": self.completed,
+            "failed": self.failed,
+            "crashed": self.crashed,
+            "recycled_after_tasks": self.recycled_tasks,
+            "recycled_over_rss": self.recycled_rss,
+            "max_tasks_per_worker": self.max_tasks_per_worker,
+            "max_rss_bytes": self.max_rss_bytes,
+        }
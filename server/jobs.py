@@ -0,0 +1,457 @@
+"""Server-side download jobs.
+
+A job downloads one format of a source URL into a file on the server, so the
+transfer no longer depends on a single browser connection. Jobs are kept as
+one JSON file each next to their data and executed by a fixed number of
+worker tasks. Interrupted transfers (network errors, restarts) continue from
+the bytes already on disk with a ``Range`` request; the media URL is
+re-extracted on every attempt because signed URLs expire.
+
+The job state lives in one process: only the process holding the lock file
+of the jobs directory runs and serves jobs, so several uvicorn workers never
+execute the same persisted job twice.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+import httpx
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+from .upstream import upstream_byte_span
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_WRITE_BUFFER = 1024 * 1024
+_SAVE_INTERVAL = 2.0
+
+
+def _unsatisfied_range_total(headers) -> Optional[int]:
+    """Total size from a 416's ``Content-Range: bytes */<total>``."""
+    value = (headers.get("Content-Range") or "").strip()
+    if not value.startswith("bytes */"):
+        return None
+    try:
+        return int(value[len("bytes */"):])
+    except ValueError:
+        return None
+
+
+class JobError(Exception):
+    """A download attempt failed; the job is retried while attempts remain."""
+
+
+class QueueFull(Exception):
+    pass
+
+
+class NotOwner(Exception):
+    """Another process holds the jobs directory."""
+
+
+class DownloadTarget:
+    """What a job downloads, as resolved right before each attempt.
+
+    ``url`` is fetched with ``client`` and resumed by byte offset. Bodies that
+    can't be resumed (stitched HLS/DASH) set ``stream`` instead, a factory of
+    the whole body that is written from the start on every attempt.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        content_type: str = "application/octet-stream",
+        url: Optional[str] = None,
+        headers: Optional[dict] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        stream: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+    ):
+        self.filename = filename
+        self.content_type = content_type
+        self.url = url
+        self.headers = headers or {}
+        self.client = client
+        self.stream = stream
+
+
+class Job:
+    _FIELDS = (
+        "id",
+        "owner",
+        "source",
+        "format_id",
+        "status",
+        "created_at",
+        "updated_at",
+        "started_at",
+        "finished_at",
+        "attempts",
+        "bytes_done",
+        "total_bytes",
+        "filename",
+        "content_type",
+        "error",
+    )
+
+    def __init__(self, **fields):
+        for name in self._FIELDS:
+            setattr(self, name, fields.get(name))
+        self.attempts = self.attempts or 0
+        self.bytes_done = self.bytes_done or 0
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self._FIELDS}
+
+
+class JobQueue:
+    """Persistent download jobs executed by ``workers`` concurrent tasks.
+
+    ``resolve`` turns a job into a :class:`DownloadTarget`; it runs before each
+    attempt. Finished jobs and their files are removed after
+    ``retention_seconds``. :meth:`start` fails with :class:`NotOwner` when
+    another process already runs the jobs of ``directory``.
+    """
+
+    LOCK_NAME = ".lock"
+
+    def __init__(
+        self,
+        directory: str,
+        resolve: Callable[[Job], Awaitable[DownloadTarget]],
+        workers: int = 2,
+        retries: int = 3,
+        max_queued: int = 100,
+        retention_seconds: float = 24 * 3600,
+        retry_delay: float = 2.0,
+    ):
+        self.directory = directory
+        self._resolve = resolve
+        self.workers = max(1, int(workers))
+        self.retries = max(0, int(retries))
+        self.max_queued = max(1, int(max_queued))
+        self.retention_seconds = retention_seconds
+        self.retry_delay = retry_delay
+        self._jobs: Dict[str, Job] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._running: Dict[str, "asyncio.Task[None]"] = {}
+        self._lock_fd: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # Persistence
+
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def part_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.part")
+
+    def data_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.data")
+
+    def _write_meta(self, job_id: str, fields: dict) -> None:
+        path = self._meta_path(job_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(fields, fh)
+        os.replace(tmp, path)
+
+    async def _save(self, job: Job) -> None:
+        # Saves of one job are awaited in sequence, so they never share the tmp file
+        job.updated_at = time.time()
+        await anyio.to_thread.run_sync(self._write_meta, job.id, job.to_dict())
+
+    def _load(self) -> None:
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as fh:
+                    job = Job(**json.load(fh))
+            except Exception as e:
+                logger.warning("Skipping unreadable job file %s: %s", name, e)
+                continue
+            if job.status == RUNNING:
+                # Interrupted by a restart; resumes from the partial file
+                job.status = QUEUED
+            if job.status == QUEUED:
+                try:
+                    job.bytes_done = os.path.getsize(self.part_path(job.id))
+                except OSError:
+                    job.bytes_done = 0
+            self._jobs[job.id] = job
+
+    def _remove_files(self, job_id: str) -> None:
+        for path in (self._meta_path(job_id), self.part_path(job_id), self.data_path(job_id)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Failed to remove %s: %s", path, e)
+
+    def _forget_expired(self, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        expired = [
+            job.id
+            for job in self._jobs.values()
+            if job.status in {COMPLETED, FAILED} and now - (job.finished_at or 0) > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return expired
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Forget finished jobs older than the retention period."""
+        expired = self._forget_expired(now)
+        for job_id in expired:
+            self._remove_files(job_id)
+        return len(expired)
+
+    def _claim_directory(self) -> None:
+        if fcntl is None or self._lock_fd is not None:
+            return
+        fd = os.open(os.path.join(self.directory, self.LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise NotOwner(self.directory)
+        self._lock_fd = fd
+
+    def _release_directory(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # Lifecycle
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._claim_directory()
+        self.prune()
+        # A fresh queue per start: asyncio queues belong to one event loop
+        self._queue = asyncio.Queue()
+        for job in sorted(self._jobs.values(), key=lambda j: j.created_at or 0):
+            if job.status == QUEUED:
+                self._queue.put_nowait(job.id)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._release_directory()
+
+    # API
+
+    @property
+    def active(self) -> bool:
+        """Whether this process runs the jobs (started and owning the directory)."""
+        return bool(self._tasks)
+
+    async def submit(self, source: str, format_id: str, owner: Optional[str] = None) -> Job:
+        pending = sum(1 for job in self._jobs.values() if job.status in {QUEUED, RUNNING})
+        if pending >= self.max_queued:
+            raise QueueFull()
+        now = time.time()
+        job = Job(
+            id=uuid.uuid4().hex,
+            owner=owner,
+            source=source,
+            format_id=format_id,
+            status=QUEUED,
+            created_at=now,
+        )
+        self._jobs[job.id] = job
+        await self._save(job)
+        if self._tasks:
+            self._queue.put_nowait(job.id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, owner: Optional[str] = None, status: Optional[str] = None) -> List[Job]:
+        jobs = [
+            job
+            for job in self._jobs.values()
+            if job.owner == owner and (status is None or job.status == status)
+        ]
+        jobs.sort(key=lambda j: j.created_at or 0, reverse=True)
+        return jobs
+
+    async def delete(self, job_id: str) -> bool:
+        """Cancel the job if it is running and remove it with its files."""
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await anyio.to_thread.run_sync(self._remove_files, job_id)
+        return True
+
+    def stats(self) -> dict:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "running": len(self._running), "jobs": counts}
+
+    # Execution
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue
+            task = asyncio.ensure_future(self._execute(job))
+            self._running[job_id] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if task.cancelled() or job_id not in self._jobs:
+                    # Deleted while running; carry on with the next job
+                    continue
+                # Shutting down: leave it queued, it resumes after a restart
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _execute(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started_at = job.started_at or time.time()
+        job.error = None
+        await self._save(job)
+        try:
+            for attempt in range(self.retries + 1):
+                job.attempts += 1
+                try:
+                    target = await self._resolve(job)
+                    job.filename = target.filename
+                    job.content_type = target.content_type
+                    if target.stream is not None:
+                        await self._write_stream(job, target.stream())
+                    else:
+                        await self._fetch_resumable(job, target)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    job.error = str(e) or type(e).__name__
+                    await self._save(job)
+                    if attempt >= self.retries:
+                        raise
+                    logger.info("Job %s attempt %d failed, retrying: %s", job.id, attempt + 1, job.error)
+                    await asyncio.sleep(self.retry_delay * (attempt + 1))
+            await anyio.to_thread.run_sync(os.replace, self.part_path(job.id), self.data_path(job.id))
+            job.status = COMPLETED
+            job.error = None
+            job.total_bytes = job.bytes_done
+        except asyncio.CancelledError:
+            if job.id in self._jobs:
+                job.status = QUEUED
+                await self._save(job)
+            raise
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e) or type(e).__name__
+            logger.warning("Job %s failed: %s", job.id, job.error)
+        job.finished_at = time.time()
+        if job.id in self._jobs:
+            await self._save(job)
+        for job_id in self._forget_expired():
+            await anyio.to_thread.run_sync(self._remove_files, job_id)
+
+    async def _write_stream(self, job: Job, body: AsyncIterator[bytes]) -> None:
+        job.bytes_done = 0
+        await self._write_chunks(job, body, "wb")
+
+    async def _fetch_resumable(self, job: Job, target: DownloadTarget) -> None:
+        path = self.part_path(job.id)
+        try:
+            offset = await anyio.to_thread.run_sync(os.path.getsize, path)
+        except OSError:
+            offset = 0
+        headers = dict(target.headers)
+        # Byte offsets must refer to the stored representation
+        headers["Accept-Encoding"] = "identity"
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        request = target.client.build_request("GET", target.url, headers=headers)
+        resp = await target.client.send(request, stream=True)
+        try:
+            if resp.status_code == 416 and offset:
+                if _unsatisfied_range_total(resp.headers) == offset:
+                    # Everything arrived before the previous attempt ended
+                    job.bytes_done = job.total_bytes = offset
+                    return
+                await anyio.to_thread.run_sync(os.unlink, path)
+                raise JobError("Stored partial download no longer matches the source")
+            if resp.status_code >= 400:
+                raise JobError(f"Upstream returned status {resp.status_code}")
+            span = upstream_byte_span(resp.status_code, resp.headers)
+            if (resp.headers.get("Content-Encoding") or "identity").lower() != "identity":
+                # Offsets of a compressed transfer don't map to stored bytes
+                span = None
+                job.total_bytes = None
+            if offset and (
+                resp.status_code != 206
+                or span is None
+                or span[0] != offset
+                or (job.total_bytes and span[2] != job.total_bytes)
+            ):
+                # Range ignored or a different file behind the URL: start over
+                offset = 0
+            if span is not None:
+                job.total_bytes = span[2]
+            job.content_type = resp.headers.get("Content-Type") or job.content_type
+            job.bytes_done = offset
+            await self._write_chunks(job, resp.aiter_bytes(), "ab" if offset else "wb")
+        finally:
+            await resp.aclose()
+        if job.total_bytes and job.bytes_done != job.total_bytes:
+            raise JobError(f"Transfer ended at {job.bytes_done} of {job.total_bytes} bytes")
+
+    async def _write_chunks(self, job: Job, chunks: AsyncIterator[bytes], mode: str) -> None:
+        buffer = bytearray()
+        last_save = time.monotonic()
+        async with await anyio.open_file(self.part_path(job.id), mode) as fh:
+            try:
+                async for chunk in chunks:
+                    buffer.extend(chunk)
+                    if len(buffer) >= _WRITE_BUFFER:
+                        await fh.write(bytes(buffer))
+                        job.bytes_done += len(buffer)
+                        buffer.clear()
+                        if time.monotonic() - last_save >= _SAVE_INTERVAL:
+                            last_save = time.monotonic()
+                            await self._save(job)
+            finally:
+                # Keep what was received; the next attempt resumes after it
+                if buffer:
+                    with anyio.CancelScope(shield=True):
+                        await fh.write(bytes(buffer))
+                    job.bytes_done += len(buffer)
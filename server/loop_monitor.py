@@ -0,0 +1,131 @@
+"""Event-loop lag sampling and blocking-call detection.
+
+A sampler task sleeps for ``interval`` seconds in a loop and measures how much
+later than requested it wakes up; that lag is how long other callbacks kept
+the loop busy. Lag alone does not say *what* blocked, so a watchdog thread
+checks the sampler's heartbeat: once it is overdue by ``threshold`` seconds,
+the loop thread is still inside the blocking call, and its current stack
+(from ``sys._current_frames()``) is logged and kept for ``/api/debug/loop``.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Samples the running loop's lag; reports stacks of stalls over ``threshold``.
+
+    ``on_sample`` receives every lag measurement in seconds (for a histogram).
+    At most one report is taken per stall, and the last ``max_reports`` are kept.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        on_sample: Optional[Callable[[float], None]] = None,
+        max_reports: int = 20,
+        stack_limit: int = 40,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.on_sample = on_sample
+        self.stack_limit = stack_limit
+        self.reports: Deque[dict] = deque(maxlen=max_reports)
+        self.samples = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._beat = 0.0
+        self._reported_beat: Optional[float] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling the running loop; call from within it."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._sample())
+        self._thread = threading.Thread(target=self._watch, name="aoi-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join, 5)
+            self._thread = None
+
+    async def _sample(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._beat = now
+            self.samples += 1
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if self.on_sample is not None:
+                self.on_sample(lag)
+
+    def _watch(self) -> None:
+        period = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(period):
+            beat = self._beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue >= self.threshold and self._reported_beat != beat:
+                self._reported_beat = beat
+                self._report(overdue)
+
+    def _report(self, overdue: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=self.stack_limit)
+        task = None
+        try:
+            current = asyncio.current_task(self._loop)
+            if current is not None:
+                task = current.get_name()
+        except Exception:
+            pass
+        self.stalls += 1
+        report = {"at": round(time.time(), 3), "blocked_for": round(overdue, 3), "task": task, "stack": stack}
+        self.reports.append(report)
+        logger.warning(
+            "Event loop blocked for %.0f ms so far (task %s):\n%s", overdue * 1000, task, "".join(stack).rstrip()
+        )
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "samples": self.samples,
+            "last_lag": round(self.last_lag, 6),
+            "max_lag": round(self.max_lag, 6),
+            "stalls": self.stalls,
+        }
+
+    def recent_reports(self) -> List[dict]:
+        return list(self.reports)
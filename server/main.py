@@ -1,27 +1,57 @@
 import os
+import time
+
+# Measured from here to the end of this module; reported by the warm-up
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
-import json
 import uuid
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
-import bcrypt
 import httpx
 import anyio
 import threading
-import queue as thread_queue
-from urllib.parse import quote, urlparse
+from http.cookiejar import CookieJar
+from urllib.parse import quote, urlencode, urlparse
 
 try:
     import yt_dlp as youtube_dl
 except Exception as e:
     raise e
 
+from .cookie_jar import SharedCookies, copy_jar, index_for_jar
+from .extract_cache import ExtractionCache, earliest_url_expiry, extraction_cache_key, normalize_source_url
+from .extract_pool import ProcessExtractionPool
+from .jobs import COMPLETED, DownloadTarget, Job, JobError, JobQueue, NotOwner, QueueFull
+from .loop_monitor import LoopMonitor
+from .manifest_stream import ManifestError, is_manifest_protocol, open_manifest_stream
+from .media_cache import DiskCache, tee_to_cache
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, RateMeter, Registry
+from .passwords import AttemptLimiter, HasherBusy, PasswordHasher
+from .progress import FfmpegProgressReader, ProgressHub, YtdlpProgressLogger, current_job, valid_job_id
+from .range_file import RangeFileResponse
+from .singleflight import SingleFlight
+from .tracing import TracingMiddleware, build_otel_exporter, record as record_span, span as trace_span
+from .transcode_cache import TranscodeCache
+from .upstream import UpstreamClients, iter_segmented, upstream_byte_span
+from .user_store import EmailAlreadyRegistered, UserStore
+from .warmup import Warmup
+from .ydl_pool import YoutubeDLPool
+
+logger = logging.getLogger(__name__)
+
 # Optional curl_cffi for hardened downloads (e.g., TikTok anti-bot)
 try:
     from curl_cffi import requests as curl_requests  # type: ignore
@@ -32,7 +62,9 @@ APP_DIR = os.path.dirname(os.path.abspath(__file__))
 REPO_ROOT = os.path.abspath(os.path.join(APP_DIR, os.pardir))
 DIST_DIR = os.path.join(REPO_ROOT, "web", "dist")
 INDEX_FILE = os.path.join(DIST_DIR, "index.html")
-USERS_DB_PATH = os.path.join(APP_DIR, "users.json")
+USERS_DB_PATH = os.getenv("AOI_USERS_DB", os.path.join(APP_DIR, "users.db"))
+# Imported into USERS_DB_PATH on first use, then renamed to users.json.migrated
+LEGACY_USERS_JSON_PATH = os.path.join(APP_DIR, "users.json")
 
 
 # Allow passing cookies via env as base64 (Netscape cookie file). This makes it
@@ -59,6 +91,44 @@ _bootstrap_cookiefile_from_env()
 
 class ExtractRequest(BaseModel):
     url: str
+    # Optional client-chosen id; progress is published at /api/progress/{job_id}
+    job_id: Optional[str] = None
+
+
+class PlaylistRequest(BaseModel):
+    url: str
+    # Opaque cursor from a previous page's next_cursor
+    cursor: Optional[str] = None
+    limit: Optional[int] = None
+
+
+class PlaylistEntryModel(BaseModel):
+    index: int
+    id: Optional[str] = None
+    title: Optional[str] = None
+    # Pass to /api/extract to resolve this entry's formats
+    url: Optional[str] = None
+    duration: Optional[float] = None
+    thumbnail: Optional[str] = None
+    uploader: Optional[str] = None
+
+
+class PlaylistResponse(BaseModel):
+    id: Optional[str] = None
+    title: Optional[str] = None
+    uploader: Optional[str] = None
+    webpage_url: Optional[str] = None
+    extractor: Optional[str] = None
+    # Only known when the site reports it
+    total: Optional[int] = None
+    entries: List[PlaylistEntryModel]
+    next_cursor: Optional[str] = None
+
+
+class BatchExtractRequest(BaseModel):
+    urls: List[str]
+    # Extractions in flight at once; capped by AOI_BATCH_MAX_CONCURRENCY
+    concurrency: Optional[int] = None
 
 
 class FormatModel(BaseModel):
@@ -75,6 +145,8 @@ class FormatModel(BaseModel):
     is_audio_only: bool = False
     # Protocol hint (http, m3u8, etc.) for better client decisions
     protocol: Optional[str] = None
+    # Signed, short-lived ticket for /api/stream; None when the format needs /api/download
+    stream_token: Optional[str] = None
 
 
 class ExtractResponse(BaseModel):
@@ -112,7 +184,46 @@ def human_readable_bytes(num_bytes: Optional[int]) -> Optional[str]:
     return f"{size:.2f} {units[unit_idx]}"
 
 
-app = FastAPI(title="All-in-One Downloader API")
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    warmup = _warmup
+    warmup_task = None
+    if os.getenv("AOI_WARMUP", "1") not in {"0", "false", "False", ""}:
+        # In the background: the server accepts connections (and answers
+        # /api/health) right away, /api/ready turns green once this is done
+        warmup_task = asyncio.ensure_future(warmup.run())
+    else:
+        warmup.mark_ready()
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = _build_job_queue()
+    if _job_queue is not None:
+        try:
+            _job_queue.start()
+        except NotOwner:
+            logger.warning("Download jobs in %s are run by another worker process", _job_queue.directory)
+    if _loop_monitor is not None:
+        _loop_monitor.start()
+    try:
+        yield
+    finally:
+        if _loop_monitor is not None:
+            await _loop_monitor.stop()
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+            await asyncio.gather(warmup_task, return_exceptions=True)
+        if _job_queue is not None:
+            await _job_queue.stop()
+        await _upstream.aclose()
+        if _extraction_pool is not None:
+            await _extraction_pool.aclose()
+        if _user_store is not None:
+            _user_store.close()
+        _password_hasher.shutdown()
+        _ydl_pool.clear()
+
+
+app = FastAPI(title="All-in-One Downloader API", lifespan=_lifespan)
 
 # CORS: keep permissive since we also serve the frontend from the same origin
 app.add_middleware(
@@ -123,6 +234,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Server-Timing headers, request ids and per-request logs for /api/ routes
+if os.getenv("AOI_TRACING", "1") not in {"0", "false", "False", ""}:
+    app.add_middleware(
+        TracingMiddleware,
+        exporter=build_otel_exporter() if os.getenv("AOI_TRACING_OTEL", "0") not in {"0", "false", "False", ""} else None,
+    )
+
 
 ###############################################################################
 # Basic email/guest authentication (cookie session)
@@ -135,40 +253,122 @@ _COOKIE_SECURE = os.getenv("AOI_COOKIE_SECURE", "0") not in {"0", "false", "Fals
 
 _session_serializer = URLSafeTimedSerializer(_SECRET, salt="aoi.session")
 
-_users_lock = threading.Lock()
+_user_store: Optional[UserStore] = None
+_user_store_lock = threading.Lock()
 
 
-def _load_users() -> dict:
-    if not os.path.exists(USERS_DB_PATH):
-        return {"users": []}
-    try:
-        with open(USERS_DB_PATH, "r", encoding="utf-8") as fh:
-            return json.load(fh) or {"users": []}
-    except Exception:
-        return {"users": []}
-
-
-def _save_users(payload: dict) -> None:
-    tmp_path = USERS_DB_PATH + ".tmp"
-    with open(tmp_path, "w", encoding="utf-8") as fh:
-        json.dump(payload, fh)
-    os.replace(tmp_path, USERS_DB_PATH)
+def _users() -> UserStore:
+    """Return the user store for USERS_DB_PATH, opening it on first use."""
+    global _user_store
+    store = _user_store
+    if store is None:
+        with _user_store_lock:
+            store = _user_store
+            if store is None:
+                store = UserStore(
+                    USERS_DB_PATH,
+                    legacy_json_path=LEGACY_USERS_JSON_PATH,
+                    cache_ttl=float(os.getenv("AOI_SESSION_CACHE_TTL", "30")),
+                )
+                _user_store = store
+    return store
 
 
 def _normalize_email(email: str) -> str:
     return (email or "").strip().lower()
 
 
-def _hash_password(password: str) -> str:
-    salt = bcrypt.gensalt(rounds=12)
-    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+# bcrypt runs on its own small executor so logins never hold anyio threads
+_password_hasher = PasswordHasher(
+    rounds=int(os.getenv("AOI_BCRYPT_ROUNDS", "12")),
+    workers=int(os.getenv("AOI_BCRYPT_WORKERS", "2")),
+    max_queue=int(os.getenv("AOI_BCRYPT_MAX_QUEUE", "32")),
+)
+_AUTH_WINDOW_SECONDS = float(os.getenv("AOI_AUTH_WINDOW", "60"))
+# Hashing attempts (signup + login) per client IP, failed logins per email
+_auth_ip_limiter = AttemptLimiter(int(os.getenv("AOI_AUTH_IP_LIMIT", "20")), _AUTH_WINDOW_SECONDS)
+_auth_email_limiter = AttemptLimiter(int(os.getenv("AOI_AUTH_EMAIL_LIMIT", "5")), _AUTH_WINDOW_SECONDS)
+
+
+def _parse_networks(value: str) -> list:
+    networks = []
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(part, strict=False))
+        except ValueError:
+            logger.warning("Ignoring invalid AOI_TRUSTED_PROXIES entry %r", part)
+    return networks
+
+
+# Reverse proxies (e.g. the hosting platform's load balancer) whose
+# X-Forwarded-For is believed; without them every client shares the proxy's IP
+_TRUSTED_PROXIES = _parse_networks(os.getenv("AOI_TRUSTED_PROXIES", ""))
 
 
-def _verify_password(password: str, hashed: str) -> bool:
+def _is_trusted_proxy(host: str) -> bool:
     try:
-        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
-    except Exception:
+        address = ipaddress.ip_address(host)
+    except ValueError:
         return False
+    return any(address in network for network in _TRUSTED_PROXIES)
+
+
+def _client_ip(request: Request) -> str:
+    """The peer address, or the client a trusted proxy forwarded the request for.
+
+    X-Forwarded-For is read from the right, skipping trusted proxies, so a
+    client cannot pick its own address by sending the header itself.
+    """
+    host = request.client.host if request.client else ""
+    if not _TRUSTED_PROXIES or not _is_trusted_proxy(host):
+        return host
+    forwarded = [part.strip() for part in ",".join(request.headers.getlist("x-forwarded-for")).split(",")]
+    for hop in reversed([part for part in forwarded if part]):
+        if not _is_trusted_proxy(hop):
+            return hop
+        host = hop
+    return host
+
+
+def _check_auth_throttle(limiter: AttemptLimiter, key: str) -> None:
+    retry_after = limiter.retry_after(key)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts; try again later",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+
+
+async def _hashing(op, *args):
+    """Run a hasher operation, mapping a full queue to 503."""
+    try:
+        return await op(*args)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy; try again shortly", headers={"Retry-After": "1"})
+
+
+def _report_hash_cost(response: Response, seconds: float) -> None:
+    response.headers.update(_hash_cost_headers(seconds))
+
+
+def _hash_cost_headers(seconds: float) -> dict:
+    # Traced requests get it in the middleware's Server-Timing header
+    if record_span("bcrypt", seconds):
+        return {}
+    return {"Server-Timing": f"bcrypt;dur={seconds * 1000:.1f}"}
+
+
+async def _rehash_password(user_id: str, password: str) -> None:
+    """Upgrade a stored hash to the configured cost after a successful login."""
+    try:
+        hashed, _ = await _password_hasher.hash(password)
+    except HasherBusy:
+        return
+    await anyio.to_thread.run_sync(_users().update_password_hash, user_id, hashed)
 
 
 def _create_session(response: Response, user: dict) -> None:
@@ -219,34 +419,54 @@ def _user_to_public(user: dict) -> PublicUser:
 
 
 @app.post("/api/auth/signup", response_model=PublicUser)
-def auth_signup(creds: AuthCredentials, response: Response):
+async def auth_signup(creds: AuthCredentials, request: Request, response: Response):
     email = _normalize_email(creds.email)
     if not email or not creds.password:
         raise HTTPException(status_code=400, detail="Email and password are required")
-    with _users_lock:
-        db = _load_users()
-        if any(u.get("email") == email for u in db.get("users", [])):
-            raise HTTPException(status_code=409, detail="Email already registered")
-        user = {
-            "id": uuid.uuid4().hex,
-            "email": email,
-            "password_hash": _hash_password(creds.password),
-            "guest": False,
-        }
-        db.setdefault("users", []).append(user)
-        _save_users(db)
+    ip = _client_ip(request)
+    _check_auth_throttle(_auth_ip_limiter, ip)
+    # Counted and hashed before the lookup, so probing for registered emails
+    # is throttled and an existing address answers no faster than a new one
+    _auth_ip_limiter.record(ip)
+    hashed, cost = await _hashing(_password_hasher.hash, creds.password)
+    store = _users()
+    if await anyio.to_thread.run_sync(store.get_by_email, email) is not None:
+        raise HTTPException(status_code=409, detail="Email already registered", headers=_hash_cost_headers(cost))
+    _report_hash_cost(response, cost)
+    try:
+        user = await anyio.to_thread.run_sync(store.create, uuid.uuid4().hex, email, hashed)
+    except EmailAlreadyRegistered:
+        # Lost a race with a concurrent signup for the same address
+        raise HTTPException(status_code=409, detail="Email already registered")
     _create_session(response, user)
     return _user_to_public(user)
 
 
 @app.post("/api/auth/login", response_model=PublicUser)
-def auth_login(creds: AuthCredentials, response: Response):
+async def auth_login(creds: AuthCredentials, request: Request, response: Response, background_tasks: BackgroundTasks):
     email = _normalize_email(creds.email)
-    with _users_lock:
-        db = _load_users()
-        user = next((u for u in db.get("users", []) if u.get("email") == email and not u.get("guest")), None)
-        if not user or not _verify_password(creds.password, user.get("password_hash", "")):
-            raise HTTPException(status_code=401, detail="Invalid email or password")
+    ip = _client_ip(request)
+    _check_auth_throttle(_auth_ip_limiter, ip)
+    _check_auth_throttle(_auth_email_limiter, email)
+    user = await anyio.to_thread.run_sync(_users().get_by_email, email)
+    _auth_ip_limiter.record(ip)
+    if user:
+        ok, cost = await _hashing(_password_hasher.verify, creds.password, user.get("password_hash", ""))
+    else:
+        # Same bcrypt work and throttling as a wrong password, so neither the
+        # timing nor the limits reveal which emails have an account
+        ok, cost = await _hashing(_password_hasher.verify_unknown, creds.password)
+    if not ok:
+        _auth_email_limiter.record(email)
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid email or password",
+            headers=_hash_cost_headers(cost),
+        )
+    _auth_email_limiter.reset(email)
+    _report_hash_cost(response, cost)
+    if _password_hasher.needs_rehash(user.get("password_hash", "")):
+        background_tasks.add_task(_rehash_password, user["id"], creds.password)
     _create_session(response, user)
     return _user_to_public(user)
 
@@ -260,19 +480,21 @@ def auth_guest(response: Response):
 
 
 @app.get("/api/auth/me", response_model=Optional[PublicUser])
-def auth_me(request: Request):
+async def auth_me(request: Request):
     sess = _read_session(request)
     if not sess:
         return None
     if sess.get("guest"):
         return PublicUser(id=sess.get("uid"), email=None, guest=True)
-    # For registered users, verify still exists
-    with _users_lock:
-        db = _load_users()
-        user = next((u for u in db.get("users", []) if u.get("id") == sess.get("uid")), None)
-        if not user:
-            return None
-        return _user_to_public(user)
+    # For registered users, verify still exists. Recently verified users are
+    # answered from memory, so the common case is just the cookie's HMAC check
+    store = _users()
+    found, user = store.cached_user(sess.get("uid"))
+    if not found:
+        user = await anyio.to_thread.run_sync(store.get_by_id, sess.get("uid"))
+    if not user:
+        return None
+    return _user_to_public(user)
 
 
 @app.post("/api/auth/logout")
@@ -304,8 +526,14 @@ def build_ydl_opts(
     source_url: Optional[str] = None,
     format_selector: Optional[str] = None,
     user_agent_override: Optional[str] = None,
+    playlist_items: Optional[str] = None,
 ) -> dict:
-    """Construct yt-dlp options with env-driven overrides and robust defaults."""
+    """Construct yt-dlp options with env-driven overrides and robust defaults.
+
+    With ``playlist_items`` (yt-dlp's ``start:end`` syntax) the source is
+    listed as a playlist instead: entries are only flat-extracted (no
+    formats) and only the requested slice is fetched.
+    """
     user_agent = user_agent_override or _get_default_user_agent()
     referer = _build_referer_for(source_url) if source_url else None
 
@@ -351,38 +579,377 @@ def build_ydl_opts(
         },
     }
 
-    cookiefile = os.getenv("AOI_COOKIEFILE")
-    if not cookiefile:
-        # Auto-detect a local Netscape cookie file if present
-        candidate_paths = [
-            os.path.join(APP_DIR, ".cookies.txt"),
-            os.path.join(REPO_ROOT, "cookies.txt"),
-            os.path.join(REPO_ROOT, ".cookies.txt"),
-        ]
-        for path in candidate_paths:
-            if os.path.exists(path):
-                cookiefile = path
-                break
-    if cookiefile and os.path.exists(cookiefile):
-        ydl_opts["cookiefile"] = cookiefile
+    if playlist_items:
+        ydl_opts["noplaylist"] = False
+        ydl_opts["extract_flat"] = "in_playlist"
+        ydl_opts["playlist_items"] = playlist_items
+
+    # Resolved and parsed once per change of the file, not per request
+    cookies = _shared_cookies.current()
+    if cookies is not None:
+        ydl_opts["cookiefile"] = cookies.path
 
     return ydl_opts
 
 
-async def _extract_info_with_cookiejar(url: str, ydl_opts: dict):
-    """Run extraction and return both info dict and the underlying cookie jar."""
+def _cookiefile_candidates() -> List[str]:
+    cookiefile = os.getenv("AOI_COOKIEFILE")
+    if cookiefile:
+        return [cookiefile]
+    # Auto-detect a local Netscape cookie file if present
+    return [
+        os.path.join(APP_DIR, ".cookies.txt"),
+        os.path.join(REPO_ROOT, "cookies.txt"),
+        os.path.join(REPO_ROOT, ".cookies.txt"),
+    ]
+
+
+# The cookie file parsed into a domain index, shared by every extraction
+_shared_cookies = SharedCookies(
+    _cookiefile_candidates, check_interval=float(os.getenv("AOI_COOKIES_CHECK_INTERVAL", "2"))
+)
+
+
+# Extraction results are shared by every endpoint; see extract_cache.py
+_extraction_cache = ExtractionCache(
+    max_bytes=int(os.getenv("AOI_EXTRACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv("AOI_EXTRACT_CACHE_TTL", "900")),
+    expiry_margin_seconds=float(os.getenv("AOI_EXTRACT_CACHE_EXPIRY_MARGIN", "60")),
+)
+# Concurrent cache misses for the same key share one extraction
+# The key leaves out the format selector, so a failure (e.g. "Requested format
+# is not available") is not shared: followers then extract with their own options
+_extraction_flight = SingleFlight("extraction", share_errors=False)
+
+
+def _build_extraction_pool() -> Optional[ProcessExtractionPool]:
+    """Create the process-pool backend when AOI_EXTRACT_BACKEND=process."""
+    if os.getenv("AOI_EXTRACT_BACKEND", "thread").strip().lower() != "process":
+        return None
+    return ProcessExtractionPool(
+        size=int(os.getenv("AOI_EXTRACT_WORKERS", "0") or 0) or (os.cpu_count() or 2),
+        max_tasks_per_worker=int(os.getenv("AOI_EXTRACT_WORKER_MAX_TASKS", "100")),
+        max_rss_bytes=int(float(os.getenv("AOI_EXTRACT_WORKER_MAX_RSS_MB", "768")) * 1024 * 1024),
+        task_timeout=float(os.getenv("AOI_EXTRACT_TIMEOUT", "120")),
+    )
+
+
+# Optional process-pool extraction backend; None means worker threads
+_extraction_pool = _build_extraction_pool()
 
-    def _sync_extract():
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+# Application-wide upstream HTTP clients with keep-alive connection pools
+_upstream = UpstreamClients(
+    max_connections=int(os.getenv("AOI_UPSTREAM_MAX_CONNECTIONS", "200")),
+    max_keepalive_connections=int(os.getenv("AOI_UPSTREAM_MAX_KEEPALIVE", "50")),
+    keepalive_expiry=float(os.getenv("AOI_UPSTREAM_KEEPALIVE_EXPIRY", "30")),
+    connect_timeout=float(os.getenv("AOI_UPSTREAM_CONNECT_TIMEOUT", "15")),
+)
+
+# Accelerated (segmented) downloads: parallel Range requests reassembled in order
+_ACCELERATE_DEFAULT = os.getenv("AOI_ACCELERATE_DOWNLOADS", "0") not in {"0", "false", "False", ""}
+_SEGMENT_SIZE = int(os.getenv("AOI_SEGMENT_SIZE", str(4 * 1024 * 1024)))
+_SEGMENT_CONCURRENCY = int(os.getenv("AOI_SEGMENT_CONCURRENCY", "4"))
+_SEGMENT_MIN_BYTES = int(os.getenv("AOI_SEGMENT_MIN_BYTES", str(8 * 1024 * 1024)))
+
+# HLS/DASH fragment streaming: fragments fetched ahead of the one being sent
+_FRAGMENT_LOOKAHEAD = int(os.getenv("AOI_FRAGMENT_LOOKAHEAD", "4"))
+_FRAGMENT_RETRIES = int(os.getenv("AOI_FRAGMENT_RETRIES", "3"))
+_FRAGMENT_READ_TIMEOUT = float(os.getenv("AOI_FRAGMENT_READ_TIMEOUT", "30"))
+
+
+def _build_media_cache() -> Optional[DiskCache]:
+    """Create the on-disk media cache when AOI_MEDIA_CACHE_DIR is set."""
+    directory = os.getenv("AOI_MEDIA_CACHE_DIR")
+    if not directory:
+        return None
+    return DiskCache(
+        directory,
+        max_bytes=int(os.getenv("AOI_MEDIA_CACHE_MAX_BYTES", str(10 * 1024 ** 3))),
+        max_entry_bytes=int(os.getenv("AOI_MEDIA_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 ** 3))),
+    )
+
+
+# Optional on-disk cache of proxied media bodies
+_media_cache = _build_media_cache()
+
+
+def _build_transcode_cache() -> Optional[TranscodeCache]:
+    """Create the MP3 transcode cache when AOI_TRANSCODE_CACHE_DIR is set."""
+    directory = os.getenv("AOI_TRANSCODE_CACHE_DIR")
+    if not directory:
+        return None
+    return TranscodeCache(DiskCache(
+        directory,
+        max_bytes=int(os.getenv("AOI_TRANSCODE_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+        max_entry_bytes=int(os.getenv("AOI_TRANSCODE_CACHE_MAX_ENTRY_BYTES", str(512 * 1024 ** 2))),
+    ))
+
+
+# Optional on-disk cache of finished (and in-progress) MP3 conversions
+_transcode_cache = _build_transcode_cache()
+
+
+def _transcode_cache_key(source: str, format_id: Optional[str], bitrate_kbps: int) -> str:
+    return f"mp3:{normalize_source_url(source)}:{format_id or 'bestaudio'}:{bitrate_kbps}"
+
+
+def _media_cache_key(info: dict, fmt: dict) -> Optional[str]:
+    extractor = info.get("extractor_key") or info.get("extractor")
+    video_id = info.get("id")
+    format_id = fmt.get("format_id")
+    if not extractor or not video_id or format_id is None:
+        return None
+    return f"{extractor}:{video_id}:{format_id}"
+
+
+def _begin_media_fill(cache_key: Optional[str], status_code: int, client_range: Optional[str], response_headers: dict, media_type: str):
+    """Start a tee-on-read cache fill for complete, unencoded 200 responses."""
+    if _media_cache is None or not cache_key or client_range or status_code != 200:
+        return None
+    if response_headers.get("Content-Encoding"):
+        return None
+    try:
+        size = int(response_headers.get("Content-Length") or 0)
+    except ValueError:
+        return None
+    return _media_cache.begin_fill(cache_key, size, {"content_type": media_type})
+
+
+# Prometheus metrics, served at /api/metrics
+_metrics = Registry()
+_EXTRACTION_SECONDS = _metrics.histogram(
+    "aoi_extraction_seconds",
+    "yt-dlp extraction time of cache misses by extractor, attempt and result.",
+    ("extractor", "attempt", "result"),
+)
+_UPSTREAM_TTFB_SECONDS = _metrics.histogram(
+    "aoi_upstream_ttfb_seconds", "Time until the upstream response headers arrived.", ("endpoint",)
+)
+_TTFB_DOWNLOAD = _UPSTREAM_TTFB_SECONDS.labels("download")
+_TTFB_SUBTITLE = _UPSTREAM_TTFB_SECONDS.labels("subtitle")
+_STREAMED_BYTES = _metrics.counter(
+    "aoi_streamed_bytes_total", "Response body bytes streamed to clients.", ("endpoint",)
+)
+_ACTIVE_STREAMS = _metrics.gauge("aoi_active_streams", "Response bodies being streamed.", ("endpoint",))
+_STREAM_ENDPOINTS = ("download", "subtitle", "convert_mp3", "download_merged")
+# Bound once so the chunk loop only does additions
+_STREAM_METERS = {
+    name: (_STREAMED_BYTES.labels(name), _ACTIVE_STREAMS.labels(name)) for name in _STREAM_ENDPOINTS
+}
+_stream_rate = RateMeter(window=10)
+_CURL_FALLBACKS = _metrics.counter(
+    "aoi_curl_fallback_total", "Downloads retried with curl_cffi, by the upstream status that caused it.", ("status",)
+)
+_FFMPEG_STARTED = _metrics.counter("aoi_ffmpeg_started_total", "ffmpeg processes started.", ("kind",))
+_FFMPEG_RUNNING = _metrics.gauge("aoi_ffmpeg_running", "ffmpeg processes running.", ("kind",))
+_FFMPEG_SECONDS = _metrics.histogram(
+    "aoi_ffmpeg_duration_seconds",
+    "ffmpeg process lifetime by result (ok, failed, killed).",
+    ("kind", "result"),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+_LOOP_LAG_SECONDS = _metrics.histogram(
+    "aoi_event_loop_lag_seconds",
+    "How much later than scheduled the loop monitor's timer fired.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+# Which attempt of _extract_response an extraction belongs to
+_extraction_attempt: ContextVar[str] = ContextVar("aoi_extraction_attempt", default="primary")
+
+
+def _collect_runtime_metrics():
+    throughput = Gauge("aoi_stream_throughput_bytes_per_second", "Streamed bytes per second over the last 10 s.")
+    throughput.set(_stream_rate.rate())
+    yield throughput
+
+    # The pool behind anyio.to_thread (extractions, file I/O, SQLite)
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    for name, doc, value in (
+        ("aoi_threadpool_limit", "Worker threads available to anyio.to_thread.", limiter.total_tokens),
+        ("aoi_threadpool_busy", "Worker threads in use.", limiter.borrowed_tokens),
+        ("aoi_threadpool_waiting", "Tasks waiting for a worker thread.", limiter.statistics().tasks_waiting),
+    ):
+        gauge = Gauge(name, doc)
+        gauge.set(value)
+        yield gauge
+
+    cache = _extraction_cache.stats()
+    lookups = Counter("aoi_extraction_cache_lookups_total", "Extraction cache lookups.", ("result",))
+    lookups.labels("hit").set(cache["hits"])
+    lookups.labels("miss").set(cache["misses"])
+    yield lookups
+
+    hasher = _password_hasher.stats()
+    operations = Counter("aoi_password_hash_operations_total", "bcrypt operations by kind.", ("op",))
+    operations.labels("hash").set(hasher["hashed"])
+    operations.labels("verify").set(hasher["verified"])
+    yield operations
+    hash_seconds = Counter("aoi_password_hash_seconds_total", "Time spent on bcrypt operations, including queueing.")
+    hash_seconds.inc(hasher["seconds"])
+    yield hash_seconds
+    rejected = Counter("aoi_password_hash_rejected_total", "bcrypt operations refused because the queue was full.")
+    rejected.inc(hasher["rejected"])
+    yield rejected
+    pending = Gauge("aoi_password_hash_pending", "bcrypt operations running or queued.")
+    pending.set(hasher["pending"])
+    yield pending
+
+    if _loop_monitor is not None:
+        stalls = Counter("aoi_event_loop_stalls_total", "Times the event loop was blocked past the report threshold.")
+        stalls.inc(_loop_monitor.stalls)
+        yield stalls
+
+
+_metrics.add_collector(_collect_runtime_metrics)
+
+
+def _build_loop_monitor() -> Optional[LoopMonitor]:
+    if os.getenv("AOI_LOOP_MONITOR", "1") in {"0", "false", "False", ""}:
+        return None
+    return LoopMonitor(
+        interval=float(os.getenv("AOI_LOOP_MONITOR_INTERVAL", "0.1")),
+        threshold=float(os.getenv("AOI_LOOP_BLOCK_THRESHOLD", "0.25")),
+        on_sample=_LOOP_LAG_SECONDS.observe,
+    )
+
+
+# Event-loop lag sampling; stacks of blocking calls are logged by server.loop_monitor
+_loop_monitor = _build_loop_monitor()
+
+
+def _metered(chunks, endpoint: str):
+    """Count a response body into the streamed-bytes metrics of ``endpoint``."""
+    counter, active = _STREAM_METERS[endpoint]
+    return _metered_stream(chunks, counter, active)
+
+
+async def _metered_stream(chunks, counter, active):
+    rate = _stream_rate
+    active.inc()
+    try:
+        async for chunk in chunks:
+            size = len(chunk)
+            counter.inc(size)
+            rate.add(size)
+            yield chunk
+    finally:
+        active.dec()
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def _track_ffmpeg(kind: str):
+    """Count a started ffmpeg process; returns the callback that reports its exit."""
+    _FFMPEG_STARTED.labels(kind).inc()
+    running = _FFMPEG_RUNNING.labels(kind)
+    running.inc()
+    started = time.monotonic()
+    reported = False
+
+    def _exited(returncode: Optional[int]) -> None:
+        nonlocal reported
+        if reported:
+            return
+        reported = True
+        running.dec()
+        result = "ok" if returncode == 0 else ("killed" if returncode is not None and returncode < 0 else "failed")
+        _FFMPEG_SECONDS.labels(kind, result).observe(time.monotonic() - started)
+
+    return _exited
+
+
+# Progress events per client-chosen job id, followed via /api/progress/{job_id}
+_progress = ProgressHub()
+_ytdlp_progress_logger = YtdlpProgressLogger(lambda: _progress)
+
+
+def _report_progress(event_type: str, job_id: Optional[str] = None, final: bool = False, **fields) -> None:
+    """Publish an event for ``job_id`` (default: the current request's job); no-op without one."""
+    job_id = job_id or current_job.get()
+    if job_id:
+        _progress.publish(job_id, {"type": event_type, **fields}, final=final)
+
+
+def _progress_job_id(job_id: Optional[str]) -> Optional[str]:
+    if job_id is None:
+        return None
+    if not valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job_id")
+    return job_id
+
+
+# Warm YoutubeDL instances reused across extractions with identical options
+_ydl_pool = YoutubeDLPool(
+    lambda opts: youtube_dl.YoutubeDL(opts),
+    shared_cookies=_shared_cookies,
+    max_idle_per_key=int(os.getenv("AOI_YDL_POOL_PER_KEY", "2")),
+    max_idle=int(os.getenv("AOI_YDL_POOL_MAX_IDLE", "16")),
+    max_uses=int(os.getenv("AOI_YDL_POOL_MAX_USES", "50")),
+)
+
+
+def _run_extraction(url: str, ydl_opts: dict):
+    """Blocking yt-dlp extraction returning the info dict and its cookie jar."""
+    with _ydl_pool.checkout(ydl_opts) as ydl:
+        # Turns yt-dlp's screen messages into progress events of the current job
+        ydl.params["logger"] = _ytdlp_progress_logger
+        info = ydl.extract_info(url, download=False)
+        cookiejar = None
+        try:
+            cookiejar = getattr(ydl, "cookiejar", None)
+            if cookiejar is not None:
+                # The pooled instance's jar is reset for its next extraction
+                cookiejar = copy_jar(cookiejar, CookieJar)
+        except Exception:
             cookiejar = None
-            try:
-                cookiejar = getattr(ydl, "cookiejar", None)
-            except Exception:
-                cookiejar = None
-            return info, cookiejar
+        return info, cookiejar
+
 
-    return await anyio.to_thread.run_sync(_sync_extract)
+def _run_extraction_measured(url: str, ydl_opts: dict):
+    """_run_extraction plus the cache's size/expiry scan, both in the worker thread."""
+    info, cookiejar = _run_extraction(url, ydl_opts)
+    return info, cookiejar, _extraction_cache.measure(info, cookiejar)
+
+
+async def _extract_info_with_cookiejar(url: str, ydl_opts: dict):
+    """Run extraction and return both info dict and the underlying cookie jar.
+
+    Results are served from the in-process extraction cache when possible, and
+    concurrent misses for the same key wait on a single extraction.
+    """
+    key = extraction_cache_key(url, ydl_opts)
+    lookup_started = time.perf_counter()
+    cached = _extraction_cache.get(key)
+    if cached is not None:
+        record_span("extract", time.perf_counter() - lookup_started, "cache")
+        _report_progress("extract", phase="cached")
+        return cached
+    _report_progress("extract", phase="start")
+
+    async def _extract_and_store():
+        attempt = _extraction_attempt.get()
+        started = time.perf_counter()
+        try:
+            if _extraction_pool is not None:
+                info, cookiejar = await _extraction_pool.run(url, ydl_opts)
+                measured = await anyio.to_thread.run_sync(_extraction_cache.measure, info, cookiejar)
+            else:
+                info, cookiejar, measured = await anyio.to_thread.run_sync(_run_extraction_measured, url, ydl_opts)
+        except Exception:
+            _EXTRACTION_SECONDS.labels("unknown", attempt, "error").observe(time.perf_counter() - started)
+            raise
+        extractor = str(info.get("extractor") or "unknown").lower()
+        _EXTRACTION_SECONDS.labels(extractor, attempt, "ok").observe(time.perf_counter() - started)
+        if measured is not None:
+            _extraction_cache.put(key, info, cookiejar, measured)
+        return info, cookiejar
+
+    with trace_span("extract", f"ytdlp {_extraction_attempt.get()}"):
+        result = await _extraction_flight.do(key, _extract_and_store)
+    # Reported by every caller, including those that waited on another's extraction
+    _report_progress("extract", phase="done")
+    return result
 
 
 async def _extract_info_threaded(url: str, ydl_opts: dict) -> dict:
@@ -412,37 +979,204 @@ def _merge_extracted_cookies(headers: dict, info: dict, cookiejar, direct_url: O
         if not cj:
             return
 
-        cookie_pairs = []
-        for c in cj:
-            if not getattr(c, "domain", None):
-                continue
-            dom = c.domain.lstrip(".")
-            if dom and "." in dom and (host == dom or host.endswith("." + dom)):
-                cookie_pairs.append(f"{c.name}={c.value}")
-
-        if cookie_pairs and "Cookie" not in headers:
-            headers["Cookie"] = "; ".join(cookie_pairs)
+        # Indexed by domain once per jar; lookup walks the host's suffixes
+        cookie_header = index_for_jar(cj).cookie_header(host)
+        if cookie_header and "Cookie" not in headers:
+            headers["Cookie"] = cookie_header
     except Exception:
         pass
 
 
+def _format_request_headers(info: dict, fmt: dict, source: str, cookiejar) -> dict:
+    """Merge info-level and per-format headers, inferred referrer and cookies."""
+    headers = (info.get("http_headers") or {}).copy()
+    if fmt.get("http_headers"):
+        headers.update(fmt.get("http_headers") or {})
+    headers.setdefault("User-Agent", _get_default_user_agent())
+    referer = _build_referer_for(source)
+    if referer:
+        headers.setdefault("Referer", referer)
+        headers.setdefault("Origin", referer[:-1])
+    _merge_extracted_cookies(headers, info, cookiejar, fmt.get("url"))
+    return headers
+
+
+# Stream tokens: /api/extract signs everything /api/stream needs to reach the
+# CDN, so downloads skip the second extraction and any node can serve them.
+# The payload is signed, not encrypted: cookies are only put into tokens when
+# AOI_STREAM_TOKEN_COOKIES is set, otherwise formats needing them get none.
+_stream_serializer = URLSafeTimedSerializer(_SECRET, salt="aoi.stream")
+_STREAM_TOKEN_TTL = float(os.getenv("AOI_STREAM_TOKEN_TTL", "900"))
+_STREAM_TOKEN_COOKIES = os.getenv("AOI_STREAM_TOKEN_COOKIES", "0") not in {"0", "false", "False", ""}
+_STREAM_TOKEN_EXPIRY_MARGIN = 30.0
+
+
+def _stream_token(info: dict, fmt: dict, source: str, cookiejar) -> Optional[str]:
+    if _STREAM_TOKEN_TTL <= 0 or not fmt.get("url"):
+        return None
+    # DASH fragment lists are too large to carry around
+    if (fmt.get("protocol") or "").lower().startswith("http_dash_segments"):
+        return None
+    headers = _format_request_headers(info, fmt, source, cookiejar)
+    if "Cookie" in headers and not _STREAM_TOKEN_COOKIES:
+        return None
+    expires = time.time() + _STREAM_TOKEN_TTL
+    url_expiry = earliest_url_expiry({"url": fmt["url"]})
+    if url_expiry is not None:
+        expires = min(expires, url_expiry - _STREAM_TOKEN_EXPIRY_MARGIN)
+        if expires <= time.time():
+            return None
+    return _stream_serializer.dumps(
+        {
+            "url": fmt["url"],
+            "headers": headers,
+            "format_id": str(fmt.get("format_id")),
+            "ext": fmt.get("ext"),
+            "protocol": fmt.get("protocol"),
+            "title": info.get("title"),
+            "id": info.get("id"),
+            "extractor": info.get("extractor_key") or info.get("extractor"),
+            "exp": int(expires),
+        }
+    )
+
+
+def _load_stream_token(token: str) -> Optional[dict]:
+    """The token's payload; None if it is forged, malformed or expired."""
+    try:
+        payload = _stream_serializer.loads(token, max_age=_STREAM_TOKEN_TTL)
+    except (BadSignature, SignatureExpired):
+        return None
+    if not isinstance(payload, dict) or not payload.get("url") or payload.get("exp", 0) <= time.time():
+        return None
+    return payload
+
+
+async def _iter_process_stdout(proc, on_exit=None):
+    """Yield a subprocess' stdout, then make sure it is reaped.
+
+    ``on_exit`` is called with the return code once the process is gone.
+    """
+    try:
+        assert proc.stdout is not None
+        while True:
+            chunk = await proc.stdout.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        try:
+            if proc.returncode is None:
+                proc.kill()
+        except Exception:
+            pass
+        try:
+            await proc.wait()
+        except Exception:
+            pass
+        if on_exit is not None:
+            on_exit(proc.returncode)
+        if proc.stderr is not None:
+            try:
+                await proc.stderr.read()
+            except Exception:
+                pass
+
+
 @app.get("/api/health")
 async def health() -> dict:
     return {"status": "ok"}
 
 
-@app.post("/api/extract", response_model=ExtractResponse)
-async def extract_media(req: ExtractRequest):
-    if not req.url:
+@app.get("/api/progress/{job_id}")
+async def progress_events(job_id: str):
+    """Server-Sent Events for a job id passed to /api/extract or /api/convert_mp3.
+
+    Events are named by their ``type`` (``extract``, ``transcode``, ``stream``,
+    ``done``, ``error``); the stream ends after ``done`` or ``error``.
+    """
+    job_id = _progress_job_id(job_id)
+
+    async def _events():
+        async for event in _progress.follow(job_id):
+            if event is None:
+                yield b": keepalive\n\n"
+                continue
+            payload = json.dumps(event, separators=(",", ":"))
+            yield f"event: {event['type']}\ndata: {payload}\n\n".encode("utf-8")
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+# Metrics, cache/pool stats and loop stacks describe server internals; they are
+# only served when enabled, and then only to holders of the token when one is set
+_DEBUG_ENDPOINTS = os.getenv("AOI_DEBUG_ENDPOINTS", "0") not in {"0", "false", "False", ""}
+_DEBUG_TOKEN = os.getenv("AOI_DEBUG_TOKEN", "")
+
+
+def _require_debug_access(request: Request) -> None:
+    if not _DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if _DEBUG_TOKEN:
+        supplied = request.headers.get("authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {_DEBUG_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Missing or invalid debug token")
+
+
+@app.get("/api/metrics")
+async def metrics(request: Request) -> Response:
+    """Prometheus text exposition of the server's counters, gauges and histograms."""
+    _require_debug_access(request)
+    return Response(_metrics.expose(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/debug/loop")
+async def loop_debug(request: Request) -> dict:
+    """Event-loop lag and the stacks captured while the loop was blocked."""
+    _require_debug_access(request)
+    if _loop_monitor is None:
+        raise HTTPException(status_code=404, detail="Loop monitor disabled")
+    return {**_loop_monitor.stats(), "reports": _loop_monitor.recent_reports()}
+
+
+@app.get("/api/cache/stats")
+async def cache_stats(request: Request) -> dict:
+    """Return hit/miss counters and occupancy of the in-process caches."""
+    _require_debug_access(request)
+    return {
+        "extraction": _extraction_cache.stats(),
+        "extraction_singleflight": _extraction_flight.stats(),
+        **({"extraction_pool": _extraction_pool.stats()} if _extraction_pool is not None else {}),
+        **({"media": _media_cache.stats()} if _media_cache is not None else {}),
+        "cookies": _shared_cookies.stats(),
+        "ydl_pool": _ydl_pool.stats(),
+        **({"transcode": _transcode_cache.stats()} if _transcode_cache is not None else {}),
+    }
+
+
+@app.get("/api/upstream/stats")
+async def upstream_stats(request: Request) -> dict:
+    """Return per-host occupancy of the shared upstream connection pools."""
+    _require_debug_access(request)
+    return _upstream.stats()
+
+
+async def _extract_response(url: str) -> ExtractResponse:
+    """Extract ``url`` and describe its formats and subtitles; raises HTTPException."""
+    if not url:
         raise HTTPException(status_code=400, detail="Missing url")
 
-    parsed = urlparse(req.url)
+    parsed = urlparse(url)
     if parsed.scheme.lower() not in {"http", "https"} or not parsed.hostname:
         raise HTTPException(status_code=400, detail="Invalid source URL; must be http(s)")
 
     # First attempt with default options
     try:
-        info = await _extract_info_threaded(req.url, build_ydl_opts(req.url))
+        info, cookiejar = await _extract_info_with_cookiejar(url, build_ydl_opts(url))
     except Exception as first_err:
         # Best-effort fallback: switch UA to mobile and adjust YouTube client ordering
         try:
@@ -450,14 +1184,18 @@ async def extract_media(req: ExtractRequest):
                 "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
                 "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
             )
-            info = await _extract_info_threaded(
-                req.url,
-                build_ydl_opts(
-                    req.url,
-                    format_selector="best/bv*+ba/b",
-                    user_agent_override=mobile_ua,
-                ),
-            )
+            token = _extraction_attempt.set("fallback")
+            try:
+                info, cookiejar = await _extract_info_with_cookiejar(
+                    url,
+                    build_ydl_opts(
+                        url,
+                        format_selector="best/bv*+ba/b",
+                        user_agent_override=mobile_ua,
+                    ),
+                )
+            finally:
+                _extraction_attempt.reset(token)
         except Exception as second_err:
             raise HTTPException(status_code=400, detail=f"Extraction failed: {second_err}") from second_err
 
@@ -512,6 +1250,7 @@ async def extract_media(req: ExtractRequest):
                 direct_url=direct_url,
                 is_audio_only=is_audio_only,
                 protocol=protocol,
+                stream_token=_stream_token(info, f, url, cookiejar),
             )
         )
 
@@ -586,8 +1325,160 @@ async def extract_media(req: ExtractRequest):
     )
 
 
+@app.post("/api/extract", response_model=ExtractResponse)
+async def extract_media(req: ExtractRequest):
+    job_id = _progress_job_id(req.job_id)
+    if job_id is None:
+        return await _extract_response(req.url)
+    token = current_job.set(job_id)
+    try:
+        result = await _extract_response(req.url)
+    except HTTPException as e:
+        _report_progress("error", final=True, status=e.status_code, detail=e.detail)
+        raise
+    finally:
+        current_job.reset(token)
+    _report_progress("done", job_id, final=True, formats=len(result.formats))
+    return result
+
+
+PLAYLIST_PAGE_SIZE = int(os.getenv("AOI_PLAYLIST_PAGE_SIZE", "50"))
+PLAYLIST_MAX_PAGE_SIZE = int(os.getenv("AOI_PLAYLIST_MAX_PAGE_SIZE", "200"))
+
+
+def _entry_thumbnail(entry: dict) -> Optional[str]:
+    if entry.get("thumbnail"):
+        return entry["thumbnail"]
+    thumbs = [t for t in (entry.get("thumbnails") or []) if isinstance(t, dict) and t.get("url")]
+    return thumbs[-1]["url"] if thumbs else None
+
+
+def _entry_source_url(entry: dict) -> Optional[str]:
+    for key in ("webpage_url", "url", "original_url"):
+        value = entry.get(key)
+        if isinstance(value, str) and urlparse(value).scheme in {"http", "https"}:
+            return value
+    return None
+
+
+@app.post("/api/playlist", response_model=PlaylistResponse)
+async def extract_playlist(req: PlaylistRequest):
+    """List a playlist or channel one page at a time without resolving formats.
+
+    Entries come from a flat extraction of just the requested slice, so a
+    page costs roughly one listing request regardless of playlist length.
+    Formats are resolved per entry through ``/api/extract``.
+    """
+    if not req.url:
+        raise HTTPException(status_code=400, detail="Missing url")
+    parsed = urlparse(req.url)
+    if parsed.scheme.lower() not in {"http", "https"} or not parsed.hostname:
+        raise HTTPException(status_code=400, detail="Invalid source URL; must be http(s)")
+    try:
+        offset = int(req.cursor) if req.cursor else 0
+        if offset < 0:
+            raise ValueError(req.cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = max(1, min(req.limit or PLAYLIST_PAGE_SIZE, PLAYLIST_MAX_PAGE_SIZE))
+
+    # One extra entry tells whether another page follows
+    items = f"{offset + 1}:{offset + limit + 1}"
+    try:
+        info = await _extract_info_threaded(req.url, build_ydl_opts(req.url, playlist_items=items))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Extraction failed: {e}") from e
+
+    if info.get("_type") not in {"playlist", "multi_video"} and "entries" not in info:
+        # A single video: a one-entry "playlist" on the first page only
+        entries_raw = [info] if offset == 0 else []
+        indices = [1]
+    else:
+        entries_raw = [e for e in (info.get("entries") or []) if isinstance(e, dict)]
+        indices = info.get("requested_entries") or []
+
+    entries: List[PlaylistEntryModel] = []
+    for i, entry in enumerate(entries_raw[:limit]):
+        index = indices[i] if i < len(indices) and isinstance(indices[i], int) else offset + i + 1
+        entries.append(
+            PlaylistEntryModel(
+                index=index,
+                id=entry.get("id"),
+                title=entry.get("title"),
+                url=_entry_source_url(entry),
+                duration=entry.get("duration"),
+                thumbnail=_entry_thumbnail(entry),
+                uploader=entry.get("uploader") or entry.get("channel"),
+            )
+        )
+
+    total = info.get("playlist_count")
+    return PlaylistResponse(
+        id=info.get("id"),
+        title=info.get("title"),
+        uploader=info.get("uploader") or info.get("channel"),
+        webpage_url=info.get("webpage_url"),
+        extractor=info.get("extractor"),
+        total=total if isinstance(total, int) else None,
+        entries=entries,
+        next_cursor=str(offset + limit) if len(entries_raw) > limit else None,
+    )
+
+
+BATCH_MAX_URLS = int(os.getenv("AOI_BATCH_MAX_URLS", "500"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("AOI_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("AOI_BATCH_MAX_CONCURRENCY", "16"))
+
+
+async def _batch_extract_lines(urls: List[str], concurrency: int):
+    """Yield one NDJSON line per URL, in completion order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(index: int, url: str) -> dict:
+        async with semaphore:
+            try:
+                result = await _extract_response(url)
+            except HTTPException as e:
+                return {"index": index, "url": url, "status": e.status_code, "error": e.detail}
+            except Exception as e:
+                return {"index": index, "url": url, "status": 500, "error": f"Extraction failed: {e}"}
+        return {"index": index, "url": url, "status": 200, "result": result.model_dump()}
+
+    tasks = [asyncio.ensure_future(_one(i, u)) for i, u in enumerate(urls)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            line = await finished
+            yield (json.dumps(line, separators=(",", ":")) + "\n").encode("utf-8")
+    finally:
+        # Client went away: stop extractions nobody will read
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@app.post("/api/extract/batch")
+async def extract_media_batch(req: BatchExtractRequest):
+    """Extract many URLs; streams ``application/x-ndjson`` as each one finishes.
+
+    Every line carries the URL's ``index`` in the request, its ``url`` and
+    ``status``, plus either ``result`` (the ``/api/extract`` response) or
+    ``error``.
+    """
+    if not req.urls:
+        raise HTTPException(status_code=400, detail="Missing urls")
+    if len(req.urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"Too many urls; at most {BATCH_MAX_URLS} per batch")
+    concurrency = req.concurrency or BATCH_DEFAULT_CONCURRENCY
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY, len(req.urls)))
+    return StreamingResponse(
+        _batch_extract_lines(req.urls, concurrency),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/api/download")
-async def proxy_download(request: Request, source: str, format_id: str):
+async def proxy_download(request: Request, source: str, format_id: str, accelerate: Optional[bool] = None):
     if not source or not format_id:
         raise HTTPException(status_code=400, detail="Missing source or format_id")
 
@@ -599,12 +1490,26 @@ async def proxy_download(request: Request, source: str, format_id: str):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid source URL; must be http(s)")
 
-    # Re-extract to get fresh format URL and headers, and capture cookies
+    ydl_opts = build_ydl_opts(source, format_selector=f"{format_id}")
+    cache_key = extraction_cache_key(source, ydl_opts)
+    # Only a cached extraction can hold URLs that died since; answers for a
+    # freshly extracted URL are passed on as they are
+    cached = cache_key in _extraction_cache
+    try:
+        return await _download_format(request, source, format_id, ydl_opts, accelerate, retry_stale=cached)
+    except _StaleFormatURL:
+        # Forget the cached result and extract once more before giving up
+        _extraction_cache.invalidate(cache_key)
+        return await _download_format(request, source, format_id, ydl_opts, accelerate, retry_stale=False)
+
+
+async def _download_format(
+    request: Request, source: str, format_id: str, ydl_opts: dict, accelerate: Optional[bool], retry_stale: bool
+):
+    # Extract (or reuse a cached extraction) to get the format URL and headers, and capture cookies
     extracted_cookiejar = None
     try:
-        info, extracted_cookiejar = await _extract_info_with_cookiejar(
-            source, build_ydl_opts(source, format_selector=f"{format_id}")
-        )
+        info, extracted_cookiejar = await _extract_info_with_cookiejar(source, ydl_opts)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Extraction failed: {e}")
 
@@ -620,21 +1525,118 @@ async def proxy_download(request: Request, source: str, format_id: str):
     if not target:
         raise HTTPException(status_code=404, detail="Format not found")
 
-    direct_url = target.get("url")
+    # Merge headers: info-level + per-format + inferred referrer + cookies
+    headers = _format_request_headers(info, target, source, extracted_cookiejar)
+    return await _stream_format(request, info, target, headers, accelerate, retry_stale=retry_stale)
+
+
+@app.get("/api/stream")
+async def stream_download(
+    request: Request,
+    token: str,
+    source: Optional[str] = None,
+    format_id: Optional[str] = None,
+    accelerate: Optional[bool] = None,
+):
+    """Stream a format straight from upstream using a token from /api/extract."""
+    payload = _load_stream_token(token)
+
+    def _download_redirect() -> RedirectResponse:
+        params = {"source": source, "format_id": format_id}
+        if accelerate is not None:
+            params["accelerate"] = "true" if accelerate else "false"
+        return RedirectResponse(f"/api/download?{urlencode(params)}", status_code=307)
+
+    if payload is None:
+        if source and format_id:
+            # Expired (or from another deployment's secret): extract again
+            return _download_redirect()
+        raise HTTPException(status_code=403, detail="Invalid or expired stream token")
+    info = {"title": payload.get("title"), "id": payload.get("id"), "extractor_key": payload.get("extractor")}
+    target = {
+        "format_id": payload.get("format_id"),
+        "url": payload["url"],
+        "ext": payload.get("ext"),
+        "protocol": payload.get("protocol"),
+    }
+    try:
+        return await _stream_format(
+            request, info, target, dict(payload.get("headers") or {}), accelerate, retry_stale=bool(source and format_id)
+        )
+    except _StaleFormatURL:
+        # /api/download drops the cached extraction the token was issued from
+        return _download_redirect()
 
-    # Merge headers: info-level + per-format + inferred referrer
-    headers = (info.get("http_headers") or {}).copy()
-    if target.get("http_headers"):
-        headers.update(target.get("http_headers") or {})
 
-    # Ensure we always include a decent UA and a sensible Referer / Origin
-    headers.setdefault("User-Agent", _get_default_user_agent())
-    referer = _build_referer_for(source)
-    if referer:
-        headers.setdefault("Referer", referer)
-        headers.setdefault("Origin", referer[:-1])
+# Upstream answers meaning the signed format URL itself is no longer valid
+_STALE_URL_STATUSES = {403, 404, 410}
+
 
-    _merge_extracted_cookies(headers, info, extracted_cookiejar, direct_url)
+class _StaleFormatURL(Exception):
+    """The upstream refused the format URL; the caller may extract it again."""
+
+
+async def _stream_format(
+    request: Request, info: dict, target: dict, headers: dict, accelerate: Optional[bool], retry_stale: bool = False
+):
+    """Proxy ``target`` from upstream (or the media cache) to the client.
+
+    With ``retry_stale``, a 403/404/410 for the URL (after the curl_cffi
+    retry, for direct URLs) raises :class:`_StaleFormatURL` instead of being
+    passed on to the client.
+    """
+    direct_url = target.get("url")
+
+    # Serve popular formats straight from the disk cache (any Range)
+    media_cache_key = _media_cache_key(info, target) if _media_cache is not None else None
+    if media_cache_key:
+        entry = await _media_cache.lookup(media_cache_key)
+        if entry is not None:
+            filename = f"{info.get('title') or 'download'}.{target.get('ext') or 'bin'}"
+            return RangeFileResponse(
+                entry.path,
+                entry.size,
+                file=entry.file,
+                range_header=request.headers.get("Range"),
+                media_type=entry.meta.get("content_type") or "application/octet-stream",
+                headers={
+                    "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+                    "Cache-Control": "no-store",
+                    "X-Content-Type-Options": "nosniff",
+                    "X-Cache": "HIT",
+                },
+            )
+
+    # HLS playlists and DASH fragment lists are stitched into a single body
+    if is_manifest_protocol(target.get("protocol")):
+        try:
+            with trace_span("manifest"):
+                media_type, ext, body = await open_manifest_stream(
+                    _upstream.get("media"),
+                    target,
+                    headers,
+                    lookahead=_FRAGMENT_LOOKAHEAD,
+                    retries=_FRAGMENT_RETRIES,
+                    read_timeout=_FRAGMENT_READ_TIMEOUT,
+                )
+        except ManifestError as e:
+            if retry_stale and e.status in _STALE_URL_STATUSES:
+                raise _StaleFormatURL() from e
+            raise HTTPException(status_code=422, detail=f"Unsupported manifest: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+        filename = f"{info.get('title') or 'download'}.{ext}"
+        return StreamingResponse(
+            _metered(body, "download"),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+                "Cache-Control": "no-store",
+                "X-Accel-Buffering": "no",
+                "X-Content-Type-Options": "nosniff",
+                "Accept-Ranges": "none",
+            },
+        )
 
     # Forward client Range if present (enables resumable/partial content)
     client_range = request.headers.get("Range")
@@ -647,18 +1649,15 @@ async def proxy_download(request: Request, source: str, format_id: str):
     filename = f"{title}.{ext}"
 
     # Open upstream connection first to obtain real status and headers (supports 206 for Range)
-    # Enable HTTP/2 if available for better CDN compatibility (requires httpx[http2])
-    client = httpx.AsyncClient(
-        follow_redirects=True,
-        timeout=httpx.Timeout(connect=15.0, read=None, write=30.0, pool=None),
-        http2=True,
-        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
-    )
+    # The shared client keeps warm HTTP/2 connections to the CDN across requests
+    client = _upstream.get("media")
     try:
         request_up = client.build_request("GET", direct_url, headers=headers)
-        resp = await client.send(request_up, stream=True)
+        sent_at = time.perf_counter()
+        with trace_span("upstream"):
+            resp = await client.send(request_up, stream=True)
+        _TTFB_DOWNLOAD.observe(time.perf_counter() - sent_at)
     except Exception as e:
-        await client.aclose()
         # Upstream network error
         raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
 
@@ -693,20 +1692,23 @@ async def proxy_download(request: Request, source: str, format_id: str):
 
     # If we hit common anti-bot statuses, retry with curl_cffi (Chrome impersonation)
     if upstream_status in {401, 403, 405, 409, 410, 412, 418, 421, 429, 451} and curl_requests:
+        _CURL_FALLBACKS.labels(str(upstream_status)).inc()
         sess = None
-        curl_resp = None
         try:
             impersonate = os.getenv("AOI_IMPERSONATE", "chrome")
-            # curl_cffi is synchronous; wrap its streaming in an async generator
-            sess = curl_requests.Session()
-            # Allow redirects and stream content
-            curl_resp = sess.get(
-                direct_url,
-                headers=dict(headers),
-                stream=True,
-                allow_redirects=True,
-                impersonate=impersonate,
-            )
+            # Native asyncio session: curl drives its sockets from the event
+            # loop, so no thread or per-chunk thread hop is involved
+            sess = curl_requests.AsyncSession()
+            with trace_span("curl_fallback", str(upstream_status)):
+                curl_resp = await sess.get(
+                    direct_url,
+                    headers=dict(headers),
+                    stream=True,
+                    allow_redirects=True,
+                    impersonate=impersonate,
+                )
+            if retry_stale and curl_resp.status_code in _STALE_URL_STATUSES:
+                raise _StaleFormatURL()
 
             # Merge headers again from curl response
             ch = curl_resp.headers or {}
@@ -715,61 +1717,66 @@ async def proxy_download(request: Request, source: str, format_id: str):
                 if name in ch and ch.get(name):
                     response_headers[name] = ch.get(name)
 
-            # Stream response from a background thread to avoid blocking the event loop
-            async def curl_body_iter():
-                q: thread_queue.Queue[Optional[bytes]] = thread_queue.Queue(maxsize=10)
-
-                def producer():
-                    try:
-                        for chunk in curl_resp.iter_content(chunk_size=64 * 1024):
-                            if chunk:
-                                q.put(chunk)
-                    finally:
-                        q.put(None)
-
-                t = threading.Thread(target=producer, daemon=True)
-                t.start()
-
-                try:
-                    while True:
-                        chunk = await anyio.to_thread.run_sync(q.get)
-                        if chunk is None:
-                            break
-                        if chunk:
-                            yield chunk
-                finally:
-                    try:
-                        curl_resp.close()
-                    finally:
-                        if sess is not None:
-                            try:
-                                sess.close()
-                            except Exception:
-                                pass
-
             # Switch to curl stream; original httpx response is no longer needed
             await resp.aclose()
-            await client.aclose()
 
+            curl_session, sess = sess, None
             return StreamingResponse(
-                curl_body_iter(),
+                _metered(_iter_curl_stream(curl_session, curl_resp), "download"),
                 media_type=media_type,
                 headers=response_headers,
                 status_code=curl_resp.status_code,
             )
-        except Exception:
-            if curl_resp is not None:
-                try:
-                    curl_resp.close()
-                except Exception:
-                    pass
+        except Exception as e:
             if sess is not None:
-                try:
-                    sess.close()
-                except Exception:
-                    pass
+                await _close_curl_session(sess)
+            if isinstance(e, _StaleFormatURL):
+                await resp.aclose()
+                raise
             # Fall back to original resp below
-            pass
+
+    if retry_stale and upstream_status in _STALE_URL_STATUSES:
+        await resp.aclose()
+        raise _StaleFormatURL()
+
+    # Accelerated mode: fetch the body as concurrent Range requests when the
+    # upstream supports ranges and the body is large enough to benefit
+    if accelerate is None:
+        accelerate = _ACCELERATE_DEFAULT
+    span = upstream_byte_span(upstream_status, upstream_headers) if accelerate else None
+    if (
+        span is not None
+        and (upstream_status == 206 or (upstream_headers.get("Accept-Ranges") or "").lower() == "bytes")
+        and not upstream_headers.get("Content-Encoding")
+        and span[1] - span[0] + 1 >= _SEGMENT_MIN_BYTES
+    ):
+        start, end, total = span
+        await resp.aclose()
+        response_headers["Content-Length"] = str(end - start + 1)
+        response_headers["Accept-Ranges"] = "bytes"
+        if upstream_status == 206:
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        writer = _begin_media_fill(media_cache_key, upstream_status, client_range, response_headers, media_type)
+        return StreamingResponse(
+            _metered(
+                tee_to_cache(
+                    iter_segmented(
+                        client,
+                        direct_url,
+                        headers,
+                        start,
+                        end,
+                        segment_size=_SEGMENT_SIZE,
+                        concurrency=_SEGMENT_CONCURRENCY,
+                    ),
+                    writer,
+                ),
+                "download",
+            ),
+            media_type=media_type,
+            headers=response_headers,
+            status_code=upstream_status,
+        )
 
     async def body_iter():
         try:
@@ -778,16 +1785,161 @@ async def proxy_download(request: Request, source: str, format_id: str):
                     yield chunk
         finally:
             await resp.aclose()
-            await client.aclose()
 
+    writer = _begin_media_fill(media_cache_key, upstream_status, client_range, response_headers, media_type)
     return StreamingResponse(
-        body_iter(),
+        _metered(tee_to_cache(body_iter(), writer) if writer is not None else body_iter(), "download"),
         media_type=media_type,
         headers=response_headers,
         status_code=upstream_status,
     )
 
 
+class JobRequest(BaseModel):
+    source: str
+    format_id: str
+
+
+# Server-side download jobs; created in the lifespan when AOI_JOBS_DIR is set
+_job_queue: Optional[JobQueue] = None
+
+
+async def _resolve_job_target(job: Job) -> DownloadTarget:
+    """Re-extract a job's source right before an attempt (signed URLs expire)."""
+    ydl_opts = build_ydl_opts(job.source, format_selector=f"{job.format_id}")
+    if job.error:
+        # The previous attempt failed; don't hand it the same cached URLs again
+        _extraction_cache.invalidate(extraction_cache_key(job.source, ydl_opts))
+    info, cookiejar = await _extract_info_with_cookiejar(job.source, ydl_opts)
+    if info.get("entries"):
+        info = info["entries"][0]
+    target = None
+    for f in info.get("formats", []) or []:
+        if str(f.get("format_id")) == str(job.format_id) and f.get("url"):
+            target = f
+            break
+    if not target:
+        raise JobError("Format not found")
+
+    headers = _format_request_headers(info, target, job.source, cookiejar)
+    title = info.get("title") or "download"
+    client = _upstream.get("media")
+    if is_manifest_protocol(target.get("protocol")):
+        media_type, ext, body = await open_manifest_stream(
+            client,
+            target,
+            headers,
+            lookahead=_FRAGMENT_LOOKAHEAD,
+            retries=_FRAGMENT_RETRIES,
+            read_timeout=_FRAGMENT_READ_TIMEOUT,
+        )
+        return DownloadTarget(f"{title}.{ext}", media_type, stream=lambda: body)
+    return DownloadTarget(
+        f"{title}.{target.get('ext') or 'bin'}", url=target["url"], headers=headers, client=client
+    )
+
+
+def _build_job_queue() -> Optional[JobQueue]:
+    directory = os.getenv("AOI_JOBS_DIR")
+    if not directory:
+        return None
+    return JobQueue(
+        directory,
+        _resolve_job_target,
+        workers=int(os.getenv("AOI_JOB_WORKERS", "2")),
+        retries=int(os.getenv("AOI_JOB_RETRIES", "3")),
+        max_queued=int(os.getenv("AOI_JOB_MAX_QUEUED", "100")),
+        retention_seconds=float(os.getenv("AOI_JOB_RETENTION", str(24 * 3600))),
+    )
+
+
+def _jobs() -> JobQueue:
+    if _job_queue is None:
+        raise HTTPException(status_code=503, detail="Download jobs are disabled (set AOI_JOBS_DIR)")
+    if not _job_queue.active:
+        # Job state lives in the one process holding the jobs directory
+        raise HTTPException(status_code=503, detail="Download jobs need a single server worker process")
+    return _job_queue
+
+
+def _job_owner(request: Request) -> str:
+    """The session's user id; jobs require a session (a guest one will do)."""
+    sess = _read_session(request)
+    if not sess or not sess.get("uid"):
+        raise HTTPException(status_code=401, detail="Sign in or continue as guest to use download jobs")
+    return sess["uid"]
+
+
+def _owned_job(request: Request, job_id: str) -> Job:
+    owner = _job_owner(request)
+    job = _jobs().get(job_id)
+    # Every job is private to the session that created it
+    if job is None or job.owner != owner:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/api/jobs")
+async def create_job(req: JobRequest, request: Request) -> dict:
+    """Queue a server-side download of ``format_id``; fetch it later from /api/jobs/{id}/file."""
+    try:
+        parsed = urlparse(req.source)
+        if parsed.scheme not in {"http", "https"} or not parsed.netloc:
+            raise ValueError("invalid")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid source URL; must be http(s)")
+    if not req.format_id:
+        raise HTTPException(status_code=400, detail="Missing format_id")
+    owner = _job_owner(request)
+    try:
+        job = await _jobs().submit(req.source, req.format_id, owner=owner)
+    except QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs", headers={"Retry-After": "30"})
+    return job.to_dict()
+
+
+@app.get("/api/jobs")
+async def list_jobs(request: Request, status: Optional[str] = None) -> dict:
+    owner = _job_owner(request)
+    return {"jobs": [job.to_dict() for job in _jobs().list(owner=owner, status=status)]}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, request: Request) -> dict:
+    return _owned_job(request, job_id).to_dict()
+
+
+@app.get("/api/jobs/{job_id}/file")
+async def get_job_file(job_id: str, request: Request):
+    job = _owned_job(request, job_id)
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    path = _jobs().data_path(job.id)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        raise HTTPException(status_code=410, detail="Job file is gone")
+    return RangeFileResponse(
+        path,
+        size,
+        range_header=request.headers.get("range"),
+        media_type=job.content_type or "application/octet-stream",
+        headers={
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(job.filename or 'download')}",
+            "Cache-Control": "no-store",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(job_id: str, request: Request) -> dict:
+    """Cancel a job if it is still running and delete it with its file."""
+    job = _owned_job(request, job_id)
+    await _jobs().delete(job.id)
+    return {"ok": True}
+
+
 @app.get("/api/subtitle")
 async def proxy_subtitle(request: Request, source: str, lang: str, ext: Optional[str] = None, auto: bool = False):
     """Proxy subtitle or auto-caption track to client, preserving headers/cookies."""
@@ -835,17 +1987,14 @@ async def proxy_subtitle(request: Request, source: str, lang: str, ext: Optional
         headers.setdefault("Referer", referer)
         headers.setdefault("Origin", referer[:-1])
 
-    client = httpx.AsyncClient(
-        follow_redirects=True,
-        timeout=httpx.Timeout(connect=15.0, read=None, write=30.0, pool=None),
-        http2=True,
-        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
-    )
+    client = _upstream.get("subtitle")
     try:
         req_up = client.build_request("GET", s_url, headers=headers)
-        resp = await client.send(req_up, stream=True)
+        sent_at = time.perf_counter()
+        with trace_span("upstream"):
+            resp = await client.send(req_up, stream=True)
+        _TTFB_SUBTITLE.observe(time.perf_counter() - sent_at)
     except Exception as e:
-        await client.aclose()
         raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
 
     upstream_status = resp.status_code
@@ -873,16 +2022,37 @@ async def proxy_subtitle(request: Request, source: str, lang: str, ext: Optional
                     yield chunk
         finally:
             await resp.aclose()
-            await client.aclose()
 
-    return StreamingResponse(body_iter(), media_type=media_type, headers=response_headers, status_code=upstream_status)
+    return StreamingResponse(
+        _metered(body_iter(), "subtitle"), media_type=media_type, headers=response_headers, status_code=upstream_status
+    )
 
 
 @app.get("/api/convert_mp3")
-async def convert_mp3(request: Request, source: str, format_id: Optional[str] = None, bitrate_kbps: Optional[int] = 192):
+async def convert_mp3(
+    request: Request,
+    source: str,
+    format_id: Optional[str] = None,
+    bitrate_kbps: Optional[int] = 192,
+    job_id: Optional[str] = None,
+):
     """Transcode selected format (or best audio) to MP3 and stream it."""
     if not source:
         raise HTTPException(status_code=400, detail="Missing source")
+    job_id = _progress_job_id(job_id)
+    if job_id is None:
+        return await _convert_mp3(request, source, format_id, bitrate_kbps, None)
+    token = current_job.set(job_id)
+    try:
+        return await _convert_mp3(request, source, format_id, bitrate_kbps, job_id)
+    except HTTPException as e:
+        _report_progress("error", final=True, status=e.status_code, detail=e.detail)
+        raise
+    finally:
+        current_job.reset(token)
+
+
+async def _convert_mp3(request: Request, source: str, format_id: Optional[str], bitrate_kbps: Optional[int], job_id: Optional[str]):
 
     # Validate source
     try:
@@ -892,6 +2062,13 @@ async def convert_mp3(request: Request, source: str, format_id: Optional[str] =
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid source URL; must be http(s)")
 
+    bitrate = int(bitrate_kbps or 192)
+    transcode_key = _transcode_cache_key(source, format_id, bitrate) if _transcode_cache is not None else None
+    if transcode_key is not None:
+        cached = await _transcode_cache_response(request, transcode_key, job_id)
+        if cached is not None:
+            return cached
+
     # Extract to obtain direct URL and headers
     extracted_cookiejar = None
     try:
@@ -933,16 +2110,7 @@ async def convert_mp3(request: Request, source: str, format_id: Optional[str] =
         raise HTTPException(status_code=404, detail="Format URL not found")
 
     # Build headers for ffmpeg
-    headers = (info.get("http_headers") or {}).copy()
-    if target.get("http_headers"):
-        headers.update(target.get("http_headers") or {})
-    headers.setdefault("User-Agent", _get_default_user_agent())
-    referer = _build_referer_for(source)
-    if referer:
-        headers.setdefault("Referer", referer)
-        headers.setdefault("Origin", referer[:-1])
-
-    _merge_extracted_cookies(headers, info, extracted_cookiejar, direct_url)
+    headers = _format_request_headers(info, target, source, extracted_cookiejar)
 
     # Construct header lines for ffmpeg
     header_lines = "\r\n".join([f"{k}: {v}" for k, v in headers.items()]) + "\r\n"
@@ -960,51 +2128,247 @@ async def convert_mp3(request: Request, source: str, format_id: Optional[str] =
         "-i", direct_url,
         "-vn",
         "-acodec", "libmp3lame",
-        "-b:a", f"{int(bitrate_kbps or 192)}k",
+        "-b:a", f"{bitrate}k",
         "-f", "mp3",
         "-",
     ]
+    if job_id is not None:
+        # Machine-readable progress blocks, interleaved with errors on stderr
+        cmd[-1:-1] = ["-progress", "pipe:2"]
+
+    if transcode_key is not None:
+        # Another request may have started the same encode while we extracted
+        cached = await _transcode_cache_response(request, transcode_key, job_id)
+        if cached is not None:
+            return cached
 
     try:
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
+        with trace_span("ffmpeg_spawn"):
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start transcoder: {e}")
+    ffmpeg_exited = _track_ffmpeg("mp3")
+
+    response_headers = _mp3_response_headers(filename)
+    if job_id is not None:
+        duration = info.get("duration")
+        _report_progress("transcode", job_id, phase="start", duration=duration)
+        if proc.stderr is not None:
+            # Stands in for stderr: whoever reads it on failure gets the error text
+            proc.stderr = FfmpegProgressReader(proc.stderr, _ffmpeg_progress_callback(job_id, duration)).start()
+
+    if transcode_key is not None:
+        job = await _transcode_cache.start(
+            transcode_key, proc, {"content_type": "audio/mpeg", "filename": filename}, on_exit=ffmpeg_exited
+        )
+        if job is not None:
+            response_headers["X-Cache"] = "MISS"
+            return StreamingResponse(
+                _metered(_iter_with_progress(job.tail(), job_id), "convert_mp3"),
+                media_type="audio/mpeg",
+                headers=response_headers,
+            )
 
-    async def ffmpeg_iter():
-        try:
-            assert proc.stdout is not None
-            while True:
-                chunk = await proc.stdout.read(64 * 1024)
-                if not chunk:
-                    break
+    return StreamingResponse(
+        _metered(_iter_with_progress(_iter_process_stdout(proc, ffmpeg_exited), job_id), "convert_mp3"),
+        media_type="audio/mpeg",
+        headers=response_headers,
+    )
+
+
+def _ffmpeg_progress_callback(job_id: str, duration: Optional[float]):
+    def _on_update(update: dict) -> None:
+        out_time = update.get("out_time")
+        speed = update.get("speed")
+        if duration and out_time is not None and speed:
+            update["eta"] = round(max(0.0, duration - out_time) / speed, 1)
+        if duration and out_time is not None:
+            update["percent"] = round(min(100.0, 100.0 * out_time / duration), 1)
+        _report_progress("transcode", job_id, phase="encoding", **update)
+
+    return _on_update
+
+
+def _iter_with_progress(chunks, job_id: Optional[str], interval: float = 0.5):
+    """Pass ``chunks`` through, publishing the bytes sent so far for ``job_id``."""
+    if job_id is None:
+        return chunks
+    return _progress_stream(chunks, job_id, interval)
+
+
+async def _progress_stream(chunks, job_id: str, interval: float):
+    sent = 0
+    last_report = 0.0
+    try:
+        async for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+            now = time.monotonic()
+            if now - last_report >= interval:
+                last_report = now
+                _report_progress("stream", job_id, bytes=sent)
+    except Exception as e:
+        _report_progress("error", job_id, final=True, bytes=sent, detail=str(e) or type(e).__name__)
+        raise
+    _report_progress("done", job_id, final=True, bytes=sent)
+
+
+def _mp3_response_headers(filename: str) -> dict:
+    return {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        "Cache-Control": "no-store",
+        "X-Content-Type-Options": "nosniff",
+    }
+
+
+async def _transcode_cache_response(request: Request, key: str, job_id: Optional[str] = None) -> Optional[Response]:
+    """Serve a finished conversion from disk, or tail one that is still encoding."""
+    entry = await _transcode_cache.lookup(key)
+    if entry is not None:
+        headers = _mp3_response_headers(entry.meta.get("filename") or "audio.mp3")
+        headers["X-Cache"] = "HIT"
+        _report_progress("done", job_id, final=True, cached=True, bytes=entry.size)
+        return RangeFileResponse(
+            entry.path,
+            entry.size,
+            file=entry.file,
+            range_header=request.headers.get("range"),
+            media_type="audio/mpeg",
+            headers=headers,
+        )
+    job = _transcode_cache.running(key)
+    if job is not None:
+        headers = _mp3_response_headers(job.meta.get("filename") or "audio.mp3")
+        headers["X-Cache"] = "TAIL"
+        return StreamingResponse(
+            _metered(_iter_with_progress(job.tail(), job_id), "convert_mp3"), media_type="audio/mpeg", headers=headers
+        )
+    return None
+
+
+async def _close_curl_session(sess) -> None:
+    # Closing the session removes its handles from curl's multi handle, which
+    # also ends a transfer that is stalled waiting for data
+    try:
+        with anyio.CancelScope(shield=True):
+            await sess.close()
+    except Exception:
+        pass
+
+
+async def _iter_curl_stream(sess, curl_resp):
+    """Yield a streamed curl_cffi response; abort the transfer if the client goes away."""
+    completed = False
+    try:
+        async for chunk in curl_resp.aiter_content():
+            if chunk:
                 yield chunk
-        finally:
-            try:
-                if proc.returncode is None:
-                    proc.kill()
-            except Exception:
-                pass
-            try:
-                await proc.wait()
-            except Exception:
-                pass
-            if proc.stderr is not None:
-                try:
-                    await proc.stderr.read()
-                except Exception:
-                    pass
+        completed = True
+    finally:
+        if not completed:
+            # Makes curl's write callback fail on the next chunk
+            quit_now = getattr(curl_resp, "quit_now", None)
+            if quit_now is not None:
+                quit_now.set()
+        await _close_curl_session(sess)
+
+
+def _ffmpeg_header_args(headers: dict) -> List[str]:
+    if not headers:
+        return []
+    return ["-headers", "\r\n".join(f"{k}: {v}" for k, v in headers.items()) + "\r\n"]
+
+
+@app.get("/api/download_merged")
+async def download_merged(
+    request: Request,
+    source: str,
+    video_format_id: str,
+    audio_format_id: str,
+    container: str = "auto",
+):
+    """Stream-copy a separate video and audio format into one fMP4/Matroska stream."""
+    if not source or not video_format_id or not audio_format_id:
+        raise HTTPException(status_code=400, detail="Missing source, video_format_id or audio_format_id")
+
+    try:
+        parsed_source = urlparse(source)
+        if parsed_source.scheme not in {"http", "https"} or not parsed_source.netloc:
+            raise ValueError("invalid")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid source URL; must be http(s)")
+
+    container = (container or "auto").lower()
+    if container not in {"auto", "mp4", "mkv"}:
+        raise HTTPException(status_code=400, detail="container must be auto, mp4 or mkv")
+
+    try:
+        info, extracted_cookiejar = await _extract_info_with_cookiejar(
+            source, build_ydl_opts(source, format_selector=f"{video_format_id}+{audio_format_id}")
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Extraction failed: {e}")
+
+    if info.get("entries"):
+        info = info["entries"][0]
 
+    formats_by_id = {str(f.get("format_id")): f for f in info.get("formats", []) or [] if f.get("url")}
+    video = formats_by_id.get(str(video_format_id))
+    audio = formats_by_id.get(str(audio_format_id))
+    if not video or video.get("vcodec") == "none":
+        raise HTTPException(status_code=404, detail="Video format not found")
+    if not audio or audio.get("acodec") == "none":
+        raise HTTPException(status_code=404, detail="Audio format not found")
+
+    if container == "auto":
+        # WebM/VP9/Opus pairs go to Matroska; everything else to fragmented MP4
+        exts = {(video.get("ext") or "").lower(), (audio.get("ext") or "").lower()}
+        container = "mkv" if "webm" in exts else "mp4"
+
+    # ffmpeg opens both inputs itself and reads them concurrently; -c copy
+    # remuxes without re-encoding so throughput is bound by the network
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+    for fmt in (video, audio):
+        cmd += _ffmpeg_header_args(_format_request_headers(info, fmt, source, extracted_cookiejar))
+        if not is_manifest_protocol(fmt.get("protocol")):
+            cmd += ["-reconnect", "1", "-reconnect_delay_max", "5"]
+        cmd += ["-i", fmt["url"]]
+    cmd += ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy"]
+    if container == "mp4":
+        cmd += ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+        media_type = "video/mp4"
+    else:
+        cmd += ["-f", "matroska"]
+        media_type = "video/x-matroska"
+    cmd.append("-")
+
+    try:
+        with trace_span("ffmpeg_spawn"):
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start muxer: {e}")
+    ffmpeg_exited = _track_ffmpeg("merge")
+
+    filename = f"{info.get('title') or 'video'}.{container}"
     response_headers = {
         "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
         "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
         "X-Content-Type-Options": "nosniff",
     }
-
-    return StreamingResponse(ffmpeg_iter(), media_type="audio/mpeg", headers=response_headers)
+    return StreamingResponse(
+        _metered(_iter_process_stdout(proc, ffmpeg_exited), "download_merged"),
+        media_type=media_type,
+        headers=response_headers,
+    )
 
 
 @app.get("/api/cookies/status")
@@ -1012,14 +2376,7 @@ def cookies_status() -> dict:
     """Return whether a cookie file is configured and exists."""
     cookiefile = os.getenv("AOI_COOKIEFILE")
     if not cookiefile:
-        for path in [
-            os.path.join(APP_DIR, ".cookies.txt"),
-            os.path.join(REPO_ROOT, "cookies.txt"),
-            os.path.join(REPO_ROOT, ".cookies.txt"),
-        ]:
-            if os.path.exists(path):
-                cookiefile = path
-                break
+        cookiefile = next((path for path in _cookiefile_candidates() if os.path.exists(path)), None)
     enabled = bool(cookiefile and os.path.exists(cookiefile))
     return {"enabled": enabled, **({"path": cookiefile} if cookiefile else {})}
 
@@ -1034,16 +2391,61 @@ def delete_me(request: Request, response: Response):
         _clear_session(response)
         return {"ok": True}
     uid = sess.get("uid")
-    with _users_lock:
-        db = _load_users()
-        before = len(db.get("users", []))
-        db["users"] = [u for u in db.get("users", []) if u.get("id") != uid]
-        if len(db.get("users", [])) != before:
-            _save_users(db)
+    _users().delete(uid)
     _clear_session(response)
     return {"ok": True}
 
 
+# Extractors the frontend advertises, with a URL whose host gives the same
+# Referer/Origin headers (and so the same pool key) as real requests
+_WARM_EXTRACTORS = (
+    ("Youtube", "https://www.youtube.com/"),
+    ("TikTok", "https://www.tiktok.com/"),
+    ("Facebook", "https://www.facebook.com/"),
+    ("Instagram", "https://www.instagram.com/"),
+    ("Soundcloud", "https://soundcloud.com/"),
+    ("Generic", None),
+)
+
+
+def _warm_extractors() -> None:
+    """Import the extractor registry and leave one ready instance per advertised site in the pool."""
+    from yt_dlp.extractor import gen_extractor_classes
+
+    list(gen_extractor_classes())
+    for key, source in _WARM_EXTRACTORS:
+        # Checked out and given back like an extraction, with the shared cookie jar
+        with _ydl_pool.checkout(build_ydl_opts(source)) as ydl:
+            try:
+                ydl.get_info_extractor(key)
+            except Exception:
+                pass
+
+
+def _build_warmup() -> Warmup:
+    warmup = Warmup(import_seconds=time.perf_counter() - _IMPORT_STARTED)
+    # Parsed first, so the warmed YoutubeDL instances start from the shared jar
+    warmup.add("cookies", _shared_cookies.current)
+    warmup.add("extractors", _warm_extractors)
+    warmup.add("user_store", _users)
+    # Building the SSL contexts is blocking work too
+    warmup.add("upstream_clients", _upstream.warm)
+    if _extraction_pool is not None:
+        warmup.add("extraction_pool", _extraction_pool.start, blocking=False)
+    return warmup
+
+
+_warmup = _build_warmup()
+
+
+@app.get("/api/ready")
+async def ready(response: Response) -> dict:
+    """Readiness: 503 until the startup warm-up has finished (see /api/health for liveness)."""
+    if not _warmup.ready:
+        response.status_code = 503
+    return _warmup.report()
+
+
 # Serve frontend (Vite build) if present
 if os.path.exists(DIST_DIR):
     app.mount("/", StaticFiles(directory=DIST_DIR, html=True), name="static")
@@ -0,0 +1,304 @@
+"""Stream HLS and DASH formats as one continuous body.
+
+yt-dlp reports many Facebook, Instagram and live formats as HLS playlists or
+DASH fragment lists, which cannot be passed through as a single URL. This
+module resolves the fragments, fetches them concurrently with a bounded
+lookahead (retrying each fragment individually) and yields them in order, so
+the client receives a plain MPEG-TS or fragmented MP4 stream without any
+temporary files.
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import anyio
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_HLS_PROTOCOLS = {"m3u8", "m3u8_native"}
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+class ManifestError(Exception):
+    """The manifest cannot be streamed (unsupported, malformed or unreachable).
+
+    ``status`` is the upstream HTTP status when a request was refused.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Fragment:
+    url: str
+    seq: int = 0
+    byterange: Optional[Tuple[int, int]] = None  # (offset, length)
+    key_uri: Optional[str] = None
+    key_iv: Optional[bytes] = None
+
+
+@dataclass
+class MediaPlaylist:
+    fragments: List[Fragment] = field(default_factory=list)
+    init: Optional[Fragment] = None
+    target_duration: float = 6.0
+    endlist: bool = False
+    variants: List[Tuple[int, str]] = field(default_factory=list)  # (bandwidth, url) for master playlists
+
+
+def is_manifest_protocol(protocol: Optional[str]) -> bool:
+    proto = (protocol or "").lower()
+    return proto in _HLS_PROTOCOLS or proto.startswith("http_dash_segments")
+
+
+def _parse_attrs(value: str) -> Dict[str, str]:
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(value)}
+
+
+def _parse_byterange(value: str, default_offset: int) -> Tuple[int, int]:
+    length, _, offset = value.partition("@")
+    return (int(offset) if offset else default_offset), int(length)
+
+
+def parse_m3u8(text: str, base_url: str) -> MediaPlaylist:
+    """Parse a master or media playlist into absolute fragment URLs."""
+    lines = [ln.strip() for ln in (text or "").splitlines()]
+    if not lines or lines[0] != "#EXTM3U":
+        raise ManifestError("Not an M3U8 playlist")
+    playlist = MediaPlaylist()
+    seq = 0
+    key_uri: Optional[str] = None
+    key_iv: Optional[bytes] = None
+    pending_byterange: Optional[str] = None
+    pending_bandwidth: Optional[int] = None
+    next_offsets: Dict[str, int] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = _parse_attrs(line.split(":", 1)[1])
+            pending_bandwidth = int(attrs.get("BANDWIDTH") or 0)
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            seq = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            playlist.target_duration = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-ENDLIST"):
+            playlist.endlist = True
+        elif line.startswith("#EXT-X-KEY:"):
+            attrs = _parse_attrs(line.split(":", 1)[1])
+            method = (attrs.get("METHOD") or "NONE").upper()
+            if method == "NONE":
+                key_uri, key_iv = None, None
+            elif method == "AES-128":
+                key_uri = urljoin(base_url, attrs.get("URI") or "")
+                iv = attrs.get("IV")
+                key_iv = bytes.fromhex(iv[2:] if iv.lower().startswith("0x") else iv).rjust(16, b"\0") if iv else None
+            else:
+                raise ManifestError(f"Unsupported HLS encryption: {method}")
+        elif line.startswith("#EXT-X-MAP:"):
+            attrs = _parse_attrs(line.split(":", 1)[1])
+            init_url = urljoin(base_url, attrs.get("URI") or "")
+            byterange = _parse_byterange(attrs["BYTERANGE"], 0) if attrs.get("BYTERANGE") else None
+            playlist.init = Fragment(url=init_url, byterange=byterange)
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            pending_byterange = line.split(":", 1)[1]
+        elif line.startswith("#"):
+            continue
+        else:
+            url = urljoin(base_url, line)
+            if pending_bandwidth is not None:
+                playlist.variants.append((pending_bandwidth, url))
+                pending_bandwidth = None
+                continue
+            byterange = None
+            if pending_byterange:
+                byterange = _parse_byterange(pending_byterange, next_offsets.get(url, 0))
+                next_offsets[url] = byterange[0] + byterange[1]
+                pending_byterange = None
+            playlist.fragments.append(Fragment(url=url, seq=seq, byterange=byterange, key_uri=key_uri, key_iv=key_iv))
+            seq += 1
+    return playlist
+
+
+class _FragmentFetcher:
+    def __init__(self, client: httpx.AsyncClient, headers: dict, retries: int, read_timeout: float = 30.0):
+        self.client = client
+        self.headers = {k: v for k, v in headers.items() if k.lower() != "range"}
+        self.retries = max(0, int(retries))
+        # Fragments are small, so unlike whole-file streams a stalled read
+        # is bounded (and retried) even on a client without a read timeout
+        limits = client.timeout
+        self.timeout = httpx.Timeout(connect=limits.connect, read=read_timeout, write=limits.write, pool=limits.pool)
+        self._keys: Dict[str, "asyncio.Task[bytes]"] = {}
+        self.retried = 0
+
+    async def get_bytes(self, url: str, byterange: Optional[Tuple[int, int]] = None) -> bytes:
+        headers = dict(self.headers)
+        if byterange:
+            headers["Range"] = f"bytes={byterange[0]}-{byterange[0] + byterange[1] - 1}"
+        for attempt in range(self.retries + 1):
+            try:
+                resp = await self.client.send(
+                    self.client.build_request("GET", url, headers=headers, timeout=self.timeout)
+                )
+                if resp.status_code not in (200, 206):
+                    raise ManifestError(f"Fragment request failed with HTTP {resp.status_code}", resp.status_code)
+                return resp.content
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= self.retries:
+                    raise
+                self.retried += 1
+                logger.debug("Retrying fragment %s after error: %s", url, e)
+                await asyncio.sleep(0.25 * (attempt + 1))
+        raise ManifestError("unreachable")
+
+    async def fetch(self, fragment: Fragment) -> bytes:
+        data = await self.get_bytes(fragment.url, fragment.byterange)
+        if fragment.key_uri:
+            task = self._keys.get(fragment.key_uri)
+            if task is None:
+                task = asyncio.ensure_future(self.get_bytes(fragment.key_uri))
+                self._keys[fragment.key_uri] = task
+            key = await asyncio.shield(task)
+            iv = fragment.key_iv or fragment.seq.to_bytes(16, "big")
+            data = await anyio.to_thread.run_sync(_decrypt_aes128, data, key, iv)
+        return data
+
+
+def _decrypt_aes128(data: bytes, key: bytes, iv: bytes) -> bytes:
+    from yt_dlp.aes import aes_cbc_decrypt_bytes, unpad_pkcs7
+
+    return unpad_pkcs7(aes_cbc_decrypt_bytes(data, key, iv))
+
+
+async def _fetch_playlist(fetcher: _FragmentFetcher, url: str) -> MediaPlaylist:
+    text = (await fetcher.get_bytes(url)).decode("utf-8", "replace")
+    return parse_m3u8(text, url)
+
+
+async def _hls_fragments(
+    fetcher: _FragmentFetcher, url: str, playlist: MediaPlaylist, min_refresh: float, max_idle_refreshes: int
+) -> AsyncIterator[Fragment]:
+    if playlist.init is not None:
+        yield playlist.init
+    last_seq = -1
+    idle = 0
+    while True:
+        fresh = [f for f in playlist.fragments if f.seq > last_seq]
+        for fragment in fresh:
+            last_seq = fragment.seq
+            yield fragment
+        if playlist.endlist:
+            return
+        # Live playlist: poll for new fragments until it ends or stalls
+        idle = 0 if fresh else idle + 1
+        if idle > max_idle_refreshes:
+            return
+        await asyncio.sleep(max(min_refresh, playlist.target_duration / 2))
+        playlist = await _fetch_playlist(fetcher, url)
+
+
+async def _list_fragments(fragments: List[Fragment]) -> AsyncIterator[Fragment]:
+    for fragment in fragments:
+        yield fragment
+
+
+async def _ordered(
+    fetcher: _FragmentFetcher, fragments: AsyncIterator[Fragment], lookahead: int
+) -> AsyncIterator[bytes]:
+    queue: "asyncio.Queue[Optional[asyncio.Task[bytes]]]" = asyncio.Queue(maxsize=max(1, lookahead))
+
+    async def producer():
+        try:
+            async for fragment in fragments:
+                await queue.put(asyncio.ensure_future(fetcher.fetch(fragment)))
+        except Exception as e:
+            failed: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+            failed.set_exception(e)
+            await queue.put(failed)  # type: ignore[arg-type]
+        finally:
+            await fragments.aclose()  # type: ignore[attr-defined]
+        await queue.put(None)
+
+    producer_task = asyncio.ensure_future(producer())
+    try:
+        while True:
+            task = await queue.get()
+            if task is None:
+                break
+            data = await task
+            view = memoryview(data)
+            for offset in range(0, len(view), 64 * 1024):
+                yield bytes(view[offset:offset + 64 * 1024])
+    finally:
+        producer_task.cancel()
+        leftovers = []
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                item.cancel()
+                leftovers.append(item)
+        await asyncio.gather(producer_task, *leftovers, return_exceptions=True)
+
+
+async def open_manifest_stream(
+    client: httpx.AsyncClient,
+    fmt: dict,
+    headers: dict,
+    lookahead: int = 4,
+    retries: int = 3,
+    min_refresh: float = 1.0,
+    max_idle_refreshes: int = 6,
+    read_timeout: float = 30.0,
+) -> Tuple[str, str, AsyncIterator[bytes]]:
+    """Resolve a manifest-based format; return ``(media_type, ext, body)``.
+
+    The manifest is fetched before returning so that errors surface before any
+    response headers are sent. A fragment whose body stalls for
+    ``read_timeout`` seconds is retried like any other failed fragment.
+    """
+    fetcher = _FragmentFetcher(client, headers, retries, read_timeout)
+    protocol = (fmt.get("protocol") or "").lower()
+
+    if protocol in _HLS_PROTOCOLS:
+        url = fmt.get("url")
+        if not url:
+            raise ManifestError("Format has no playlist URL")
+        playlist = await _fetch_playlist(fetcher, url)
+        if playlist.variants:
+            url = max(playlist.variants)[1]
+            playlist = await _fetch_playlist(fetcher, url)
+        if not playlist.fragments:
+            raise ManifestError("Playlist has no fragments")
+        fragments = _hls_fragments(fetcher, url, playlist, min_refresh, max_idle_refreshes)
+        if playlist.init is not None:
+            media_type, ext = "video/mp4", "mp4"
+        else:
+            media_type, ext = "video/mp2t", "ts"
+    else:
+        raw = fmt.get("fragments")
+        if not isinstance(raw, list) or not raw:
+            raise ManifestError("DASH format has no fragment list")
+        base = fmt.get("fragment_base_url") or fmt.get("url") or ""
+        resolved = []
+        for i, frag in enumerate(raw):
+            frag_url = frag.get("url") or (urljoin(base, frag["path"]) if frag.get("path") else None)
+            if not frag_url:
+                raise ManifestError("DASH fragment without URL")
+            resolved.append(Fragment(url=frag_url, seq=i))
+        fragments = _list_fragments(resolved)
+        ext = (fmt.get("ext") or "mp4").lower()
+        is_audio = fmt.get("vcodec") == "none"
+        kind = "audio" if is_audio else "video"
+        media_type = {"webm": f"{kind}/webm", "m4a": "audio/mp4"}.get(ext, f"{kind}/mp4")
+
+    return media_type, ext, _ordered(fetcher, fragments, lookahead)
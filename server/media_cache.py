@@ -0,0 +1,335 @@
+"""Size-bounded on-disk LRU cache for media bodies.
+
+Entries are filled while the first client streams a body from the origin
+(tee-on-read) and committed only once the complete, expected number of bytes
+has been written. Later requests, including arbitrary ``Range`` requests, are
+served straight from disk: :meth:`DiskCache.lookup` opens the entry's file, so
+an eviction that unlinks it while a response is being sent does not matter.
+
+The index and its size accounting are kept per process. Every worker process
+sharing the directory enforces ``max_bytes`` on the entries it knows about
+(those on disk when it started plus its own fills), so with several workers
+the directory can grow to that many times the limit. Entries removed by
+another worker are dropped from the index when a lookup finds them gone.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+_FLUSH_BYTES = 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    path: str
+    size: int
+    meta: dict
+    # Set on entries returned by DiskCache.lookup; the caller closes it
+    file: Optional[BinaryIO] = None
+
+
+class DiskCache:
+    """LRU cache of files under ``directory`` bounded by total size."""
+
+    def __init__(self, directory: str, max_bytes: int, max_entry_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entry_bytes = int(max_entry_bytes) if max_entry_bytes else self.max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._filling: Dict[str, "CacheWriter"] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fills_started = 0
+        self.fills_committed = 0
+        self.fills_aborted = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _digest(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _data_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + ".bin")
+
+    def _load_index(self) -> None:
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                # Left over from an interrupted fill
+                _unlink(path)
+                continue
+            if not name.endswith(".json"):
+                continue
+            data_path = path[: -len(".json")] + ".bin"
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    meta = json.load(fh)
+                st = os.stat(data_path)
+            except Exception:
+                _unlink(path)
+                _unlink(data_path)
+                continue
+            if st.st_size != meta.get("size"):
+                _unlink(path)
+                _unlink(data_path)
+                continue
+            found.append((st.st_mtime, CacheEntry(meta.get("key") or "", data_path, st.st_size, meta)))
+        found.sort(key=lambda item: item[0])
+        for _, entry in found:
+            self._entries[entry.key] = entry
+            self._bytes += entry.size
+
+    async def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Return ``key``'s entry with its data file open for reading, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        fh = await anyio.to_thread.run_sync(_open_for_read, entry.path) if entry is not None else None
+        with self._lock:
+            if fh is None:
+                if entry is not None and self._entries.get(key) is entry:
+                    # Removed behind our back (e.g. by another worker process)
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+        return replace(entry, file=fh)
+
+    def begin_fill(
+        self,
+        key: str,
+        expected_size: Optional[int],
+        meta: Optional[dict] = None,
+        flush_bytes: int = _FLUSH_BYTES,
+    ) -> Optional["CacheWriter"]:
+        """Start filling ``key``; None when disabled, too large or already being filled.
+
+        ``expected_size=None`` accepts a body of unknown length (up to the
+        per-entry limit); the caller then decides on commit whether it is complete.
+        """
+        if self.max_bytes <= 0:
+            return None
+        if expected_size is not None and (expected_size <= 0 or expected_size > self.max_entry_bytes):
+            return None
+        with self._lock:
+            if key in self._filling or key in self._entries:
+                return None
+            digest = self._digest(key)
+            writer = CacheWriter(self, key, digest, expected_size, dict(meta or {}), flush_bytes)
+            self._filling[key] = writer
+            self.fills_started += 1
+        return writer
+
+    def _finish_fill(self, writer: "CacheWriter", committed: bool) -> List[CacheEntry]:
+        """Update the index; return the entries evicted to make room (files still on disk)."""
+        evicted: List[CacheEntry] = []
+        with self._lock:
+            self._filling.pop(writer.key, None)
+            if not committed:
+                self.fills_aborted += 1
+                return evicted
+            self.fills_committed += 1
+            entry = CacheEntry(writer.key, self._data_path(writer.digest), writer.written, writer.meta)
+            self._drop(writer.key)
+            self._entries[writer.key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted.append(self._drop(next(iter(self._entries))))
+                self.evictions += 1
+        return evicted
+
+    def _drop(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "filling": len(self._filling),
+                "fills_started": self.fills_started,
+                "fills_committed": self.fills_committed,
+                "fills_aborted": self.fills_aborted,
+                "evictions": self.evictions,
+            }
+
+
+class CacheWriter:
+    """Accumulates a body into a temporary file and commits it atomically."""
+
+    def __init__(
+        self,
+        cache: DiskCache,
+        key: str,
+        digest: str,
+        expected_size: Optional[int],
+        meta: dict,
+        flush_bytes: int = _FLUSH_BYTES,
+    ):
+        self.cache = cache
+        self.key = key
+        self.digest = digest
+        self.expected_size = expected_size
+        self.meta = meta
+        self.flush_bytes = max(1, int(flush_bytes))
+        self.written = 0
+        # Bytes already on disk in temp_path (readers may tail up to here)
+        self.flushed = 0
+        self.temp_path = os.path.join(cache.directory, f"{digest}.{uuid.uuid4().hex}.part")
+        self._fh = None
+        self._buffer = bytearray()
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def _write_sync(self, data: bytes) -> None:
+        if self._fh is None:
+            self._fh = open(self.temp_path, "wb")
+        if data:
+            self._fh.write(data)
+            self._fh.flush()
+
+    async def open(self) -> None:
+        """Create the temporary file up front (for readers that tail it)."""
+        await anyio.to_thread.run_sync(self._write_sync, b"")
+
+    async def write(self, chunk: bytes) -> None:
+        if self._done:
+            return
+        self._buffer += chunk
+        self.written += len(chunk)
+        limit = self.expected_size if self.expected_size is not None else self.cache.max_entry_bytes
+        if self.written > limit:
+            await self.abort()
+            return
+        if len(self._buffer) >= self.flush_bytes:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await anyio.to_thread.run_sync(self._write_sync, data)
+            self.flushed += len(data)
+
+    def _commit_sync(self, data: bytes) -> None:
+        self._write_sync(data)
+        self._fh.close()
+        self._fh = None
+        final_path = self.cache._data_path(self.digest)
+        os.replace(self.temp_path, final_path)
+        meta = {**self.meta, "key": self.key, "size": self.written, "stored_at": time.time()}
+        meta_tmp = final_path[: -len(".bin")] + ".json.tmp"
+        with open(meta_tmp, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        os.replace(meta_tmp, final_path[: -len(".bin")] + ".json")
+        self.meta = meta
+
+    async def commit(self) -> bool:
+        """Publish the entry if exactly the expected number of bytes arrived."""
+        if self._done:
+            return False
+        if self.expected_size is not None and self.written != self.expected_size:
+            await self.abort()
+            return False
+        self._done = True
+        data, self._buffer = bytes(self._buffer), bytearray()
+        try:
+            await anyio.to_thread.run_sync(self._commit_sync, data)
+            self.flushed = self.written
+        except Exception as e:
+            logger.warning("Failed to commit cache entry %s: %s", self.key, e)
+            self._cleanup_sync()
+            self.cache._finish_fill(self, committed=False)
+            return False
+        evicted = self.cache._finish_fill(self, committed=True)
+        if evicted:
+            await anyio.to_thread.run_sync(_delete_entries, evicted)
+        return True
+
+    def _cleanup_sync(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+        _unlink(self.temp_path)
+
+    async def abort(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self._buffer = bytearray()
+        # Shielded so cleanup still happens when the stream is being cancelled
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(self._cleanup_sync)
+        self.cache._finish_fill(self, committed=False)
+
+
+async def tee_to_cache(body: AsyncIterator[bytes], writer: Optional[CacheWriter]) -> AsyncIterator[bytes]:
+    """Yield ``body`` unchanged while copying it into ``writer``."""
+    completed = False
+    try:
+        async for chunk in body:
+            if writer is not None:
+                await writer.write(chunk)
+            yield chunk
+        completed = True
+    finally:
+        if writer is not None:
+            if completed:
+                await writer.commit()
+            else:
+                await writer.abort()
+        aclose = getattr(body, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def _open_for_read(path: str) -> Optional[BinaryIO]:
+    try:
+        fh = open(path, "rb")
+    except OSError:
+        return None
+    try:
+        # Mark it recently used for the LRU order rebuilt at startup
+        os.utime(fh.fileno())
+    except OSError:
+        pass
+    return fh
+
+
+def _delete_entries(entries: List[CacheEntry]) -> None:
+    for entry in entries:
+        _unlink(entry.path)
+        _unlink(entry.path[: -len(".bin")] + ".json")
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -0,0 +1,170 @@
+"""Password hashing off the shared thread pool, plus auth attempt throttling.
+
+bcrypt is deliberately slow (~250 ms of CPU at cost 12). Running it on the
+anyio default limiter lets a burst of logins starve extraction and streaming
+work, so hashes are computed on a small dedicated executor. Requests beyond a
+fixed queue depth are refused instead of piling up.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Optional, Tuple
+
+import bcrypt
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HasherBusy(Exception):
+    """Too many hashing jobs are queued; the caller should retry later."""
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    m = _COST_RE.match(hashed or "")
+    return int(m.group(1)) if m else None
+
+
+class PasswordHasher:
+    """bcrypt on a private executor with a bounded queue."""
+
+    def __init__(self, rounds: int = 12, workers: int = 2, max_queue: int = 32):
+        self.rounds = int(rounds)
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+        self.hashed = 0
+        self.verified = 0
+        self.seconds = 0.0
+        self._dummy_hash: Optional[str] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aoi-bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args) -> Tuple[object, float]:
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusy()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._pending -= 1
+        self.seconds += elapsed
+        return result, elapsed
+
+    def _hash_sync(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+    @staticmethod
+    def _verify_sync(password: str, hashed: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+        except Exception:
+            return False
+
+    async def hash(self, password: str) -> Tuple[str, float]:
+        """Return ``(hash, seconds)``; seconds includes time queued for a worker."""
+        hashed, elapsed = await self._run(self._hash_sync, password)
+        self.hashed += 1
+        return str(hashed), elapsed
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, float]:
+        ok, elapsed = await self._run(self._verify_sync, password, hashed)
+        self.verified += 1
+        return bool(ok), elapsed
+
+    async def verify_unknown(self, password: str) -> Tuple[bool, float]:
+        """Spend a verify's worth of work for an account that does not exist.
+
+        Checks ``password`` against a throwaway hash of the configured cost,
+        so a login for an unknown email costs as much as a wrong password.
+        Always False.
+        """
+        if self._dummy_hash is None:
+            hashed, _ = await self._run(self._hash_sync, "aoi-unknown-account")
+            self._dummy_hash = str(hashed)
+        _, elapsed = await self.verify(password, self._dummy_hash)
+        return False, elapsed
+
+    def needs_rehash(self, hashed: str) -> bool:
+        cost = hash_cost(hashed)
+        return cost is not None and cost != self.rounds
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class AttemptLimiter:
+    """Sliding-window counter of attempts per key (client IP, email, ...)."""
+
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 100_000):
+        self.limit = max(0, int(limit))
+        self.window = float(window_seconds)
+        self.max_keys = max(1, int(max_keys))
+        self._hits: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def _prune(self, hits: Deque[float], now: float) -> None:
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key: str) -> Optional[float]:
+        """Seconds until ``key`` may try again, or None if it is under the limit."""
+        if not self.limit or not key:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return None
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return None
+            self.limited += 1
+            return max(0.0, hits[0] + self.window - now)
+
+    def record(self, key: str) -> None:
+        if not self.limit or not key:
+            return
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = self._hits[key] = deque()
+                while len(self._hits) > self.max_keys:
+                    self._hits.popitem(last=False)
+            else:
+                self._hits.move_to_end(key)
+            self._prune(hits, now)
+            hits.append(now)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
@@ -0,0 +1,249 @@
+"""Per-job progress events for long-running requests.
+
+A client picks a random job id, passes it along with ``/api/extract`` or
+``/api/convert_mp3`` and follows ``/api/progress/{job_id}`` (Server-Sent
+Events) meanwhile. Producers publish from the event loop or from worker
+threads: yt-dlp's screen messages arrive through :class:`YtdlpProgressLogger`
+on the extraction thread, and ffmpeg's ``-progress`` output is parsed by
+:class:`FfmpegProgressReader`.
+
+The job id of the request being served is carried in :data:`current_job`, so
+code deep inside an extraction does not need it passed explicitly.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+current_job: ContextVar[Optional[str]] = ContextVar("aoi_progress_job", default=None)
+
+_JOB_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def valid_job_id(job_id: Optional[str]) -> bool:
+    return bool(job_id) and bool(_JOB_ID_RE.match(job_id))
+
+
+class _Channel:
+    __slots__ = ("events", "subscribers", "done", "touched")
+
+    def __init__(self, history: int):
+        self.events: Deque[dict] = deque(maxlen=history)
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[dict]"]] = []
+        self.done = False
+        self.touched = time.monotonic()
+
+
+class ProgressHub:
+    """Recent events per job id, fanned out to any number of followers.
+
+    A late follower first receives the last ``history`` events. Finished jobs
+    are kept for ``retain_seconds`` so a follower that connects after the
+    request completed still sees the outcome; at most ``max_jobs`` are kept.
+    """
+
+    def __init__(self, history: int = 50, retain_seconds: float = 120.0, max_jobs: int = 10000):
+        self.history = history
+        self.retain_seconds = retain_seconds
+        self.max_jobs = max_jobs
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def _channel(self, job_id: str) -> _Channel:
+        now = time.monotonic()
+        channel = self._channels.get(job_id)
+        if channel is None:
+            self._prune(now)
+            channel = self._channels[job_id] = _Channel(self.history)
+        else:
+            self._channels.move_to_end(job_id)
+        channel.touched = now
+        return channel
+
+    def _prune(self, now: float) -> None:
+        while self._channels:
+            job_id, oldest = next(iter(self._channels.items()))
+            expired = not oldest.subscribers and now - oldest.touched > self.retain_seconds
+            if not expired and len(self._channels) < self.max_jobs:
+                break
+            del self._channels[job_id]
+
+    def publish(self, job_id: str, event: dict, final: bool = False) -> None:
+        """Record ``event`` for ``job_id``; safe to call from any thread."""
+        event = {**event, "ts": round(time.time(), 3)}
+        if final:
+            event["final"] = True
+        with self._lock:
+            channel = self._channel(job_id)
+            if channel.done:
+                return
+            channel.events.append(event)
+            channel.done = final
+            subscribers = list(channel.subscribers)
+            self.published += 1
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The follower's loop is gone
+                pass
+
+    async def follow(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """Yield the job's events until its final one; ``None`` every ``keepalive`` idle seconds."""
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[dict]" = asyncio.Queue()
+        entry = (loop, queue)
+        with self._lock:
+            channel = self._channel(job_id)
+            backlog = list(channel.events)
+            done = channel.done
+            if not done:
+                channel.subscribers.append(entry)
+        try:
+            for event in backlog:
+                yield event
+            if done:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event.get("final"):
+                    return
+        finally:
+            with self._lock:
+                try:
+                    channel.subscribers.remove(entry)
+                except ValueError:
+                    pass
+                channel.touched = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "jobs": len(self._channels),
+                "followers": sum(len(c.subscribers) for c in self._channels.values()),
+                "published": self.published,
+            }
+
+
+# "[youtube] dQw4w9WgXcQ: Downloading webpage"
+_SCREEN_RE = re.compile(r"^\[(?P<extractor>[^\]]+)\]\s+(?:(?P<id>[^:\s]+):\s+)?(?P<message>.+)$")
+
+
+class YtdlpProgressLogger:
+    """yt-dlp ``logger`` that turns screen messages into events of the current job.
+
+    Installed on every pooled ``YoutubeDL``; without a job id in
+    :data:`current_job` it only forwards warnings and errors to ``logging``.
+    """
+
+    def __init__(self, hub: Callable[[], ProgressHub]):
+        self._hub = hub
+
+    def debug(self, msg: str) -> None:
+        job_id = current_job.get()
+        if not job_id or msg.startswith("[debug] "):
+            return
+        match = _SCREEN_RE.match(msg.strip())
+        if match is None:
+            return
+        self._hub().publish(
+            job_id,
+            {
+                "type": "extract",
+                "phase": "step",
+                "extractor": match.group("extractor"),
+                "message": match.group("message")[:200],
+            },
+        )
+
+    def info(self, msg: str) -> None:
+        self.debug(msg)
+
+    def warning(self, msg: str) -> None:
+        logger.debug("yt-dlp: %s", msg)
+
+    def error(self, msg: str) -> None:
+        # Without a logger yt-dlp prints these to stderr even when quiet
+        logger.warning("yt-dlp: %s", msg)
+
+
+_PROGRESS_KEY_RE = re.compile(r"^[a-z0-9_]+$")
+_STDERR_KEEP_BYTES = 64 * 1024
+
+
+def _parse_ffmpeg_block(block: dict) -> dict:
+    update: dict = {"progress": block.get("progress")}
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms")
+    try:
+        # Despite its name, out_time_ms is in microseconds as well
+        update["out_time"] = round(int(out_time_us) / 1_000_000, 3)
+    except (TypeError, ValueError):
+        pass
+    try:
+        update["speed"] = float((block.get("speed") or "").rstrip("x"))
+    except ValueError:
+        pass
+    try:
+        update["total_size"] = int(block.get("total_size"))
+    except (TypeError, ValueError):
+        pass
+    return update
+
+
+class FfmpegProgressReader:
+    """Reads an ffmpeg stderr that carries ``-progress pipe:2`` output.
+
+    Each progress block is parsed and passed to ``on_update``. Everything else
+    (the actual error messages) is kept and returned by :meth:`read`, so the
+    reader can stand in for the process' stderr stream.
+    """
+
+    def __init__(self, stream, on_update: Callable[[dict], None]):
+        self._stream = stream
+        self._on_update = on_update
+        self._other = bytearray()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> "FfmpegProgressReader":
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def _run(self) -> None:
+        block: dict = {}
+        while True:
+            line = await self._stream.readline()
+            if not line:
+                break
+            key, sep, value = line.decode("utf-8", "replace").strip().partition("=")
+            if sep and _PROGRESS_KEY_RE.match(key):
+                block[key] = value.strip()
+                if key == "progress":
+                    try:
+                        self._on_update(_parse_ffmpeg_block(block))
+                    except Exception:
+                        logger.debug("Progress callback failed", exc_info=True)
+                    block = {}
+            elif len(self._other) < _STDERR_KEEP_BYTES:
+                self._other.extend(line)
+
+    async def read(self) -> bytes:
+        """Wait for ffmpeg to close stderr and return its non-progress output."""
+        if self._task is not None:
+            try:
+                await asyncio.shield(self._task)
+            except Exception:
+                pass
+        return bytes(self._other)
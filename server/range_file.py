@@ -0,0 +1,125 @@
+"""Serve files from disk with HTTP Range support.
+
+Full responses use the ASGI ``http.response.pathsend`` extension when the
+server offers it, and partial responses use ``http.response.zerocopysend``
+(sendfile), so capable servers never copy file data through Python. Otherwise
+the file is read in large chunks off the event loop.
+"""
+
+import re
+from typing import BinaryIO, Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+_RANGE_RE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+_READ_CHUNK = 1024 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive ``(start, end)`` of a single byte range, or None for the full body.
+
+    Multi-range requests are answered with the full body, which RFC 9110 permits.
+    """
+    if not value:
+        return None
+    m = _RANGE_RE.match(value)
+    if not m:
+        return None
+    first, last = m.group(1), m.group(2)
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """Stream ``path`` (``size`` bytes) honoring a single-range ``Range`` header.
+
+    ``file``, when given, is an already open handle of ``path`` that is read
+    instead (and closed afterwards), so the file may be unlinked in between.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        range_header: Optional[str] = None,
+        media_type: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        file: Optional[BinaryIO] = None,
+    ):
+        self.path = path
+        self.file = file
+        self.size = size
+        self.span: Optional[Tuple[int, int]] = None
+        status_code = 200
+        extra = dict(headers or {})
+        extra["Accept-Ranges"] = "bytes"
+        try:
+            self.span = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            status_code = 416
+            extra["Content-Range"] = f"bytes */{size}"
+        if self.span is not None:
+            status_code = 206
+            extra["Content-Range"] = f"bytes {self.span[0]}-{self.span[1]}/{size}"
+        super().__init__(content=None, status_code=status_code, headers=extra, media_type=media_type)
+        if status_code == 416:
+            self.headers["Content-Length"] = "0"
+        else:
+            start, end = self.span if self.span is not None else (0, size - 1)
+            self.headers["Content-Length"] = str(max(0, end - start + 1))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self._send(scope, send)
+        finally:
+            # Normally closed by the read loop below; this covers empty bodies and errors
+            if self.file is not None and not self.file.closed:
+                self.file.close()
+
+    async def _send(self, scope: Scope, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.status_code == 416 or scope.get("method") == "HEAD" or self.size == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        start, end = self.span if self.span is not None else (0, self.size - 1)
+        extensions = scope.get("extensions") or {}
+        if self.file is None and self.span is None and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+        opened = anyio.wrap_file(self.file) if self.file is not None else await anyio.open_file(self.path, "rb")
+        async with opened as fh:
+            if "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": fh.wrapped.fileno(),
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": False,
+                })
+                return
+            await fh.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await fh.read(min(_READ_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
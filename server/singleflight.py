@@ -0,0 +1,80 @@
+"""Coalesce concurrent calls for the same key into a single execution."""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one in-flight call per key; later callers share its outcome.
+
+    The work runs in its own task, so a leader whose client disconnects does
+    not cancel the call for the followers still waiting on it.
+
+    With ``share_errors=False`` only successes are shared: when the leader's
+    call fails, followers run ``fn`` again (coalescing among themselves), so
+    a caller only ever sees an error raised by its own ``fn``.
+    """
+
+    def __init__(self, name: str = "singleflight", share_errors: bool = True):
+        self.name = name
+        self.share_errors = share_errors
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+        self.retried = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            flight = self._flights.get(key)
+            if flight is None:
+                task = asyncio.ensure_future(fn())
+                flight = _Flight(task)
+                self._flights[key] = flight
+                self.leaders += 1
+                task.add_done_callback(lambda t, k=key, f=flight: self._finish(k, f, t))
+                return await asyncio.shield(task)
+            flight.waiters += 1
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight.task)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if self.share_errors:
+                    raise
+            self.retried += 1
+
+    def _finish(self, key: str, flight: _Flight, task: "asyncio.Task[Any]") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.waiters > self.max_waiters:
+            self.max_waiters = flight.waiters
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+        if flight.waiters:
+            logger.info("%s: leader for %s served %d waiter(s)", self.name, key, flight.waiters)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "max_waiters": self.max_waiters,
+            "retried": self.retried,
+        }
@@ -1,4 +1,5 @@
 import asyncio
+import threading
 from http.cookiejar import Cookie, CookieJar
 from typing import Any, Dict, List
 
@@ -10,14 +11,37 @@ from fastapi.testclient import TestClient
 def app(monkeypatch, tmp_path):
     import server.main as main
 
-    # Isolate users DB to a temp file for auth tests
-    users_path = tmp_path / "users.json"
-    monkeypatch.setattr(main, "USERS_DB_PATH", str(users_path))
+    # Isolate users DB to a temp file for auth tests (opened on first use)
+    monkeypatch.setattr(main, "USERS_DB_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(main, "LEGACY_USERS_JSON_PATH", str(tmp_path / "users.json"))
+    monkeypatch.setattr(main, "_user_store", None)
+
+    # Cheap bcrypt cost and fresh auth throttles per test
+    monkeypatch.setattr(main, "_password_hasher", main.PasswordHasher(rounds=4, workers=1, max_queue=4))
+    monkeypatch.setattr(main, "_auth_ip_limiter", main.AttemptLimiter(100, 60))
+    monkeypatch.setattr(main, "_auth_email_limiter", main.AttemptLimiter(3, 60))
 
     # Ensure cookies are not forced secure for tests
     monkeypatch.setenv("AOI_COOKIE_SECURE", "0")
 
-    return main.app
+    # Start every test with an empty extraction cache
+    monkeypatch.setattr(
+        main, "_extraction_cache", main.ExtractionCache(max_bytes=16 * 1024 * 1024, ttl_seconds=300)
+    )
+    monkeypatch.setattr(main, "_extraction_flight", main.SingleFlight("extraction", share_errors=False))
+    # Fresh upstream clients so tests can substitute httpx.AsyncClient
+    monkeypatch.setattr(main, "_upstream", main.UpstreamClients())
+    # Disk caches are opt-in per test
+    monkeypatch.setattr(main, "_media_cache", None)
+    monkeypatch.setattr(main, "_transcode_cache", None)
+    monkeypatch.setattr(main, "_job_queue", None)
+    # Metrics and stats endpoints are opt-in; tests read them freely
+    monkeypatch.setattr(main, "_DEBUG_ENDPOINTS", True)
+    monkeypatch.setattr(main, "_DEBUG_TOKEN", "")
+
+    yield main.app
+    if main._user_store is not None:
+        main._user_store.close()
 
 
 @pytest.fixture()
@@ -31,6 +55,83 @@ def test_health_returns_ok(client: TestClient):
     assert r.json() == {"status": "ok"}
 
 
+def test_ready_reports_503_until_warmup_finishes(monkeypatch, app):
+    import threading
+    import time
+
+    import server.main as main
+
+    release = threading.Event()
+    warmup = main.Warmup()
+    warmup.add("slow", lambda: release.wait(5))
+    monkeypatch.setattr(main, "_warmup", warmup)
+
+    with TestClient(app) as c:
+        # Liveness does not wait for the warm-up
+        assert c.get("/api/health").status_code == 200
+        r = c.get("/api/ready")
+        assert r.status_code == 503 and r.json()["status"] == "warming"
+        release.set()
+        deadline = time.monotonic() + 5
+        while c.get("/api/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        r = c.get("/api/ready")
+        assert r.status_code == 200
+        assert r.json()["status"] == "ready" and r.json()["steps"][0]["step"] == "slow"
+
+
+def test_warmup_leaves_pooled_instances_with_the_shared_cookies(monkeypatch, tmp_path, app):
+    import server.main as main
+
+    cookiefile = tmp_path / "cookies.txt"
+    cookiefile.write_text("# Netscape HTTP Cookie File\n.youtube.com\tTRUE\t/\tFALSE\t0\tSID\tabc\n")
+    shared = main.SharedCookies(lambda: [str(cookiefile)])
+    built: List[Dict[str, Any]] = []
+
+    def factory(opts):
+        built.append(opts)
+        return main.youtube_dl.YoutubeDL(opts)
+
+    pool = main.YoutubeDLPool(factory, shared_cookies=shared)
+    monkeypatch.setattr(main, "_shared_cookies", shared)
+    monkeypatch.setattr(main, "_ydl_pool", pool)
+
+    main._warm_extractors()
+    assert pool.stats()["idle"] == len(main._WARM_EXTRACTORS)
+    # yt-dlp never sees the cookie file; the instances start from the shared jar
+    assert built and all("cookiefile" not in opts for opts in built)
+
+    # A real request for one of the warmed sites reuses its instance
+    opts = main.build_ydl_opts("https://www.youtube.com/watch?v=abc", format_selector="18")
+    with pool.checkout(opts) as ydl:
+        assert [c.name for c in ydl.cookiejar] == ["SID"]
+    assert pool.stats()["hits"] == 1 and len(built) == len(main._WARM_EXTRACTORS)
+    pool.clear()
+
+
+def test_loop_monitor_runs_for_the_app_lifetime(app):
+    with TestClient(app) as c:
+        r = c.get("/api/debug/loop")
+        assert r.status_code == 200
+        assert r.json()["running"] is True and r.json()["reports"] == []
+        assert "aoi_event_loop_lag_seconds_count" in c.get("/api/metrics").text
+
+
+def test_debug_endpoints_are_off_by_default_and_honour_the_token(monkeypatch, client: TestClient):
+    import server.main as main
+
+    paths = ["/api/metrics", "/api/debug/loop", "/api/cache/stats", "/api/upstream/stats"]
+    monkeypatch.setattr(main, "_DEBUG_ENDPOINTS", False)
+    assert [client.get(p).status_code for p in paths] == [404] * 4
+
+    monkeypatch.setattr(main, "_DEBUG_ENDPOINTS", True)
+    monkeypatch.setattr(main, "_DEBUG_TOKEN", "s3cret")
+    assert [client.get(p).status_code for p in paths] == [401] * 4
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    r = client.get("/api/cache/stats", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200 and "extraction" in r.json()
+
+
 def test_auth_flow_signup_login_me_logout_delete_me(client: TestClient):
     # Signup
     r = client.post("/api/auth/signup", json={"email": "a@b.com", "password": "secret123"})
@@ -63,6 +164,138 @@ def test_auth_flow_signup_login_me_logout_delete_me(client: TestClient):
     assert r6.json()["ok"] is True
 
 
+def test_me_is_served_from_memory_and_sees_deletion_immediately(client: TestClient):
+    import server.main as main
+
+    r = client.post("/api/auth/signup", json={"email": "m@b.com", "password": "secret123"})
+    assert r.status_code == 200
+    token = client.cookies.get("aoi_session")
+    assert client.get("/api/auth/me").json()["email"] == "m@b.com"
+    assert client.get("/api/auth/me").json()["email"] == "m@b.com"
+    assert main._users().cache_stats()["hits"] >= 1
+
+    assert client.delete("/api/auth/me").status_code == 200
+    client.cookies.set("aoi_session", token)
+    assert client.get("/api/auth/me").json() is None
+
+
+def test_login_reports_hash_cost_and_throttles_failures(client: TestClient):
+    r = client.post("/api/auth/signup", json={"email": "t@b.com", "password": "secret123"})
+    assert r.status_code == 200
+    assert r.headers["Server-Timing"].startswith("bcrypt;dur=")
+
+    for _ in range(3):
+        bad = client.post("/api/auth/login", json={"email": "t@b.com", "password": "wrong"})
+        assert bad.status_code == 401
+    blocked = client.post("/api/auth/login", json={"email": "t@b.com", "password": "secret123"})
+    assert blocked.status_code == 429
+    assert int(blocked.headers["Retry-After"]) >= 1
+
+
+def test_login_for_unknown_email_costs_and_counts_like_a_wrong_password(client: TestClient):
+    import server.main as main
+
+    verified = main._password_hasher.verified
+    for _ in range(3):
+        r = client.post("/api/auth/login", json={"email": "nobody@b.com", "password": "wrong"})
+        assert r.status_code == 401
+        assert r.headers["Server-Timing"].startswith("bcrypt;dur=")
+    assert main._password_hasher.verified == verified + 3
+    assert client.post("/api/auth/login", json={"email": "nobody@b.com", "password": "wrong"}).status_code == 429
+
+    samples = _scrape(client)
+    assert samples['aoi_password_hash_operations_total{op="verify"}'] == verified + 3
+    assert samples["aoi_password_hash_rejected_total"] == 0
+
+
+def test_signup_probes_for_existing_emails_are_throttled(monkeypatch, client: TestClient):
+    import server.main as main
+
+    monkeypatch.setattr(main, "_auth_ip_limiter", main.AttemptLimiter(3, 60))
+    assert client.post("/api/auth/signup", json={"email": "e@b.com", "password": "secret123"}).status_code == 200
+    client.cookies.clear()
+    hashed = main._password_hasher.hashed
+    for _ in range(2):
+        r = client.post("/api/auth/signup", json={"email": "e@b.com", "password": "other456"})
+        assert r.status_code == 409
+        assert r.headers["Server-Timing"].startswith("bcrypt;dur=")
+    # The 409s did the same hashing work as a real signup
+    assert main._password_hasher.hashed == hashed + 2
+    assert client.post("/api/auth/signup", json={"email": "e@b.com", "password": "other456"}).status_code == 429
+
+
+def test_auth_limit_is_per_forwarded_client_behind_a_trusted_proxy(monkeypatch, app):
+    import httpx
+
+    import server.main as main
+
+    monkeypatch.setattr(main, "_TRUSTED_PROXIES", main._parse_networks("10.0.0.0/8"))
+    monkeypatch.setattr(main, "_auth_ip_limiter", main.AttemptLimiter(2, 60))
+
+    async def scenario():
+        # Every request arrives from the platform's proxy at 10.1.2.3
+        transport = httpx.ASGITransport(app=app, client=("10.1.2.3", 4321))
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as c:
+            async def login(forwarded_for: str) -> int:
+                r = await c.post(
+                    "/api/auth/login",
+                    json={"email": "x@b.com", "password": "wrong"},
+                    headers={"X-Forwarded-For": forwarded_for},
+                )
+                return r.status_code
+
+            first = [await login("203.0.113.7") for _ in range(3)]
+            # A spoofed left-most entry does not escape the lockout
+            spoofed = await login("198.51.100.1, 203.0.113.7")
+            other = await login("198.51.100.2")
+            return first, spoofed, other
+
+    first, spoofed, other = asyncio.run(scenario())
+    assert first == [401, 401, 429]
+    assert spoofed == 429
+    assert other == 401
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers(monkeypatch):
+    from starlette.requests import Request
+
+    import server.main as main
+
+    def request(peer: str, forwarded: str) -> Request:
+        return Request({"type": "http", "client": (peer, 1), "headers": [(b"x-forwarded-for", forwarded.encode())]})
+
+    monkeypatch.setattr(main, "_TRUSTED_PROXIES", [])
+    assert main._client_ip(request("10.1.2.3", "203.0.113.7")) == "10.1.2.3"
+    monkeypatch.setattr(main, "_TRUSTED_PROXIES", main._parse_networks("10.0.0.0/8, bogus"))
+    assert main._client_ip(request("192.0.2.9", "203.0.113.7")) == "192.0.2.9"
+    assert main._client_ip(request("10.1.2.3", "203.0.113.7, 10.9.9.9")) == "203.0.113.7"
+
+
+def test_login_rehashes_with_configured_cost(monkeypatch, client: TestClient):
+    import server.main as main
+
+    r = client.post("/api/auth/signup", json={"email": "r@b.com", "password": "secret123"})
+    assert r.status_code == 200
+    assert main._users().get_by_email("r@b.com")["password_hash"].startswith("$2b$04$")
+
+    monkeypatch.setattr(main, "_password_hasher", main.PasswordHasher(rounds=5, workers=1))
+    r2 = client.post("/api/auth/login", json={"email": "r@b.com", "password": "secret123"})
+    assert r2.status_code == 200
+    assert main._users().get_by_email("r@b.com")["password_hash"].startswith("$2b$05$")
+
+
+def test_auth_returns_503_when_hash_queue_is_full(monkeypatch, client: TestClient):
+    import server.main as main
+
+    hasher = main.PasswordHasher(rounds=4, workers=1, max_queue=0)
+    hasher._pending = 1  # the only worker is taken
+    monkeypatch.setattr(main, "_password_hasher", hasher)
+    r = client.post("/api/auth/signup", json={"email": "q@b.com", "password": "secret123"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+    assert hasher.rejected == 1
+
+
 def _fake_info_single() -> Dict[str, Any]:
     return {
         "id": "abc123",
@@ -168,6 +401,167 @@ def test_extract_rejects_invalid_scheme(client: TestClient):
     assert r.json()["detail"] == "Invalid source URL; must be http(s)"
 
 
+def test_download_jobs_api(monkeypatch, app, tmp_path):
+    import time
+
+    import httpx
+
+    import server.main as main
+
+    body = b"0123456789" * 1000
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        return httpx.Response(200, headers={"Content-Type": "video/mp4"}, content=body)
+
+    async def fake_extract_with_cookiejar(url: str, ydl_opts: dict):
+        assert ydl_opts["format"] == "18"
+        return _fake_info_single(), None
+
+    monkeypatch.setattr(main, "_extract_info_with_cookiejar", fake_extract_with_cookiejar)
+    monkeypatch.setattr(main, "_upstream", main.UpstreamClients(transport=httpx.MockTransport(handler)))
+    monkeypatch.setenv("AOI_JOBS_DIR", str(tmp_path / "jobs"))
+
+    with TestClient(app) as c:
+        # Jobs need a session, so anonymous callers can't see each other's
+        assert c.post("/api/jobs", json={"source": "https://example.com/watch?v=abc123", "format_id": "18"}).status_code == 401
+        assert c.get("/api/jobs").status_code == 401
+        c.post("/api/auth/guest")
+        r = c.post("/api/jobs", json={"source": "https://example.com/watch?v=abc123", "format_id": "18"})
+        assert r.status_code == 200
+        job_id = r.json()["id"]
+        deadline = time.monotonic() + 5
+        while c.get(f"/api/jobs/{job_id}").json()["status"] != "completed" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        job = c.get(f"/api/jobs/{job_id}").json()
+        assert job["status"] == "completed" and job["bytes_done"] == len(body)
+        assert requested == ["https://cdn.example.com/v.mp4"]
+        assert [j["id"] for j in c.get("/api/jobs").json()["jobs"]] == [job_id]
+
+        r = c.get(f"/api/jobs/{job_id}/file", headers={"Range": "bytes=10-19"})
+        assert r.status_code == 206 and r.content == body[10:20]
+        assert r.headers["content-type"] == "video/mp4"
+        assert "attachment; filename*=UTF-8''Test%20Video.mp4" == r.headers["content-disposition"]
+
+        # Jobs are private to the session that created them
+        owner_cookies = dict(c.cookies)
+        c.post("/api/auth/guest")
+        assert c.get(f"/api/jobs/{job_id}").status_code == 404
+        assert c.get(f"/api/jobs/{job_id}/file").status_code == 404
+        assert c.delete(f"/api/jobs/{job_id}").status_code == 404
+        assert c.get("/api/jobs").json()["jobs"] == []
+        c.post("/api/auth/logout")
+        assert c.get(f"/api/jobs/{job_id}").status_code == 401
+        c.cookies.update(owner_cookies)
+
+        assert c.delete(f"/api/jobs/{job_id}").json() == {"ok": True}
+        assert c.get(f"/api/jobs/{job_id}").status_code == 404
+        assert c.post("/api/jobs", json={"source": "ftp://x", "format_id": "18"}).status_code == 400
+
+    monkeypatch.setattr(main, "_job_queue", None)
+    monkeypatch.delenv("AOI_JOBS_DIR")
+    c = TestClient(app)
+    c.post("/api/auth/guest")
+    assert c.get("/api/jobs").status_code == 503
+
+
+def test_playlist_is_listed_flat_in_pages(monkeypatch, client: TestClient):
+    import server.main as main
+
+    seen_opts: List[dict] = []
+
+    async def fake_extract(url: str, ydl_opts: dict) -> Dict[str, Any]:
+        seen_opts.append(ydl_opts)
+        start, end = (int(x) for x in ydl_opts["playlist_items"].split(":"))
+        indices = [i for i in range(start, end + 1) if i <= 5]
+        return {
+            "_type": "playlist",
+            "id": "PL1",
+            "title": "Mix",
+            "extractor": "youtube:tab",
+            "requested_entries": indices,
+            "entries": [
+                {
+                    "_type": "url",
+                    "id": f"v{i}",
+                    "title": f"Video {i}",
+                    "url": f"https://www.youtube.com/watch?v=v{i}",
+                    "thumbnails": [{"url": f"https://i.ytimg.com/v{i}.jpg"}],
+                }
+                for i in indices
+            ],
+        }
+
+    monkeypatch.setattr(main, "_extract_info_threaded", fake_extract)
+    url = "https://www.youtube.com/playlist?list=PL1"
+
+    r = client.post("/api/playlist", json={"url": url, "limit": 2})
+    assert r.status_code == 200
+    page = r.json()
+    assert page["title"] == "Mix" and page["next_cursor"] == "2"
+    assert [(e["index"], e["id"]) for e in page["entries"]] == [(1, "v1"), (2, "v2")]
+    assert page["entries"][0]["url"] == "https://www.youtube.com/watch?v=v1"
+    assert page["entries"][0]["thumbnail"] == "https://i.ytimg.com/v1.jpg"
+    opts = seen_opts[0]
+    assert opts["extract_flat"] == "in_playlist" and opts["noplaylist"] is False
+    assert opts["playlist_items"] == "1:3"
+
+    last = client.post("/api/playlist", json={"url": url, "limit": 2, "cursor": "4"}).json()
+    assert [e["index"] for e in last["entries"]] == [5] and last["next_cursor"] is None
+    assert seen_opts[-1]["playlist_items"] == "5:7"
+
+    assert client.post("/api/playlist", json={"url": url, "cursor": "x"}).status_code == 400
+    # The single-item endpoint keeps ignoring playlists
+    assert "extract_flat" not in main.build_ydl_opts(url)
+
+
+def test_extract_batch_streams_ndjson_in_completion_order(monkeypatch, client: TestClient):
+    import json
+
+    import server.main as main
+
+    peak = {"now": 0, "max": 0}
+
+    async def fake_extract(url: str, ydl_opts: dict):
+        peak["now"] += 1
+        peak["max"] = max(peak["max"], peak["now"])
+        try:
+            if "slow" in url:
+                await asyncio.sleep(0.2)
+            elif "broken" in url:
+                raise RuntimeError("nope")
+            info = _fake_info_single()
+            info["id"] = url.rsplit("/", 1)[-1]
+            return info, None
+        finally:
+            peak["now"] -= 1
+
+    monkeypatch.setattr(main, "_extract_info_with_cookiejar", fake_extract)
+    urls = [
+        "https://example.com/slow",
+        "https://example.com/fast",
+        "ftp://example.com/bad",
+        "https://example.com/broken",
+    ]
+    r = client.post("/api/extract/batch", json={"urls": urls, "concurrency": 2})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+    assert lines[-1]["url"] == "https://example.com/slow"
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[1]["status"] == 200 and by_index[1]["result"]["id"] == "fast"
+    assert by_index[1]["result"]["formats"][0]["format_id"] == "18"
+    assert by_index[2]["status"] == 400 and "http(s)" in by_index[2]["error"]
+    assert by_index[3]["status"] == 400 and "nope" in by_index[3]["error"]
+    assert peak["max"] <= 2
+
+    assert client.post("/api/extract/batch", json={"urls": []}).status_code == 400
+    monkeypatch.setattr(main, "BATCH_MAX_URLS", 2)
+    assert client.post("/api/extract/batch", json={"urls": urls}).status_code == 400
+
+
 def test_proxy_download_streams_and_headers(monkeypatch, client: TestClient, mock_extract):
     import server.main as main
 
@@ -231,6 +625,80 @@ def test_proxy_download_streams_and_headers(monkeypatch, client: TestClient, moc
     assert r.content == b"test"
 
 
+def test_stream_tokens_skip_reextraction(monkeypatch, client: TestClient):
+    import server.main as main
+
+    captured: Dict[str, Any] = {}
+    cookiejar = CookieJar()
+    cookiejar.set_cookie(_make_cookie("session", "abc", ".cdn.example.com"))
+    jars = {"jar": None}
+
+    async def fake_extract_with_cookiejar(url: str, ydl_opts: dict):
+        captured["extractions"] = captured.get("extractions", 0) + 1
+        return _fake_info_single(), jars["jar"]
+
+    class FakeResponse:
+        status_code = 206
+        headers = {"Content-Type": "video/mp4", "Content-Range": "bytes 0-3/1000"}
+
+        async def aiter_bytes(self, chunk_size=65536):  # type: ignore
+            yield b"data"
+
+        async def aclose(self):
+            return None
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def build_request(self, method, url, headers=None):
+            captured["url"], captured["headers"] = url, headers
+            return (method, url, headers)
+
+        async def send(self, request, stream=True):
+            return FakeResponse()
+
+        async def aclose(self):
+            return None
+
+    monkeypatch.setattr(main, "_extract_info_with_cookiejar", fake_extract_with_cookiejar)
+    monkeypatch.setattr(main.httpx, "AsyncClient", FakeClient)
+
+    source = "https://example.com/watch?v=abc123"
+    formats = client.post("/api/extract", json={"url": source}).json()["formats"]
+    token = next(f["stream_token"] for f in formats if f["format_id"] == "18")
+    assert token and captured["extractions"] == 1
+
+    r = client.get("/api/stream", params={"token": token}, headers={"Range": "bytes=0-3"})
+    assert r.status_code == 206 and r.content == b"data"
+    assert "attachment; filename*=UTF-8''Test%20Video.mp4" == r.headers["Content-Disposition"]
+    assert captured["url"] == "https://cdn.example.com/v.mp4"
+    assert captured["headers"]["User-Agent"] == "UA" and captured["headers"]["Range"] == "bytes=0-3"
+    assert captured["headers"]["Referer"] == "https://example.com/"
+    # Served without extracting again
+    assert captured["extractions"] == 1
+
+    # Forged tokens are refused; stale ones fall back to a fresh extraction
+    assert client.get("/api/stream", params={"token": token[:-2] + "xx"}).status_code == 403
+    monkeypatch.setattr(main, "_STREAM_TOKEN_TTL", -1)
+    r = client.get(
+        "/api/stream", params={"token": token, "source": source, "format_id": "18"}, follow_redirects=False
+    )
+    assert r.status_code == 307
+    assert r.headers["Location"] == "/api/download?source=https%3A%2F%2Fexample.com%2Fwatch%3Fv%3Dabc123&format_id=18"
+
+    # Formats that need cookies only get tokens when cookies may be embedded
+    monkeypatch.setattr(main, "_STREAM_TOKEN_TTL", 900)
+    jars["jar"] = cookiejar
+    formats = client.post("/api/extract", json={"url": source}).json()["formats"]
+    assert all(f["stream_token"] is None for f in formats)
+    monkeypatch.setattr(main, "_STREAM_TOKEN_COOKIES", True)
+    formats = client.post("/api/extract", json={"url": source}).json()["formats"]
+    token = next(f["stream_token"] for f in formats if f["format_id"] == "18")
+    client.get("/api/stream", params={"token": token})
+    assert captured["headers"]["Cookie"] == "session=abc"
+
+
 def test_proxy_download_uses_httpx_when_curl_fails(monkeypatch, client: TestClient, mock_extract):
     import server.main as main
 
@@ -274,17 +742,17 @@ def test_proxy_download_uses_httpx_when_curl_fails(monkeypatch, client: TestClie
         def __init__(self):
             self.closed = False
 
-        def get(self, *args, **kwargs):
+        async def get(self, *args, **kwargs):
             raise RuntimeError("curl boom")
 
-        def close(self):
+        async def close(self):
             self.closed = True
 
     class FakeCurl:
         def __init__(self):
             self.sessions = []
 
-        def Session(self):  # type: ignore
+        def AsyncSession(self):  # type: ignore
             sess = ExplodingSession()
             self.sessions.append(sess)
             return sess
@@ -302,10 +770,273 @@ def test_proxy_download_uses_httpx_when_curl_fails(monkeypatch, client: TestClie
     assert r.content == b"ok"
     assert instances[0].response.iterated is True
     assert instances[0].response.closed is True
-    assert instances[0].closed is True
+    # The pooled client is shared and stays open for later requests
+    assert instances[0].closed is False
     assert fake_curl.sessions and fake_curl.sessions[0].closed is True
 
 
+def test_proxy_download_streams_from_async_curl_fallback(monkeypatch, client: TestClient, mock_extract):
+    import server.main as main
+
+    class BlockedResponse:
+        status_code = 403
+        headers = {"Content-Type": "text/html", "Content-Length": "9"}
+
+        def __init__(self):
+            self.closed = False
+
+        async def aiter_bytes(self, chunk_size=65536):  # type: ignore
+            yield b"forbidden"
+
+        async def aclose(self):
+            self.closed = True
+
+    blocked = BlockedResponse()
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def build_request(self, method, url, headers=None):
+            return (method, url, headers)
+
+        async def send(self, request, stream=True):
+            return blocked
+
+        async def aclose(self):
+            return None
+
+    class FakeCurlResponse:
+        status_code = 200
+        headers = {"Content-Type": "video/mp4", "Content-Length": "6"}
+
+        async def aiter_content(self):
+            yield b"abc"
+            yield b""
+            yield b"def"
+
+    class FakeAsyncSession:
+        def __init__(self):
+            self.closed = False
+            self.kwargs: Dict[str, Any] = {}
+
+        async def get(self, url, **kwargs):
+            self.kwargs = kwargs
+            return FakeCurlResponse()
+
+        async def close(self):
+            self.closed = True
+
+    class FakeCurl:
+        def __init__(self):
+            self.sessions: List[FakeAsyncSession] = []
+
+        def AsyncSession(self):  # type: ignore
+            sess = FakeAsyncSession()
+            self.sessions.append(sess)
+            return sess
+
+    monkeypatch.setattr(main.httpx, "AsyncClient", FakeClient)
+    fake_curl = FakeCurl()
+    monkeypatch.setattr(main, "curl_requests", fake_curl)
+
+    r = client.get(
+        "/api/download",
+        params={"source": "https://example.com/watch?v=abc123", "format_id": "18"},
+    )
+
+    assert r.status_code == 200
+    assert r.content == b"abcdef"
+    assert r.headers["Content-Type"] == "video/mp4"
+    assert blocked.closed is True
+    sess = fake_curl.sessions[0]
+    assert sess.kwargs["stream"] is True and sess.kwargs["impersonate"]
+    assert sess.closed is True
+
+
+def test_curl_stream_is_aborted_when_client_disconnects():
+    import server.main as main
+
+    class StalledResponse:
+        def __init__(self):
+            self.quit_now = asyncio.Event()
+
+        async def aiter_content(self):
+            yield b"first"
+            await asyncio.sleep(3600)
+            yield b"never"
+
+    class FakeAsyncSession:
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    async def scenario():
+        sess, resp = FakeAsyncSession(), StalledResponse()
+        body = main._iter_curl_stream(sess, resp)
+        assert await body.__anext__() == b"first"
+        await body.aclose()
+        return sess, resp
+
+    sess, resp = asyncio.run(scenario())
+    assert resp.quit_now.is_set()
+    assert sess.closed is True
+
+
+def test_upstream_clients_are_shared_across_downloads(monkeypatch, client: TestClient, mock_extract):
+    import server.main as main
+
+    instances = []
+
+    class FakeResponse:
+        status_code = 200
+        headers = {"Content-Type": "video/mp4"}
+
+        async def aiter_bytes(self, chunk_size=65536):  # type: ignore
+            yield b"x"
+
+        async def aclose(self):
+            return None
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.kwargs = kwargs
+            self.sent = 0
+            instances.append(self)
+
+        def build_request(self, method, url, headers=None):
+            return (method, url, headers)
+
+        async def send(self, request, stream=True):
+            self.sent += 1
+            return FakeResponse()
+
+        async def aclose(self):
+            return None
+
+    monkeypatch.setattr(main.httpx, "AsyncClient", FakeClient)
+    params = {"source": "https://example.com/watch?v=abc123", "format_id": "18"}
+    for _ in range(3):
+        assert client.get("/api/download", params=params).status_code == 200
+
+    assert len(instances) == 1
+    assert instances[0].sent == 3
+    assert instances[0].kwargs["http2"] is True
+    stats = client.get("/api/upstream/stats").json()
+    assert stats["clients"]["media"]["requests"] == 3
+
+
+def test_proxy_download_accelerated_fetches_segments(monkeypatch, client: TestClient, mock_extract):
+    import re
+
+    import httpx
+
+    import server.main as main
+
+    body = bytes(range(256)) * 1024
+    seen_ranges: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        rng = request.headers.get("Range")
+        seen_ranges.append(rng or "")
+        m = re.match(r"bytes=(\d+)-(\d*)", rng or "")
+        if not m:
+            return httpx.Response(200, content=body, headers={"Accept-Ranges": "bytes", "Content-Type": "video/mp4"})
+        a = int(m.group(1))
+        b = min(int(m.group(2)) if m.group(2) else len(body) - 1, len(body) - 1)
+        return httpx.Response(
+            206,
+            content=body[a:b + 1],
+            headers={"Content-Range": f"bytes {a}-{b}/{len(body)}", "Content-Type": "video/mp4"},
+        )
+
+    monkeypatch.setattr(main, "_upstream", main.UpstreamClients(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "_SEGMENT_SIZE", 64 * 1024)
+    monkeypatch.setattr(main, "_SEGMENT_MIN_BYTES", 1)
+
+    params = {"source": "https://example.com/watch?v=abc123", "format_id": "18", "accelerate": "true"}
+    r = client.get("/api/download", params=params)
+    assert r.status_code == 200
+    assert r.content == body
+    assert r.headers["Content-Length"] == str(len(body))
+    assert seen_ranges[1:] == [f"bytes={a}-{a + 64 * 1024 - 1}" for a in range(0, len(body), 64 * 1024)]
+
+    r2 = client.get("/api/download", params=params, headers={"Range": "bytes=1000-"})
+    assert r2.status_code == 206
+    assert r2.headers["Content-Range"] == f"bytes 1000-{len(body) - 1}/{len(body)}"
+    assert r2.content == body[1000:]
+
+
+def test_proxy_download_stitches_hls_fragments(monkeypatch, client: TestClient):
+    import httpx
+
+    import server.main as main
+
+    info = _fake_info_single()
+    info["formats"].append({
+        "format_id": "hls-720",
+        "ext": "mp4",
+        "protocol": "m3u8_native",
+        "url": "https://cdn.example.com/hls/index.m3u8",
+    })
+
+    async def fake_extract_with_cookiejar(url: str, ydl_opts: dict):
+        return info, None
+
+    bodies = {
+        "/hls/index.m3u8": b"#EXTM3U\n#EXTINF:2,\n0.ts\n#EXTINF:2,\n1.ts\n#EXT-X-ENDLIST\n",
+        "/hls/0.ts": b"seg0",
+        "/hls/1.ts": b"seg1",
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["User-Agent"] == "UA"
+        return httpx.Response(200, content=bodies[request.url.path])
+
+    monkeypatch.setattr(main, "_extract_info_with_cookiejar", fake_extract_with_cookiejar)
+    monkeypatch.setattr(main, "_upstream", main.UpstreamClients(transport=httpx.MockTransport(handler)))
+
+    r = client.get("/api/download", params={"source": "https://example.com/watch?v=abc123", "format_id": "hls-720"})
+    assert r.status_code == 200
+    assert r.headers["Content-Type"] == "video/mp2t"
+    assert "Test%20Video.ts" in r.headers["Content-Disposition"]
+    assert r.content == b"seg0seg1"
+
+
+def test_proxy_download_fills_and_serves_disk_cache(monkeypatch, client: TestClient, mock_extract, tmp_path):
+    import httpx
+
+    import server.main as main
+
+    body = b"0123456789" * 1000
+    upstream_calls: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        upstream_calls.append(str(request.url))
+        return httpx.Response(200, content=body, headers={"Content-Type": "video/mp4", "Content-Length": str(len(body))})
+
+    monkeypatch.setattr(main, "_upstream", main.UpstreamClients(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "_media_cache", main.DiskCache(str(tmp_path / "media"), max_bytes=1024 * 1024))
+
+    params = {"source": "https://example.com/watch?v=abc123", "format_id": "18"}
+    r = client.get("/api/download", params=params)
+    assert r.status_code == 200 and r.content == body
+    assert "X-Cache" not in r.headers
+
+    r2 = client.get("/api/download", params=params, headers={"Range": "bytes=10-19"})
+    assert r2.status_code == 206
+    assert r2.headers["X-Cache"] == "HIT"
+    assert r2.headers["Content-Range"] == f"bytes 10-19/{len(body)}"
+    assert r2.headers["Content-Type"] == "video/mp4"
+    assert r2.content == body[10:20]
+
+    r3 = client.get("/api/download", params=params)
+    assert r3.status_code == 200 and r3.content == body
+    assert len(upstream_calls) == 1
+    assert client.get("/api/cache/stats").json()["media"]["hits"] == 2
+
+
 def test_proxy_subtitle_downloads(monkeypatch, client: TestClient, mock_extract):
     import server.main as main
 
@@ -424,6 +1155,387 @@ def test_convert_mp3_streams(monkeypatch, client: TestClient, mock_extract):
     assert fake_proc.stderr.read_called is True
 
 
+def test_progress_events_for_extract_and_convert(monkeypatch, client: TestClient, mock_extract):
+    import json
+
+    import server.main as main
+
+    def events_of(job_id: str) -> List[Dict[str, Any]]:
+        r = client.get(f"/api/progress/{job_id}")
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        return [json.loads(line[len("data: "):]) for line in r.text.splitlines() if line.startswith("data: ")]
+
+    r = client.post("/api/extract", json={"url": "https://example.com/watch?v=abc123", "job_id": "extract-job-1"})
+    assert r.status_code == 200
+    events = events_of("extract-job-1")
+    assert events[-1]["type"] == "done" and events[-1]["formats"] == 2
+
+    class FakeStdout:
+        def __init__(self):
+            self._chunks = [b"ID3", b"\x00" * 10]
+
+        async def read(self, n: int) -> bytes:
+            return self._chunks.pop(0) if self._chunks else b""
+
+    class FakeProc:
+        def __init__(self, stderr):
+            self.stdout = FakeStdout()
+            self.stderr = stderr
+            self.returncode = None
+
+        def kill(self):
+            self.returncode = -9
+
+        async def wait(self):
+            self.returncode = 0
+            return 0
+
+    captured: Dict[str, Any] = {}
+
+    async def fake_create_subprocess_exec(*args, **kwargs):
+        captured["args"] = args
+        stderr = asyncio.StreamReader()
+        stderr.feed_data(b"out_time_us=60000000\nspeed=20x\nprogress=continue\nprogress=end\n")
+        stderr.feed_eof()
+        return FakeProc(stderr)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_create_subprocess_exec)
+    r = client.get(
+        "/api/convert_mp3",
+        params={"source": "https://example.com/watch?v=abc123", "format_id": "140", "job_id": "convert-job-1"},
+    )
+    assert r.status_code == 200 and r.content.startswith(b"ID3")
+    assert captured["args"][captured["args"].index("-progress") + 1] == "pipe:2"
+    events = events_of("convert-job-1")
+    by_type = {}
+    for event in events:
+        by_type.setdefault(event["type"], []).append(event)
+    assert by_type["transcode"][0]["phase"] == "start" and by_type["transcode"][0]["duration"] == 125
+    encoding = by_type["transcode"][1]
+    assert encoding["out_time"] == 60.0 and encoding["speed"] == 20.0
+    assert encoding["eta"] == 3.2 and encoding["percent"] == 48.0
+    assert events[-1]["type"] == "done" and events[-1]["bytes"] == 13
+
+    assert client.get("/api/progress/bad").status_code == 400
+    r = client.post("/api/extract", json={"url": "https://example.com/v", "job_id": "../x"})
+    assert r.status_code == 400
+
+
+def test_convert_mp3_cached_output_is_served_with_range(monkeypatch, client: TestClient, tmp_path):
+    import server.main as main
+
+    class FakeStream:
+        def __init__(self, chunks: List[bytes]):
+            self._chunks = list(chunks)
+
+        async def read(self, n: int = -1) -> bytes:
+            return self._chunks.pop(0) if self._chunks else b""
+
+    class FakeProc:
+        def __init__(self):
+            self.stdout = FakeStream([b"ID3", b"0123456789"])
+            self.stderr = FakeStream([])
+            self.returncode = None
+
+        def kill(self):
+            self.returncode = -9
+
+        async def wait(self):
+            if self.returncode is None:
+                self.returncode = 0
+            return self.returncode
+
+    spawned: List[FakeProc] = []
+
+    async def fake_create_subprocess_exec(*args, **kwargs):
+        proc = FakeProc()
+        spawned.append(proc)
+        return proc
+
+    extractions: List[str] = []
+
+    async def fake_extract_with_cookiejar(url: str, ydl_opts: dict):
+        extractions.append(url)
+        return _fake_info_single(), None
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_create_subprocess_exec)
+    monkeypatch.setattr(main, "_extract_info_with_cookiejar", fake_extract_with_cookiejar)
+    monkeypatch.setattr(
+        main, "_transcode_cache", main.TranscodeCache(main.DiskCache(str(tmp_path), max_bytes=10 ** 6))
+    )
+
+    params = {"source": "https://example.com/watch?v=abc123", "format_id": "140", "bitrate_kbps": 128}
+    r1 = client.get("/api/convert_mp3", params=params)
+    assert r1.status_code == 200
+    assert r1.headers["X-Cache"] == "MISS"
+    assert r1.content == b"ID30123456789"
+
+    r2 = client.get("/api/convert_mp3", params=params, headers={"Range": "bytes=3-6"})
+    assert r2.status_code == 206
+    assert r2.headers["X-Cache"] == "HIT"
+    assert r2.headers["Content-Range"] == "bytes 3-6/13"
+    assert r2.content == b"0123"
+    assert "filename*=" in r2.headers["Content-Disposition"]
+
+    full = client.get("/api/convert_mp3", params=params)
+    assert full.headers["Content-Length"] == "13"
+    assert len(spawned) == 1 and len(extractions) == 1
+
+    # A different bitrate is a different output
+    r3 = client.get("/api/convert_mp3", params={**params, "bitrate_kbps": 192})
+    assert r3.headers["X-Cache"] == "MISS"
+    assert len(spawned) == 2
+
+
+def test_extraction_is_shared_between_extract_and_download(monkeypatch, client: TestClient):
+    import server.main as main
+
+    calls: List[str] = []
+    threads: Dict[str, int] = {}
+
+    def fake_run_extraction(url: str, ydl_opts: dict):
+        calls.append(url)
+        threads["extract"] = threading.get_ident()
+        return _fake_info_single(), None
+
+    class RecordingCache(main.ExtractionCache):
+        def measure(self, info, cookiejar=None):
+            threads["measure"] = threading.get_ident()
+            return super().measure(info, cookiejar)
+
+        def put(self, key, info, cookiejar=None, measured=None):
+            threads["put"] = threading.get_ident()
+            assert measured is not None
+            return super().put(key, info, cookiejar, measured)
+
+    monkeypatch.setattr(main, "_extraction_cache", RecordingCache(max_bytes=16 * 1024 * 1024, ttl_seconds=300))
+
+    class FakeResponse:
+        status_code = 200
+        headers = {"Content-Type": "video/mp4"}
+
+        async def aiter_bytes(self, chunk_size=65536):  # type: ignore
+            yield b"data"
+
+        async def aclose(self):
+            return None
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def build_request(self, method, url, headers=None):
+            return (method, url, headers)
+
+        async def send(self, request, stream=True):
+            return FakeResponse()
+
+        async def aclose(self):
+            return None
+
+    monkeypatch.setattr(main, "_run_extraction", fake_run_extraction)
+    monkeypatch.setattr(main.httpx, "AsyncClient", FakeClient)
+
+    r = client.post("/api/extract", json={"url": "https://example.com/watch?v=abc123&utm_source=x"})
+    assert r.status_code == 200
+    r2 = client.get("/api/download", params={"source": "https://example.com/watch?v=abc123", "format_id": "140"})
+    assert r2.status_code == 200
+    assert r2.content == b"data"
+    assert len(calls) == 1
+    # Sizing the entry happens in the extraction's worker thread, not on the loop
+    assert threads["measure"] == threads["extract"] != threads["put"]
+    # Phases are reported per request
+    assert 'extract;dur=' in r.headers["Server-Timing"] and 'desc="ytdlp primary"' in r.headers["Server-Timing"]
+    assert 'desc="cache"' in r2.headers["Server-Timing"] and "upstream;dur=" in r2.headers["Server-Timing"]
+    assert r.headers["X-Request-ID"] != r2.headers["X-Request-ID"]
+
+    stats = client.get("/api/cache/stats").json()["extraction"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_dead_url_from_cached_extraction_is_re_extracted_once(monkeypatch, client: TestClient):
+    import httpx
+
+    import server.main as main
+
+    extractions: List[int] = []
+
+    def fake_run_extraction(url: str, ydl_opts: dict):
+        extractions.append(1)
+        info = _fake_info_single()
+        info["formats"][0]["url"] = f"https://cdn.example.com/v{len(extractions)}.mp4"
+        return info, None
+
+    dead = {"v1": False}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        # The CDN revokes the first extraction's URL before the cache expires it
+        if request.url.path == "/v1.mp4" and dead["v1"]:
+            return httpx.Response(410)
+        return httpx.Response(200, headers={"Content-Type": "video/mp4"}, content=request.url.path.encode())
+
+    monkeypatch.setattr(main, "_run_extraction", fake_run_extraction)
+    monkeypatch.setattr(main, "_upstream", main.UpstreamClients(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "curl_requests", None)
+    params = {"source": "https://example.com/watch?v=abc123", "format_id": "18"}
+
+    assert client.get("/api/download", params=params).content == b"/v1.mp4"
+    assert client.get("/api/download", params=params).content == b"/v1.mp4"
+    assert len(extractions) == 1
+
+    dead["v1"] = True
+    r = client.get("/api/download", params=params)
+    assert r.status_code == 200 and r.content == b"/v2.mp4"
+    assert len(extractions) == 2
+    assert client.get("/api/cache/stats").json()["extraction"]["invalidations"] == 1
+    # The fresh result replaced the dead one
+    assert client.get("/api/download", params=params).content == b"/v2.mp4"
+    assert len(extractions) == 2
+
+
+def _scrape(client: TestClient) -> Dict[str, float]:
+    r = client.get("/api/metrics")
+    assert r.status_code == 200
+    assert r.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in r.text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_count_extractions_streamed_bytes_and_ttfb(monkeypatch, client: TestClient):
+    import server.main as main
+
+    def fake_run_extraction(url: str, ydl_opts: dict):
+        return _fake_info_single(), None
+
+    class FakeResponse:
+        status_code = 200
+        headers = {"Content-Type": "video/mp4"}
+
+        async def aiter_bytes(self, chunk_size=65536):  # type: ignore
+            yield b"x" * 1000
+            yield b"y" * 24
+
+        async def aclose(self):
+            return None
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def build_request(self, method, url, headers=None):
+            return (method, url, headers)
+
+        async def send(self, request, stream=True):
+            return FakeResponse()
+
+        async def aclose(self):
+            return None
+
+    monkeypatch.setattr(main, "_run_extraction", fake_run_extraction)
+    monkeypatch.setattr(main.httpx, "AsyncClient", FakeClient)
+
+    before = _scrape(client)
+    r = client.get("/api/download", params={"source": "https://example.com/watch?v=abc123", "format_id": "18"})
+    assert r.status_code == 200 and len(r.content) == 1024
+    after = _scrape(client)
+
+    def delta(name: str) -> float:
+        return after.get(name, 0) - before.get(name, 0)
+
+    assert delta('aoi_streamed_bytes_total{endpoint="download"}') == 1024
+    assert after['aoi_active_streams{endpoint="download"}'] == 0
+    assert delta('aoi_upstream_ttfb_seconds_count{endpoint="download"}') == 1
+    assert delta('aoi_extraction_seconds_count{extractor="youtube",attempt="primary",result="ok"}') == 1
+    assert after['aoi_extraction_cache_lookups_total{result="miss"}'] == 1
+    assert after["aoi_threadpool_limit"] > 0
+    assert "aoi_stream_throughput_bytes_per_second" in after
+
+
+def test_download_merged_stream_copies_video_and_audio(monkeypatch, client: TestClient):
+    import server.main as main
+
+    info = _fake_info_single()
+    info["formats"].append({
+        "format_id": "137",
+        "ext": "mp4",
+        "height": 1080,
+        "vcodec": "avc1",
+        "acodec": "none",
+        "url": "https://cdn.example.com/video-1080.mp4",
+        "protocol": "https",
+        "http_headers": {"X-Video": "1"},
+    })
+
+    selectors: List[str] = []
+
+    async def fake_extract_with_cookiejar(url: str, ydl_opts: dict):
+        selectors.append(ydl_opts["format"])
+        return info, None
+
+    class FakeStdout:
+        def __init__(self):
+            self.chunks = [b"\x00\x00\x00\x18ftyp", b"moof"]
+
+        async def read(self, n: int) -> bytes:
+            return self.chunks.pop(0) if self.chunks else b""
+
+    class FakeStderr:
+        async def read(self) -> bytes:
+            return b""
+
+    class FakeProc:
+        def __init__(self):
+            self.stdout = FakeStdout()
+            self.stderr = FakeStderr()
+            self.returncode = None
+
+        def kill(self):
+            self.returncode = -9
+
+        async def wait(self):
+            return self.returncode
+
+    captured: Dict[str, Any] = {}
+
+    async def fake_create_subprocess_exec(*args, **kwargs):
+        captured["args"] = list(args)
+        return FakeProc()
+
+    monkeypatch.setattr(main, "_extract_info_with_cookiejar", fake_extract_with_cookiejar)
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_create_subprocess_exec)
+
+    r = client.get(
+        "/api/download_merged",
+        params={"source": "https://example.com/watch?v=abc123", "video_format_id": "137", "audio_format_id": "140"},
+    )
+    assert r.status_code == 200
+    assert r.headers["Content-Type"] == "video/mp4"
+    assert "Test%20Video.mp4" in r.headers["Content-Disposition"]
+    assert r.content == b"\x00\x00\x00\x18ftypmoof"
+    assert selectors == ["137+140"]
+
+    args = captured["args"]
+    inputs = [args[i + 1] for i, a in enumerate(args) if a == "-i"]
+    assert inputs == ["https://cdn.example.com/video-1080.mp4", "https://cdn.example.com/a.m4a"]
+    assert args[args.index("-c") + 1] == "copy"
+    assert "frag_keyframe+empty_moov+default_base_moof" in args
+    header_values = [args[i + 1] for i, a in enumerate(args) if a == "-headers"]
+    assert "X-Video: 1" in header_values[0] and "X-Video" not in header_values[1]
+
+    r2 = client.get(
+        "/api/download_merged",
+        params={"source": "https://example.com/watch?v=abc123", "video_format_id": "140", "audio_format_id": "140"},
+    )
+    assert r2.status_code == 404
+
+
 def test_cookies_status(monkeypatch, client: TestClient, tmp_path):
     # Force AOI_COOKIEFILE to a non-existent path so candidate auto-detect is skipped
     nonexistent = tmp_path / "definitely_missing.cookies"
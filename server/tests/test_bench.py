@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ..bench.fake_cdn import FakeCDN, body_slice
+from ..bench.fake_extractor import install, source_url
+from ..bench.run import percentile
+from ..manifest_stream import parse_m3u8
+
+
+def _get(path: str, headers=None) -> httpx.Response:
+    async def fetch():
+        transport = httpx.ASGITransport(app=FakeCDN())
+        async with httpx.AsyncClient(transport=transport, base_url="http://cdn.test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(fetch())
+
+
+def test_fake_cdn_serves_ranges_and_refuses_bots():
+    r = _get("/media/a.mp4?size=200000")
+    assert r.status_code == 200 and r.content == body_slice(0, 199999)
+    r = _get("/media/a.mp4?size=200000", {"Range": "bytes=70000-"})
+    assert r.status_code == 206 and r.headers["Content-Range"] == "bytes 70000-199999/200000"
+    assert r.content == body_slice(70000, 199999)
+    assert _get("/media/a.mp4?size=100", {"Range": "bytes=100-"}).status_code == 416
+
+    assert _get("/media/a.mp4?size=100&antibot=1").status_code == 403
+    assert _get("/media/a.mp4?size=100&antibot=1", {"sec-ch-ua": '"Chromium"'}).status_code == 200
+
+
+def test_fake_cdn_hls_playlist_points_at_segments():
+    r = _get("/hls/x.m3u8?segments=3&segment_size=1000&rate=5000")
+    playlist = parse_m3u8(r.text, "http://cdn.test/hls/x.m3u8")
+    assert playlist.endlist and len(playlist.fragments) == 3
+    assert playlist.fragments[2].url == "http://cdn.test/hls/x/2.ts?size=1000&rate=5000"
+    assert len(_get("/hls/x/2.ts?size=1000").content) == 1000
+
+
+def test_fake_extractor_replays_recordings_with_the_cdn_url():
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import DownloadError
+
+    uninstall = install("http://127.0.0.1:9")
+    try:
+        with YoutubeDL({"quiet": True}) as ydl:
+            info = ydl.extract_info(source_url("progressive"), download=False)
+            assert info["formats"][0]["url"].startswith("http://127.0.0.1:9/media/")
+            # Each call gets its own copy
+            info["formats"].clear()
+            assert ydl.extract_info(source_url("progressive"), download=False)["formats"]
+            with pytest.raises(DownloadError):
+                ydl.extract_info(source_url("missing"), download=False)
+    finally:
+        uninstall()
+    assert YoutubeDL.extract_info.__name__ == "extract_info" and YoutubeDL.extract_info.__module__.startswith("yt_dlp")
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) is None
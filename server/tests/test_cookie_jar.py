@@ -0,0 +1,64 @@
+import os
+import time
+from http.cookiejar import CookieJar
+
+import yt_dlp
+
+from ..cookie_jar import DomainIndex, SharedCookies, index_for_jar, ydl_with_shared_cookies
+from ..extract_pool import cookiejar_from_dicts
+
+_HEADER = "# Netscape HTTP Cookie File\n"
+
+
+def _line(domain: str, name: str, value: str, expires: int = 0) -> str:
+    return f"{domain}\tTRUE\t/\tFALSE\t{expires}\t{name}\t{value}\n"
+
+
+def test_domain_index_matches_host_suffixes_and_skips_expired():
+    now = time.time()
+    jar = cookiejar_from_dicts([
+        {"name": "a", "value": "1", "domain": ".example.com"},
+        {"name": "b", "value": "2", "domain": "cdn.example.com"},
+        {"name": "c", "value": "3", "domain": ".other.com"},
+        {"name": "old", "value": "x", "domain": ".example.com", "expires": int(now - 10)},
+        {"name": "tld", "value": "x", "domain": ".com"},
+    ])
+    index = DomainIndex(jar)
+    assert index.cookie_header("v1.cdn.example.com") == "b=2; a=1"
+    assert index.cookie_header("www.example.com") == "a=1"
+    assert index.cookie_header("notexample.com") is None
+    assert index_for_jar(jar) is index_for_jar(jar)
+
+
+def test_shared_cookies_reload_when_file_changes(tmp_path):
+    path = tmp_path / "cookies.txt"
+    path.write_text(_HEADER + _line(".example.com", "sid", "one"))
+    shared = SharedCookies(lambda: [str(tmp_path / "missing.txt"), str(path)], check_interval=0)
+    snapshot = shared.current()
+    assert snapshot is not None and snapshot.path == str(path)
+    assert snapshot.index.cookie_header("www.example.com") == "sid=one"
+    assert shared.current() is snapshot and shared.loads == 1
+
+    path.write_text(_HEADER + _line(".example.com", "sid", "two") + _line(".example.com", "x", "y"))
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+    assert shared.current().index.cookie_header("example.com") == "sid=two; x=y"
+    assert shared.loads == 2
+
+    path.unlink()
+    assert shared.current() is None
+
+
+def test_youtubedl_gets_a_copy_of_the_shared_jar(tmp_path):
+    path = tmp_path / "cookies.txt"
+    path.write_text(_HEADER + _line(".example.com", "sid", "one"))
+    shared = SharedCookies(lambda: [str(path)], check_interval=60)
+    opts = {"quiet": True, "cookiefile": str(path)}
+    with ydl_with_shared_cookies(yt_dlp.YoutubeDL, opts, shared) as ydl:
+        assert "cookiefile" not in ydl.params
+        assert [c.name for c in ydl.cookiejar] == ["sid"]
+        ydl.cookiejar.clear()
+    assert [c.name for c in shared.current().jar] == ["sid"]
+    assert opts["cookiefile"] == str(path)
+
+    plain = ydl_with_shared_cookies(yt_dlp.YoutubeDL, {"quiet": True})
+    assert isinstance(plain.cookiejar, CookieJar)
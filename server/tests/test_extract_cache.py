@@ -0,0 +1,84 @@
+import time
+
+from ..extract_cache import (
+    ExtractionCache,
+    earliest_url_expiry,
+    extraction_cache_key,
+    normalize_source_url,
+)
+
+
+def _info(url: str = "https://cdn.example.com/v.mp4", pad: int = 0) -> dict:
+    return {"id": "x", "title": "t" * pad, "formats": [{"format_id": "18", "url": url}]}
+
+
+def test_normalize_source_url_drops_tracking_and_fragment():
+    a = normalize_source_url("HTTPS://WWW.Example.com:443/watch?v=1&utm_source=tw&si=abc#t=10")
+    b = normalize_source_url("https://www.example.com/watch?v=1")
+    assert a == b == "https://www.example.com/watch?v=1"
+
+
+def test_cache_key_ignores_format_selector_but_not_user_agent():
+    base = {"format": "18", "http_headers": {"User-Agent": "A"}}
+    other_format = {"format": "140", "http_headers": {"User-Agent": "A"}}
+    other_ua = {"format": "18", "http_headers": {"User-Agent": "B"}}
+    url = "https://example.com/v"
+    assert extraction_cache_key(url, base) == extraction_cache_key(url, other_format)
+    assert extraction_cache_key(url, base) != extraction_cache_key(url, other_ua)
+
+
+def test_cache_key_separates_playlist_pages():
+    page1 = {"noplaylist": False, "extract_flat": "in_playlist", "playlist_items": "1:51"}
+    page2 = dict(page1, playlist_items="51:101")
+    url = "https://example.com/playlist?list=1"
+    assert extraction_cache_key(url, page1) != extraction_cache_key(url, page2)
+    assert extraction_cache_key(url, page1) != extraction_cache_key(url, {"noplaylist": False})
+
+
+def test_earliest_url_expiry_understands_common_cdns():
+    soon = int(time.time()) + 100
+    later = int(time.time()) + 1000
+    info = {
+        "formats": [
+            {"url": f"https://r1.googlevideo.com/videoplayback?expire={later}"},
+            {"url": f"https://scontent.cdninstagram.com/v.mp4?oe={soon:X}"},
+        ]
+    }
+    assert earliest_url_expiry(info) == soon
+    assert earliest_url_expiry(_info()) is None
+
+
+def test_get_put_counts_hits_and_misses():
+    cache = ExtractionCache(max_bytes=1024 * 1024, ttl_seconds=60)
+    assert cache.get("k") is None
+    assert cache.put("k", _info(), None)
+    info, jar = cache.get("k")
+    assert info["id"] == "x" and jar is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["entries"] == 1
+
+
+def test_lru_eviction_is_bounded_by_bytes():
+    cache = ExtractionCache(max_bytes=3000, ttl_seconds=60)
+    cache.put("a", _info(pad=1000))
+    cache.put("b", _info(pad=1000))
+    cache.get("a")  # a is now most recently used
+    cache.put("c", _info(pad=1000))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["bytes"] <= 3000
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_respects_signed_url_expiry():
+    cache = ExtractionCache(max_bytes=1024 * 1024, ttl_seconds=3600, expiry_margin_seconds=60)
+    # URL expires inside the safety margin: not worth caching
+    expiring = f"https://cdn.example.com/v.mp4?expire={int(time.time()) + 30}"
+    assert cache.put("k", _info(expiring)) is False
+    assert cache.stats()["uncacheable"] == 1
+
+    cache.put("k2", _info())
+    cache._entries["k2"] = (time.time() - 1,) + cache._entries["k2"][1:]
+    assert cache.get("k2") is None
+    assert cache.stats()["expirations"] == 1
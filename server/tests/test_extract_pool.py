@@ -0,0 +1,75 @@
+import asyncio
+import os
+
+import pytest
+
+from ..extract_pool import ProcessExtractionPool, RemoteExtractionError
+
+
+def _echo_task(url: str, ydl_opts: dict):
+    cookies = [{"name": "sid", "value": "1", "domain": ".cdn.example.com", "path": "/", "secure": True, "expires": None}]
+    return {"url": url, "pid": os.getpid(), "opts": ydl_opts}, cookies
+
+
+def _failing_task(url: str, ydl_opts: dict):
+    raise ValueError(f"cannot extract {url}")
+
+
+def _run(pool: ProcessExtractionPool, coro_factory):
+    async def scenario():
+        try:
+            return await coro_factory()
+        finally:
+            await pool.aclose()
+
+    return asyncio.run(scenario())
+
+
+def test_returns_plain_info_and_rebuilt_cookiejar():
+    pool = ProcessExtractionPool(size=1, task_fn=_echo_task, preload=())
+    info, jar = _run(pool, lambda: pool.run("https://example.com/v", {"format": "18"}))
+    assert info["url"] == "https://example.com/v"
+    assert info["opts"] == {"format": "18"}
+    assert info["pid"] != os.getpid()
+    assert [(c.name, c.value, c.domain) for c in jar] == [("sid", "1", ".cdn.example.com")]
+
+
+def test_worker_is_recycled_after_max_tasks():
+    pool = ProcessExtractionPool(size=1, max_tasks_per_worker=2, task_fn=_echo_task, preload=())
+
+    async def three_tasks():
+        return [(await pool.run(f"https://example.com/{i}", {}))[0]["pid"] for i in range(3)]
+
+    pids = _run(pool, three_tasks)
+    assert pids[0] == pids[1]
+    assert pids[2] != pids[1]
+    assert pool.stats()["recycled_after_tasks"] == 1
+    assert pool.stats()["spawned"] == 2
+
+
+def test_worker_is_recycled_over_rss_limit():
+    pool = ProcessExtractionPool(size=1, max_rss_bytes=1, task_fn=_echo_task, preload=())
+
+    async def two_tasks():
+        return [(await pool.run("https://example.com/v", {}))[0]["pid"] for _ in range(2)]
+
+    pids = _run(pool, two_tasks)
+    assert pids[0] != pids[1]
+    assert pool.stats()["recycled_over_rss"] == 2
+
+
+def test_errors_are_raised_in_the_parent_and_worker_is_reused():
+    pool = ProcessExtractionPool(size=1, task_fn=_failing_task, preload=())
+
+    async def scenario():
+        with pytest.raises(RemoteExtractionError) as excinfo:
+            await pool.run("https://example.com/v", {})
+        assert excinfo.value.error_type == "ValueError"
+        assert "cannot extract" in str(excinfo.value)
+        with pytest.raises(RemoteExtractionError):
+            await pool.run("https://example.com/v", {})
+        return pool.stats()
+
+    stats = _run(pool, scenario)
+    assert stats["failed"] == 2
+    assert stats["spawned"] == 1
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+
+from ..jobs import COMPLETED, FAILED, QUEUED, DownloadTarget, JobQueue, NotOwner
+
+PAYLOAD = bytes(range(256)) * 8192  # 2 MiB
+
+
+class _BrokenStream(httpx.AsyncByteStream):
+    """Sends ``cut`` bytes of ``body`` and then drops the connection."""
+
+    def __init__(self, body: bytes, cut: int):
+        self._body = body
+        self._cut = cut
+
+    async def __aiter__(self):
+        yield self._body[: self._cut]
+        raise httpx.ReadError("connection reset")
+
+
+def _cdn(requests, fail_first_at=None):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.headers.get("Range"))
+        range_header = request.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            body = PAYLOAD[start:]
+            return httpx.Response(
+                206,
+                headers={
+                    "Content-Range": f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}",
+                    "Content-Length": str(len(body)),
+                    "Content-Type": "video/mp4",
+                },
+                content=body,
+            )
+        headers = {"Content-Length": str(len(PAYLOAD)), "Content-Type": "video/mp4"}
+        if fail_first_at is not None and len(requests) == 1:
+            return httpx.Response(200, headers=headers, stream=_BrokenStream(PAYLOAD, fail_first_at))
+        return httpx.Response(200, headers=headers, content=PAYLOAD)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _wait_for(queue: JobQueue, job_id: str, statuses=(COMPLETED, FAILED)):
+    for _ in range(500):
+        job = queue.get(job_id)
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stuck in {queue.get(job_id).status}")
+
+
+def test_interrupted_transfer_resumes_from_the_last_byte(tmp_path):
+    seen_ranges = []
+    resolved = []
+
+    async def scenario():
+        client = _cdn(seen_ranges, fail_first_at=300_000)
+
+        async def resolve(job):
+            resolved.append(job.id)
+            return DownloadTarget("clip.mp4", url="https://cdn.example.com/v.mp4", headers={"X-A": "1"}, client=client)
+
+        queue = JobQueue(str(tmp_path), resolve, workers=1, retry_delay=0)
+        queue.start()
+        job = await queue.submit("https://example.com/watch?v=1", "18")
+        job = await _wait_for(queue, job.id)
+        await queue.stop()
+        await client.aclose()
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert job.status == COMPLETED and job.attempts == 2 and job.error is None
+    assert seen_ranges == [None, "bytes=300000-"]
+    # Re-extracted before every attempt
+    assert len(resolved) == 2
+    with open(queue.data_path(job.id), "rb") as fh:
+        assert fh.read() == PAYLOAD
+    assert job.total_bytes == len(PAYLOAD) and job.content_type == "video/mp4"
+    assert not os.path.exists(queue.part_path(job.id))
+
+
+def test_jobs_survive_a_restart_and_resume(tmp_path):
+    seen_ranges = []
+
+    # A job that was running when the process stopped, with 1000 bytes on disk
+    with open(tmp_path / "abc123.json", "w") as fh:
+        json.dump({"id": "abc123", "source": "https://example.com/v", "format_id": "18", "status": "running",
+                   "created_at": 1.0, "total_bytes": len(PAYLOAD)}, fh)
+    with open(tmp_path / "abc123.part", "wb") as fh:
+        fh.write(PAYLOAD[:1000])
+
+    async def scenario():
+        client = _cdn(seen_ranges)
+
+        async def resolve(job):
+            return DownloadTarget("clip.mp4", url="https://cdn.example.com/v.mp4", client=client)
+
+        queue = JobQueue(str(tmp_path), resolve, workers=1)
+        loaded = queue.get("abc123")
+        assert loaded.status == QUEUED and loaded.bytes_done == 1000
+        queue.start()
+        job = await _wait_for(queue, "abc123")
+        await queue.stop()
+        await client.aclose()
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert job.status == COMPLETED and seen_ranges == ["bytes=1000-"]
+    with open(queue.data_path("abc123"), "rb") as fh:
+        assert fh.read() == PAYLOAD
+    with open(tmp_path / "abc123.json") as fh:
+        assert json.load(fh)["status"] == COMPLETED
+
+
+def test_failing_job_gives_up_and_deleted_jobs_lose_their_files(tmp_path):
+    async def scenario():
+        async def resolve(job):
+            raise RuntimeError("Format not found")
+
+        queue = JobQueue(str(tmp_path), resolve, workers=2, retries=1, retry_delay=0)
+        queue.start()
+        job = await queue.submit("https://example.com/v", "18", owner="u1")
+        job = await _wait_for(queue, job.id)
+        assert [j.id for j in queue.list(owner="u1")] == [job.id]
+        assert queue.list(owner=None) == []
+        assert await queue.delete(job.id) is True
+        await queue.stop()
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert job.status == FAILED and job.attempts == 2 and job.error == "Format not found"
+    assert queue.get(job.id) is None
+    assert os.listdir(tmp_path) == [JobQueue.LOCK_NAME]
+
+
+def test_completed_jobs_expire_after_retention(tmp_path):
+    async def resolve(job):  # pragma: no cover - never started
+        raise AssertionError
+
+    queue = JobQueue(str(tmp_path), resolve, retention_seconds=60)
+    job = asyncio.run(queue.submit("https://example.com/v", "18"))
+    job.status, job.finished_at = COMPLETED, 1000.0
+    assert queue.prune(now=1030.0) == 0
+    assert queue.prune(now=1061.0) == 1 and queue.get(job.id) is None
+
+
+def test_only_one_process_runs_the_jobs_of_a_directory(tmp_path):
+    async def resolve(job):  # pragma: no cover - never started
+        raise AssertionError
+
+    async def scenario():
+        first = JobQueue(str(tmp_path), resolve)
+        second = JobQueue(str(tmp_path), resolve)
+        first.start()
+        # flock locks are per open file description, like a second process
+        with pytest.raises(NotOwner):
+            second.start()
+        assert first.active and not second.active
+        await first.stop()
+        second.start()
+        assert second.active
+        await second.stop()
+
+    asyncio.run(scenario())
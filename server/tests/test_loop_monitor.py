@@ -0,0 +1,31 @@
+import asyncio
+import time
+
+from ..loop_monitor import LoopMonitor
+
+
+def _blocking_call(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def test_lag_is_sampled_and_blocking_stack_is_captured():
+    lags = []
+
+    async def scenario():
+        monitor = LoopMonitor(interval=0.02, threshold=0.1, on_sample=lags.append)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        _blocking_call(0.4)
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    stats = monitor.stats()
+    assert stats["running"] is False and stats["samples"] == len(lags) >= 3
+    assert stats["max_lag"] >= 0.3 and round(max(lags), 6) == stats["max_lag"]
+    # One report for the single stall, taken while the loop was still blocked
+    assert stats["stalls"] == 1
+    report = monitor.recent_reports()[0]
+    assert report["blocked_for"] >= 0.1 and report["task"]
+    assert "_blocking_call" in report["stack"][-2] and "time.sleep" in report["stack"][-1]
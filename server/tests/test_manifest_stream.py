@@ -0,0 +1,166 @@
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from ..manifest_stream import ManifestError, is_manifest_protocol, open_manifest_stream, parse_m3u8
+
+
+def _collect(fmt: dict, routes: Dict[str, List[httpx.Response]], **kwargs):
+    calls: List[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        calls.append(url)
+        queue = routes[url]
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            media_type, ext, body = await open_manifest_stream(client, fmt, {"User-Agent": "UA"}, **kwargs)
+            data = b"".join([chunk async for chunk in body])
+            return media_type, ext, data
+
+    return (*asyncio.run(scenario()), calls)
+
+
+def test_is_manifest_protocol():
+    assert is_manifest_protocol("m3u8_native")
+    assert is_manifest_protocol("http_dash_segments")
+    assert not is_manifest_protocol("https")
+    assert not is_manifest_protocol(None)
+
+
+def test_parse_media_playlist_with_map_and_byteranges():
+    text = "\n".join([
+        "#EXTM3U",
+        "#EXT-X-TARGETDURATION:4",
+        "#EXT-X-MEDIA-SEQUENCE:7",
+        '#EXT-X-MAP:URI="init.mp4"',
+        "#EXTINF:4.0,",
+        "#EXT-X-BYTERANGE:100@0",
+        "media.mp4",
+        "#EXTINF:4.0,",
+        "#EXT-X-BYTERANGE:50",
+        "media.mp4",
+        "#EXT-X-ENDLIST",
+    ])
+    pl = parse_m3u8(text, "https://cdn.example.com/v/index.m3u8")
+    assert pl.init.url == "https://cdn.example.com/v/init.mp4"
+    assert [(f.seq, f.byterange) for f in pl.fragments] == [(7, (0, 100)), (8, (100, 50))]
+    assert pl.endlist and pl.target_duration == 4.0
+
+
+def test_parse_rejects_sample_aes():
+    with pytest.raises(ManifestError):
+        parse_m3u8('#EXTM3U\n#EXT-X-KEY:METHOD=SAMPLE-AES,URI="k"\nseg.ts\n', "https://x/")
+
+
+def test_hls_master_vod_streams_fragments_in_order_and_retries():
+    base = "https://cdn.example.com/hls/"
+    routes = {
+        base + "master.m3u8": [httpx.Response(200, text=(
+            "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=100\nlow.m3u8\n#EXT-X-STREAM-INF:BANDWIDTH=900\nhigh.m3u8\n"
+        ))],
+        base + "high.m3u8": [httpx.Response(200, text=(
+            "#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXTINF:2,\na.ts\n#EXTINF:2,\nb.ts\n#EXTINF:2,\nc.ts\n#EXT-X-ENDLIST\n"
+        ))],
+        base + "a.ts": [httpx.Response(200, content=b"AAA")],
+        base + "b.ts": [httpx.Response(503), httpx.Response(200, content=b"BBB")],
+        base + "c.ts": [httpx.Response(200, content=b"CCC")],
+    }
+    fmt = {"protocol": "m3u8_native", "url": base + "master.m3u8"}
+    media_type, ext, data, calls = _collect(fmt, routes, lookahead=2)
+    assert (media_type, ext) == ("video/mp2t", "ts")
+    assert data == b"AAABBBCCC"
+    assert calls.count(base + "b.ts") == 2
+    assert base + "low.m3u8" not in calls
+
+
+def test_hls_aes128_fragments_are_decrypted():
+    from yt_dlp.aes import aes_cbc_encrypt_bytes, pkcs7_padding
+
+    key = bytes(range(16))
+    iv = (5).to_bytes(16, "big")
+    plain = b"transport stream payload"
+    encrypted = aes_cbc_encrypt_bytes(bytes(pkcs7_padding(list(plain))), key, iv)
+    base = "https://cdn.example.com/enc/"
+    routes = {
+        base + "index.m3u8": [httpx.Response(200, text=(
+            '#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:5\n#EXT-X-KEY:METHOD=AES-128,URI="key.bin"\n#EXTINF:2,\ns.ts\n#EXT-X-ENDLIST\n'
+        ))],
+        base + "key.bin": [httpx.Response(200, content=key)],
+        base + "s.ts": [httpx.Response(200, content=encrypted)],
+    }
+    _, _, data, _ = _collect({"protocol": "m3u8", "url": base + "index.m3u8"}, routes)
+    assert data == plain
+
+
+def test_live_playlist_is_polled_until_endlist():
+    base = "https://cdn.example.com/live/"
+    routes = {
+        base + "live.m3u8": [
+            httpx.Response(200, text="#EXTM3U\n#EXT-X-TARGETDURATION:0\n#EXT-X-MEDIA-SEQUENCE:1\n#EXTINF:1,\n1.ts\n"),
+            httpx.Response(200, text="#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:1\n#EXTINF:1,\n1.ts\n#EXTINF:1,\n2.ts\n#EXT-X-ENDLIST\n"),
+        ],
+        base + "1.ts": [httpx.Response(200, content=b"one")],
+        base + "2.ts": [httpx.Response(200, content=b"two")],
+    }
+    _, _, data, calls = _collect({"protocol": "m3u8_native", "url": base + "live.m3u8"}, routes, min_refresh=0.01)
+    assert data == b"onetwo"
+    assert calls.count(base + "1.ts") == 1
+
+
+def test_dash_fragment_list_uses_base_url():
+    base = "https://cdn.example.com/dash/"
+    fmt = {
+        "protocol": "http_dash_segments",
+        "ext": "m4a",
+        "vcodec": "none",
+        "fragment_base_url": base,
+        "fragments": [{"path": "init.mp4"}, {"path": "seg-1.m4s"}, {"url": base + "seg-2.m4s"}],
+    }
+    routes = {
+        base + "init.mp4": [httpx.Response(200, content=b"I")],
+        base + "seg-1.m4s": [httpx.Response(200, content=b"1")],
+        base + "seg-2.m4s": [httpx.Response(200, content=b"2")],
+    }
+    media_type, ext, data, _ = _collect(fmt, routes)
+    assert (media_type, ext, data) == ("audio/mp4", "m4a", b"I12")
+
+
+def test_stalled_fragment_times_out_and_is_retried():
+    attempts: List[int] = []
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.readuntil(b"\r\n\r\n")
+        attempts.append(1)
+        if len(attempts) == 1:
+            # Headers arrive, then the body never does
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\n")
+            await writer.drain()
+            await asyncio.sleep(30)
+        else:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\nConnection: close\r\n\r\nfrag")
+            await writer.drain()
+        writer.close()
+
+    async def scenario():
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        fmt = {"protocol": "http_dash_segments", "ext": "mp4",
+               "fragments": [{"url": f"http://127.0.0.1:{port}/seg1.m4s"}]}
+        # Like the shared media client: no read timeout of its own
+        async with httpx.AsyncClient(timeout=httpx.Timeout(None)) as client:
+            _, _, body = await open_manifest_stream(client, fmt, {}, read_timeout=0.2)
+            data = await asyncio.wait_for(_join(body), 10)
+        server.close()
+        return data
+
+    assert asyncio.run(scenario()) == b"frag"
+    assert len(attempts) == 2
+
+
+async def _join(body) -> bytes:
+    return b"".join([chunk async for chunk in body])
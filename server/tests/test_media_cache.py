@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+import pytest
+
+from ..media_cache import DiskCache, tee_to_cache
+from ..range_file import RangeNotSatisfiable, parse_range_header
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def _fill(cache: DiskCache, key: str, body: bytes, expected=None, meta=None) -> bytes:
+    async def scenario():
+        writer = cache.begin_fill(key, expected if expected is not None else len(body), meta)
+        half = len(body) // 2
+        return b"".join([c async for c in tee_to_cache(_chunks(body[:half], body[half:]), writer)])
+
+    return asyncio.run(scenario())
+
+
+def _lookup(cache: DiskCache, key: str):
+    entry = asyncio.run(cache.lookup(key))
+    if entry is not None:
+        entry.file.close()
+    return entry
+
+
+def test_parse_range_header():
+    assert parse_range_header(None, 100) is None
+    assert parse_range_header("bytes=0-9", 100) == (0, 9)
+    assert parse_range_header("bytes=90-", 100) == (90, 99)
+    assert parse_range_header("bytes=-10", 100) == (90, 99)
+    assert parse_range_header("bytes=50-500", 100) == (50, 99)
+    assert parse_range_header("bytes=0-1,5-6", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=100-", 100)
+
+
+def test_fill_commit_and_lookup(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    assert _lookup(cache, "yt:abc:18") is None
+    assert _fill(cache, "yt:abc:18", b"0123456789", meta={"content_type": "video/mp4"}) == b"0123456789"
+    entry = asyncio.run(cache.lookup("yt:abc:18"))
+    assert entry is not None and entry.size == 10
+    assert entry.meta["content_type"] == "video/mp4"
+    with entry.file as fh:
+        assert fh.read() == b"0123456789"
+    # Only one concurrent fill per key, and none for committed keys
+    assert cache.begin_fill("yt:abc:18", 10) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["fills_committed"] == 1
+
+
+def test_short_body_is_not_committed(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    _fill(cache, "k", b"12345", expected=10)
+    assert _lookup(cache, "k") is None
+    assert cache.stats()["fills_aborted"] == 1
+    assert [n for n in os.listdir(tmp_path)] == []
+
+
+def test_lru_eviction_by_total_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=25)
+    _fill(cache, "a", b"a" * 10)
+    _fill(cache, "b", b"b" * 10)
+    assert _lookup(cache, "a") is not None
+    _fill(cache, "c", b"c" * 10)
+    assert _lookup(cache, "b") is None
+    assert _lookup(cache, "a") is not None and _lookup(cache, "c") is not None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 20
+
+
+def test_index_is_reloaded_from_disk(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    _fill(cache, "k", b"payload", meta={"content_type": "audio/mp4"})
+    (tmp_path / "stale.part").write_bytes(b"x")
+    reloaded = DiskCache(str(tmp_path), max_bytes=1000)
+    entry = _lookup(reloaded, "k")
+    assert entry is not None and entry.meta["content_type"] == "audio/mp4"
+    assert not (tmp_path / "stale.part").exists()
+
+
+def test_looked_up_entry_stays_readable_when_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=15)
+    _fill(cache, "a", b"a" * 10)
+    entry = asyncio.run(cache.lookup("a"))
+    # Evicted (and unlinked) by another fill before the response is sent
+    _fill(cache, "b", b"b" * 10)
+    assert not os.path.exists(entry.path) and _lookup(cache, "a") is None
+    with entry.file as fh:
+        assert fh.read() == b"a" * 10
+
+
+def test_entry_removed_by_another_process_is_dropped(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    _fill(cache, "k", b"payload")
+    entry = _lookup(cache, "k")
+    os.unlink(entry.path)
+    assert _lookup(cache, "k") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
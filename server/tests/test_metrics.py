@@ -0,0 +1,51 @@
+from ..metrics import Counter, RateMeter, Registry
+
+
+def test_exposition_format_with_labels_and_histogram_buckets():
+    registry = Registry()
+    requests = registry.counter("aoi_test_total", "Test counter.", ("endpoint",))
+    requests.labels("download").inc(3)
+    requests.labels(endpoint='we"ird').inc()
+    latency = registry.histogram("aoi_test_seconds", "Test histogram.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    def collect():
+        extra = Counter("aoi_collected_total", "Read at scrape time.")
+        extra.inc(7)
+        yield extra
+
+    registry.add_collector(collect)
+    lines = registry.expose().splitlines()
+
+    assert "# TYPE aoi_test_total counter" in lines
+    assert 'aoi_test_total{endpoint="download"} 3' in lines
+    assert 'aoi_test_total{endpoint="we\\"ird"} 1' in lines
+    assert "# TYPE aoi_test_seconds histogram" in lines
+    # Buckets are cumulative and include their upper bound
+    assert 'aoi_test_seconds_bucket{le="0.1"} 2' in lines
+    assert 'aoi_test_seconds_bucket{le="1"} 3' in lines
+    assert 'aoi_test_seconds_bucket{le="+Inf"} 4' in lines
+    assert "aoi_test_seconds_sum 3.65" in lines
+    assert "aoi_test_seconds_count 4" in lines
+    assert "aoi_collected_total 7" in lines
+
+
+def test_rate_meter_averages_complete_seconds(monkeypatch):
+    import server.metrics as metrics
+
+    now = [100.0]
+    monkeypatch.setattr(metrics.time, "monotonic", lambda: now[0])
+    meter = RateMeter(window=2)
+    meter.add(1000)
+    meter.add(1000)
+    # The current second is still filling up
+    assert meter.rate() == 0
+    now[0] = 101.2
+    meter.add(500)
+    assert meter.rate() == 1000
+    now[0] = 102.5
+    assert meter.rate() == 1250
+    # Long idle periods empty the window
+    now[0] = 110.0
+    assert meter.rate() == 0
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from ..passwords import AttemptLimiter, HasherBusy, PasswordHasher, hash_cost
+
+
+def test_hash_verify_and_cost():
+    async def scenario():
+        hasher = PasswordHasher(rounds=4, workers=1)
+        hashed, seconds = await hasher.hash("pw")
+        assert hash_cost(hashed) == 4 and seconds >= 0
+        assert (await hasher.verify("pw", hashed))[0] is True
+        assert (await hasher.verify("nope", hashed))[0] is False
+        assert (await hasher.verify("pw", "not-a-hash"))[0] is False
+        assert hasher.needs_rehash(hashed) is False
+        assert PasswordHasher(rounds=5).needs_rehash(hashed) is True
+        hasher.shutdown()
+        return hasher.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["hashed"] == 1 and stats["verified"] == 3 and stats["pending"] == 0
+
+
+def test_queue_depth_is_bounded():
+    async def scenario():
+        hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+        results = await asyncio.gather(*(hasher.hash("pw") for _ in range(4)), return_exceptions=True)
+        hasher.shutdown()
+        return hasher, results
+
+    hasher, results = asyncio.run(scenario())
+    assert sum(isinstance(r, HasherBusy) for r in results) == 2
+    assert hasher.rejected == 2
+
+
+def test_attempt_limiter_window(monkeypatch):
+    import server.passwords as passwords
+
+    now = [1000.0]
+    monkeypatch.setattr(passwords.time, "monotonic", lambda: now[0])
+    limiter = AttemptLimiter(limit=2, window_seconds=10)
+    assert limiter.retry_after("1.2.3.4") is None
+    limiter.record("1.2.3.4")
+    limiter.record("1.2.3.4")
+    assert limiter.retry_after("1.2.3.4") == pytest.approx(10)
+    assert limiter.retry_after("5.6.7.8") is None
+    now[0] += 10.5
+    assert limiter.retry_after("1.2.3.4") is None
+    limiter.record("a")
+    limiter.reset("a")
+    assert limiter.retry_after("a") is None
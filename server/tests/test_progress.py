@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+from ..progress import FfmpegProgressReader, ProgressHub, YtdlpProgressLogger, current_job, valid_job_id
+
+
+def test_followers_get_backlog_then_live_events_until_final():
+    hub = ProgressHub()
+
+    async def scenario():
+        hub.publish("job-0001", {"type": "extract", "phase": "start"})
+        received = []
+
+        async def follow():
+            async for event in hub.follow("job-0001", keepalive=0.05):
+                received.append(event)
+
+        follower = asyncio.ensure_future(follow())
+        await asyncio.sleep(0.1)
+        # Published from another thread, like yt-dlp's logger does
+        t = threading.Thread(target=hub.publish, args=("job-0001", {"type": "done"}), kwargs={"final": True})
+        t.start()
+        t.join()
+        await asyncio.wait_for(follower, 1)
+        return received
+
+    received = asyncio.run(scenario())
+    events = [e for e in received if e is not None]
+    assert [e["type"] for e in events] == ["extract", "done"]
+    assert events[-1]["final"] is True
+    # At least one keepalive while idle
+    assert None in received
+
+    async def late():
+        return [e async for e in hub.follow("job-0001")]
+
+    # A finished job replays its events and ends; nothing is added after the final one
+    hub.publish("job-0001", {"type": "stream"})
+    assert [e["type"] for e in asyncio.run(late())] == ["extract", "done"]
+    assert hub.stats()["jobs"] == 1
+
+
+def test_finished_jobs_expire_and_job_count_is_bounded():
+    hub = ProgressHub(retain_seconds=0, max_jobs=2)
+    for i in range(4):
+        hub.publish(f"job-{i:04d}", {"type": "done"}, final=True)
+    assert hub.stats()["jobs"] <= 2
+
+
+def test_job_ids_are_validated():
+    assert valid_job_id("3f2a9c1e-77aa-4c1b")
+    assert not valid_job_id("short")
+    assert not valid_job_id("../../etc/passwd")
+    assert not valid_job_id(None)
+
+
+def test_ytdlp_logger_publishes_steps_only_for_the_current_job():
+    hub = ProgressHub()
+    log = YtdlpProgressLogger(lambda: hub)
+    log.debug("[youtube] abc: Downloading webpage")
+    assert hub.stats()["jobs"] == 0
+
+    token = current_job.set("job-0002")
+    try:
+        log.debug("[youtube] abc: Downloading webpage")
+        log.debug("[debug] Invoking extractor")
+        log.debug("[youtube:tab] Extracting URL: https://example.com")
+    finally:
+        current_job.reset(token)
+
+    async def collect():
+        hub.publish("job-0002", {"type": "done"}, final=True)
+        return [e async for e in hub.follow("job-0002")]
+
+    events = asyncio.run(collect())
+    assert [(e.get("extractor"), e.get("message")) for e in events[:-1]] == [
+        ("youtube", "Downloading webpage"),
+        ("youtube:tab", "Extracting URL: https://example.com"),
+    ]
+
+
+def test_ffmpeg_progress_blocks_are_parsed_and_errors_kept():
+    updates = []
+
+    async def scenario():
+        stream = asyncio.StreamReader()
+        stream.feed_data(
+            b"out_time_us=1500000\nspeed=2.5x\ntotal_size=4096\nprogress=continue\n"
+            b"[https @ 0x1] HTTP error 403 Forbidden\n"
+            b"out_time_us=N/A\nspeed=N/A\nprogress=end\n"
+        )
+        stream.feed_eof()
+        reader = FfmpegProgressReader(stream, updates.append).start()
+        return await reader.read()
+
+    stderr = asyncio.run(scenario())
+    assert updates[0] == {"progress": "continue", "out_time": 1.5, "speed": 2.5, "total_size": 4096}
+    assert updates[1] == {"progress": "end"}
+    assert stderr == b"[https @ 0x1] HTTP error 403 Forbidden\n"
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from ..singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = 0
+        release = asyncio.Event()
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"id": "x"}
+
+        callers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flight.in_flight() == 1
+        release.set()
+        results = await asyncio.gather(*callers)
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert flight.stats()["leaders"] == 1
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["max_waiters"] == 4
+    assert flight.in_flight() == 0
+
+
+def test_exception_is_propagated_to_every_waiter():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == 42
+
+
+def test_followers_retry_with_their_own_call_when_errors_are_not_shared():
+    async def scenario():
+        flight = SingleFlight("test", share_errors=False)
+        calls = []
+
+        def work(selector):
+            async def run():
+                calls.append(selector)
+                await asyncio.sleep(0.01)
+                if selector == "bad":
+                    raise ValueError("Requested format is not available")
+                return selector
+
+            return run
+
+        leader = asyncio.ensure_future(flight.do("k", work("bad")))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do("k", work("good"))) for _ in range(3)]
+        results = await asyncio.gather(leader, *followers, return_exceptions=True)
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert isinstance(results[0], ValueError)
+    # The followers coalesced again behind one retry of their own call
+    assert results[1:] == ["good"] * 3
+    assert calls == ["bad", "good"]
+    assert flight.stats()["retried"] == 3 and flight.in_flight() == 0
@@ -0,0 +1,117 @@
+import logging
+
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from ..tracing import OpenTelemetryExporter, Trace, TracingMiddleware, current_trace, record, span
+
+
+def _app(exporter=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/work")
+    async def work():
+        with span("extract", "cache"):
+            pass
+        record("bcrypt", 0.25)
+        return Response("ok", headers={"Server-Timing": "db;dur=1.0"})
+
+    @app.get("/api/stream")
+    async def stream():
+        async def body():
+            with span("late"):
+                yield b"a"
+            yield b"b"
+
+        return StreamingResponse(body())
+
+    @app.get("/static")
+    async def static():
+        return {"traced": current_trace.get() is not None}
+
+    app.add_middleware(TracingMiddleware, exporter=exporter)
+    return app
+
+
+def test_span_is_a_noop_without_a_trace():
+    assert current_trace.get() is None
+    with span("anything"):
+        pass
+    assert record("bcrypt", 0.1) is False
+
+
+def test_server_timing_request_id_and_log_record(caplog):
+    client = TestClient(_app())
+    with caplog.at_level(logging.INFO, logger="server.tracing"):
+        r = client.get("/api/work", headers={"X-Request-ID": "abc-123"})
+    assert r.status_code == 200
+    timing = r.headers["Server-Timing"]
+    # Headers set by the endpoint are kept next to the recorded spans
+    assert timing.startswith("db;dur=1.0, extract;dur=")
+    assert 'desc="cache"' in timing and "bcrypt;dur=250.0" in timing and "app;dur=" in timing
+    assert r.headers["X-Request-ID"] == "abc-123"
+    log = caplog.records[-1]
+    assert log.request_id == "abc-123" and log.http_status == 200 and log.completed
+    assert [s["name"] for s in log.spans] == ["extract", "bcrypt"]
+
+    # Unusable ids are replaced; untraced paths are left alone
+    r = client.get("/api/work", headers={"X-Request-ID": "bad id!"})
+    assert len(r.headers["X-Request-ID"]) == 32
+    r = client.get("/static")
+    assert r.json() == {"traced": False} and "X-Request-ID" not in r.headers
+
+
+def test_spans_after_the_headers_are_only_logged(caplog):
+    client = TestClient(_app())
+    with caplog.at_level(logging.INFO, logger="server.tracing"):
+        r = client.get("/api/stream")
+    assert r.content == b"ab"
+    assert "late" not in r.headers["Server-Timing"]
+    assert [s["name"] for s in caplog.records[-1].spans] == ["late"]
+
+
+class _FakeSpan:
+    def __init__(self, spans, name, kwargs):
+        self.name = name
+        self.kwargs = kwargs
+        self.attributes = dict(kwargs.get("attributes") or {})
+        self.end_time = None
+        spans.append(self)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+
+
+class _FakeOtel:
+    def __init__(self):
+        self.spans = []
+
+    def get_tracer(self, name):
+        return self
+
+    def start_span(self, name, **kwargs):
+        return _FakeSpan(self.spans, name, kwargs)
+
+    def set_span_in_context(self, parent):
+        return ("context", parent)
+
+
+def test_traces_are_replayed_as_opentelemetry_spans():
+    otel = _FakeOtel()
+    client = TestClient(_app(OpenTelemetryExporter(otel)))
+    assert client.get("/api/work").status_code == 200
+    root, extract, bcrypt = otel.spans
+    assert root.name == "GET /api/work" and root.attributes["http.response.status_code"] == 200
+    assert extract.kwargs["context"] == ("context", root) and extract.attributes["aoi.desc"] == "cache"
+    assert abs(bcrypt.end_time - bcrypt.kwargs["start_time"] - 250_000_000) < 1000
+    assert root.kwargs["start_time"] <= extract.kwargs["start_time"] <= extract.end_time <= root.end_time
+
+
+def test_trace_formats_server_timing_descriptions():
+    trace = Trace("id")
+    trace.add("extract", 0.0123, 'yt"dlp')
+    assert trace.server_timing() == 'extract;dur=12.3;desc="ytdlp"'
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from ..media_cache import DiskCache
+from ..transcode_cache import TranscodeCache, TranscodeFailed
+
+
+class FakeStream:
+    def __init__(self):
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+    async def read(self, n: int = -1) -> bytes:
+        return await self.queue.get()
+
+
+class FakeProc:
+    def __init__(self, exit_code: int = 0):
+        self.stdout = FakeStream()
+        self.stderr = FakeStream()
+        self.returncode = None
+        self.exit_code = exit_code
+        self.killed = False
+
+    def feed(self, data: bytes) -> None:
+        self.stdout.queue.put_nowait(data)
+
+    def finish(self, stderr: bytes = b"") -> None:
+        self.stdout.queue.put_nowait(b"")
+        self.stderr.queue.put_nowait(stderr)
+
+    def kill(self):
+        self.killed = True
+        self.returncode = -9
+
+    async def wait(self):
+        if self.returncode is None:
+            self.returncode = self.exit_code
+        return self.returncode
+
+
+async def _collect(body, out: list) -> None:
+    async for chunk in body:
+        out.append(chunk)
+
+
+def test_concurrent_readers_tail_a_single_encode(tmp_path):
+    async def scenario():
+        cache = TranscodeCache(DiskCache(str(tmp_path), max_bytes=10 ** 6))
+        proc = FakeProc()
+        job = await cache.start("mp3:a", proc, {"filename": "a.mp3"})
+        assert job is not None
+        # Same key cannot start a second encoder
+        assert await cache.start("mp3:a", FakeProc()) is None
+
+        first: list = []
+        reader1 = asyncio.ensure_future(_collect(job.tail(), first))
+        proc.feed(b"A" * 70000)
+        await asyncio.sleep(0.05)
+        tailing = cache.running("mp3:a")
+        assert tailing is job
+        second: list = []
+        reader2 = asyncio.ensure_future(_collect(tailing.tail(), second))
+        proc.feed(b"B" * 100)
+        proc.finish()
+        await asyncio.gather(reader1, reader2)
+
+        expected = b"A" * 70000 + b"B" * 100
+        assert b"".join(first) == expected
+        assert b"".join(second) == expected
+        entry = await cache.lookup("mp3:a")
+        assert entry is not None and entry.size == len(expected)
+        entry.file.close()
+        assert entry.meta["filename"] == "a.mp3"
+        assert cache.running("mp3:a") is None
+        assert cache.stats()["completed"] == 1 and cache.stats()["tailed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_encode_is_not_cached(tmp_path):
+    async def scenario():
+        cache = TranscodeCache(DiskCache(str(tmp_path), max_bytes=10 ** 6))
+        proc = FakeProc(exit_code=1)
+        job = await cache.start("mp3:b", proc)
+        proc.feed(b"partial")
+        proc.finish(b"Invalid data found when processing input")
+        with pytest.raises(TranscodeFailed, match="Invalid data"):
+            await _collect(job.tail(), [])
+        assert await cache.lookup("mp3:b") is None
+        assert cache.stats()["failed"] == 1
+        assert list(tmp_path.iterdir()) == []
+
+    asyncio.run(scenario())
+
+
+def test_last_reader_leaving_stops_the_encoder(tmp_path):
+    async def scenario():
+        cache = TranscodeCache(DiskCache(str(tmp_path), max_bytes=10 ** 6))
+        proc = FakeProc()
+        job = await cache.start("mp3:c", proc)
+        proc.feed(b"x" * 70000)
+        body = job.tail()
+        assert await body.__anext__()
+        await body.aclose()
+        await asyncio.sleep(0.05)
+        assert proc.killed
+        assert job.finished and await cache.lookup("mp3:c") is None
+        assert cache.running("mp3:c") is None
+
+    asyncio.run(scenario())
+
+
+def test_reader_created_before_the_last_one_leaves_keeps_the_encode(tmp_path):
+    async def scenario():
+        cache = TranscodeCache(DiskCache(str(tmp_path), max_bytes=10 ** 6))
+        proc = FakeProc()
+        job = await cache.start("mp3:d", proc)
+        proc.feed(b"x" * 70000)
+        first = job.tail()
+        assert await first.__anext__()
+        # A TAIL response is created, then the first client disconnects
+        # before the second response sends its first byte
+        second = cache.running("mp3:d").tail()
+        await first.aclose()
+        await asyncio.sleep(0.05)
+        assert not proc.killed and not job.finished
+        proc.feed(b"y" * 10)
+        proc.finish()
+        out: list = []
+        await _collect(second, out)
+        assert b"".join(out) == b"x" * 70000 + b"y" * 10
+        entry = await cache.lookup("mp3:d")
+        assert entry is not None and entry.size == 70010
+        entry.file.close()
+
+    asyncio.run(scenario())
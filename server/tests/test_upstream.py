@@ -0,0 +1,128 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+
+from ..upstream import SegmentError, UpstreamClients, iter_segmented, upstream_byte_span
+
+BODY = bytes(range(256)) * 4096  # 1 MiB
+
+
+def _ranged_handler(body: bytes, state: dict):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] = state.get("active", 0) + 1
+        state["max_active"] = max(state.get("max_active", 0), state["active"])
+        try:
+            await asyncio.sleep(0.001)
+            m = re.match(r"bytes=(\d+)-(\d+)", request.headers.get("Range", ""))
+            if not m:
+                return httpx.Response(200, content=body, headers={"Accept-Ranges": "bytes"})
+            a, b = int(m.group(1)), min(int(m.group(2)), len(body) - 1)
+            state.setdefault("ranges", []).append((a, b))
+            return httpx.Response(
+                206,
+                content=body[a:b + 1],
+                headers={"Content-Range": f"bytes {a}-{b}/{len(body)}"},
+            )
+        finally:
+            state["active"] -= 1
+
+    return handler
+
+
+def test_upstream_byte_span():
+    assert upstream_byte_span(206, {"Content-Range": "bytes 10-19/100"}) == (10, 19, 100)
+    assert upstream_byte_span(206, {"Content-Range": "bytes 10-19/*"}) is None
+    assert upstream_byte_span(200, {"Content-Length": "100"}) == (0, 99, 100)
+    assert upstream_byte_span(200, {}) is None
+    assert upstream_byte_span(403, {"Content-Length": "100"}) is None
+
+
+def test_iter_segmented_reassembles_in_order_with_bounded_concurrency():
+    state: dict = {}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_ranged_handler(BODY, state))) as client:
+            out = bytearray()
+            async for chunk in iter_segmented(
+                client, "https://cdn.example.com/v.mp4", {"Range": "bytes=0-"}, 100, len(BODY) - 1,
+                segment_size=64 * 1024, concurrency=3,
+            ):
+                out += chunk
+            return bytes(out)
+
+    assert asyncio.run(scenario()) == BODY[100:]
+    assert state["max_active"] <= 3
+    assert len(state["ranges"]) == -(-(len(BODY) - 100) // (64 * 1024))
+
+
+def test_iter_segmented_fails_when_ranges_are_ignored():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=BODY)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            async for _ in iter_segmented(client, "https://cdn.example.com/v", {}, 0, len(BODY) - 1,
+                                          segment_size=64 * 1024, retries=0):
+                pass
+
+    with pytest.raises(SegmentError):
+        asyncio.run(scenario())
+
+
+def test_upstream_clients_use_injected_transport():
+    state: dict = {}
+    clients = UpstreamClients(transport=httpx.MockTransport(_ranged_handler(BODY, state)))
+
+    async def scenario():
+        try:
+            resp = await clients.get("media").get("https://cdn.example.com/v", headers={"Range": "bytes=0-9"})
+            return resp.status_code, resp.content
+        finally:
+            await clients.aclose()
+
+    assert asyncio.run(scenario()) == (206, BODY[:10])
+    assert clients.stats()["clients"] == {}
+
+
+def test_upstream_stats_count_hosts_and_survive_pool_changes(monkeypatch):
+    import server.upstream as upstream
+
+    clients = UpstreamClients(transport=httpx.MockTransport(_ranged_handler(BODY, {})))
+
+    async def scenario():
+        client = clients.get("media")
+        await client.get("https://cdn.example.com/v")
+        await client.get("https://cdn.example.com/v")
+        await client.get("https://other.example.com/v")
+
+    asyncio.run(scenario())
+    media = clients.stats()["clients"]["media"]
+    assert media["requests_by_host"] == {"cdn.example.com": 2, "other.example.com": 1}
+    # A mock transport has no httpcore pool: the pool details are left out
+    assert "hosts" not in media and media["requests"] == 1
+    monkeypatch.setattr(upstream, "_pool_snapshot", lambda client: ({"cdn.example.com": {"connections": 1}}, 0))
+    assert clients.stats()["clients"]["media"]["connections"] == 1
+    asyncio.run(clients.aclose())
+
+
+def test_upstream_clients_do_not_keep_cookies_between_requests():
+    seen = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("Cookie"))
+        return httpx.Response(200, headers={"Set-Cookie": "session=alice; Path=/"}, content=b"ok")
+
+    clients = UpstreamClients(transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        try:
+            client = clients.get("media")
+            await client.get("https://cdn.example.com/a", headers={"Cookie": "mine=1"})
+            await client.get("https://cdn.example.com/b")
+        finally:
+            await clients.aclose()
+
+    asyncio.run(scenario())
+    assert seen == ["mine=1", None]
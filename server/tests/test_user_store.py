@@ -0,0 +1,111 @@
+import json
+import threading
+
+import pytest
+
+from ..user_store import EmailAlreadyRegistered, UserStore
+
+
+def test_create_lookup_and_delete(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    user = store.create("u1", "a@b.com", "hash")
+    assert user == {"id": "u1", "email": "a@b.com", "password_hash": "hash", "guest": False}
+    assert store.get_by_id("u1")["email"] == "a@b.com"
+    assert store.get_by_email("a@b.com")["id"] == "u1"
+    with pytest.raises(EmailAlreadyRegistered):
+        store.create("u2", "a@b.com", "other")
+    assert store.update_password_hash("u1", "rehashed") is True
+    assert store.get_by_email("a@b.com")["password_hash"] == "rehashed"
+    assert store.delete("u1") is True
+    assert store.delete("u1") is False
+    assert store.get_by_id("u1") is None and store.count() == 0
+
+
+def test_legacy_json_is_migrated_once(tmp_path):
+    legacy = tmp_path / "users.json"
+    legacy.write_text(json.dumps({"users": [
+        {"id": "u1", "email": "a@b.com", "password_hash": "h1", "guest": False},
+        {"id": "g1", "email": None, "guest": True},
+        {"id": "u2", "email": "c@d.com", "password_hash": "h2"},
+    ]}))
+    db_path = str(tmp_path / "users.db")
+    store = UserStore(db_path, legacy_json_path=str(legacy))
+    assert store.count() == 2
+    assert store.get_by_email("c@d.com")["password_hash"] == "h2"
+    assert not legacy.exists() and (tmp_path / "users.json.migrated").exists()
+
+    # A stale copy reappearing is not imported again
+    legacy.write_text(json.dumps({"users": [{"id": "u3", "email": "e@f.com", "password_hash": "h3"}]}))
+    store.delete("u1")
+    reopened = UserStore(db_path, legacy_json_path=str(legacy))
+    assert reopened.count() == 1 and reopened.get_by_email("e@f.com") is None
+
+
+def test_connections_are_per_thread_and_share_the_database(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    errors = []
+
+    def signup(i: int):
+        try:
+            store.create(f"u{i}", f"user{i}@example.com", "h")
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=signup, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    other = UserStore(str(tmp_path / "users.db"))
+    assert other.count() == 8
+    store.close()
+    other.close()
+
+
+def test_cached_user_is_dropped_on_local_and_foreign_writes(tmp_path):
+    db_path = str(tmp_path / "users.db")
+    store = UserStore(db_path, cache_ttl=60, signature_interval=0)
+    store.create("u1", "a@b.com", "h")
+    store.create("u2", "c@d.com", "h")
+    assert store.cached_user("u1") == (False, None)
+    store.get_by_id("u1")
+    assert store.cached_user("u1")[0] is True
+    store.delete("u1")
+    assert store.cached_user("u1") == (False, None)
+    assert store.get_by_id("u1") is None
+
+    # A write by another process (here: another store on the same file)
+    store.get_by_id("u2")
+    assert store.cached_user("u2")[0] is True
+    UserStore(db_path).delete("u2")
+    assert store.cached_user("u2") == (False, None)
+    assert store.cache_stats()["hits"] == 2
+
+
+def test_database_files_are_checked_at_most_once_per_interval(monkeypatch, tmp_path):
+    store = UserStore(str(tmp_path / "users.db"), cache_ttl=60, signature_interval=1.0)
+    store.create("u1", "a@b.com", "h")
+    store.get_by_id("u1")
+    checks = []
+    real_signature = store._file_signature
+    monkeypatch.setattr(store, "_file_signature", lambda: checks.append(1) or real_signature())
+
+    # get_by_id just checked the files
+    for _ in range(5):
+        assert store.cached_user("u1")[0] is True
+    assert checks == []
+    # Another worker deletes the user; noticed once the interval has passed
+    UserStore(str(tmp_path / "users.db")).delete("u1")
+    assert store.cached_user("u1")[0] is True
+    store._signature_due -= 1.0  # the interval has passed
+    assert store.cached_user("u1") == (False, None)
+    assert len(checks) == 1
+    store.close()
+
+
+def test_cache_can_be_disabled(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"), cache_ttl=0)
+    store.create("u1", "a@b.com", "h")
+    store.get_by_id("u1")
+    assert store.cached_user("u1") == (False, None)
@@ -0,0 +1,27 @@
+import asyncio
+
+from ..warmup import Warmup
+
+
+def test_steps_are_timed_and_failures_do_not_block_readiness():
+    calls = []
+    warmup = Warmup(import_seconds=0.5)
+    warmup.add("blocking", lambda: calls.append("blocking"))
+
+    async def async_step():
+        calls.append("async")
+
+    def broken():
+        raise RuntimeError("boom")
+
+    warmup.add("async", async_step, blocking=False)
+    warmup.add("broken", broken)
+    assert warmup.report()["status"] == "warming"
+
+    asyncio.run(warmup.run())
+    report = warmup.report()
+    assert calls == ["blocking", "async"]
+    assert report["status"] == "ready" and report["import_seconds"] == 0.5
+    assert [s["step"] for s in report["steps"]] == ["blocking", "async", "broken"]
+    assert report["steps"][2]["error"] == "RuntimeError: boom"
+    assert all(s["seconds"] >= 0 for s in report["steps"])
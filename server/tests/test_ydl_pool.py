@@ -0,0 +1,109 @@
+import pytest
+
+from ..cookie_jar import SharedCookies
+from ..ydl_pool import YoutubeDLPool, options_fingerprint
+
+
+class FakeYDL:
+    built = 0
+
+    def __init__(self, opts):
+        FakeYDL.built += 1
+        self.params = opts
+        self.closed = False
+        self._num_downloads = 0
+        self._printed_messages = set()
+        from http.cookiejar import CookieJar
+
+        self.cookiejar = CookieJar()
+
+    def build_format_selector(self, spec):
+        if spec.startswith("["):
+            raise SyntaxError(spec)
+        return ("selector", spec)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def _reset_counter():
+    FakeYDL.built = 0
+
+
+def test_fingerprint_ignores_key_order():
+    assert options_fingerprint({"a": 1, "b": {"x": 2}}) == options_fingerprint({"b": {"x": 2}, "a": 1})
+    assert options_fingerprint({"proxy": "a"}) != options_fingerprint({"proxy": "b"})
+    # Applied on checkout instead
+    assert options_fingerprint({"proxy": "a", "format": "best"}) == options_fingerprint({"proxy": "a"})
+
+
+def test_instances_are_reused_per_fingerprint_and_reset():
+    pool = YoutubeDLPool(FakeYDL)
+    with pool.checkout({"proxy": "a", "format": "best"}) as first:
+        first._num_downloads = 3
+        first._printed_messages.add("warning")
+        first.params["logger"] = "per-call logger"
+    with pool.checkout({"proxy": "a", "format": "bestaudio"}) as second:
+        assert second is first
+        assert second._num_downloads == 0 and not second._printed_messages
+        assert "logger" not in second.params
+        assert second.params["format"] == "bestaudio" and second.format_selector == ("selector", "bestaudio")
+    with pool.checkout({"proxy": "b", "format": "bestaudio"}) as other:
+        assert other is not first
+    stats = pool.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2 and FakeYDL.built == 2
+    assert stats["build_seconds_saved"] >= 0 and stats["idle"] == 2
+
+
+def test_failed_or_worn_instances_are_retired():
+    pool = YoutubeDLPool(FakeYDL, max_uses=2)
+    with pytest.raises(RuntimeError):
+        with pool.checkout({}) as broken:
+            raise RuntimeError("extractor exploded")
+    assert broken.closed is True
+    with pool.checkout({}) as a:
+        pass
+    with pool.checkout({}) as b:
+        assert b is a
+    assert a.closed is True  # second use reached max_uses
+    assert pool.stats()["retired"] == 2 and pool.stats()["idle"] == 0
+
+
+def test_idle_instances_are_bounded():
+    pool = YoutubeDLPool(FakeYDL, max_idle_per_key=1, max_idle=2)
+    held = []
+    for proxy in ("a", "b", "c"):
+        with pool.checkout({"proxy": proxy}) as ydl:
+            held.append(ydl)
+    assert pool.stats()["idle"] == 2
+    assert held[0].closed is True and not held[2].closed
+    pool.clear()
+    assert all(ydl.closed for ydl in held)
+
+
+def test_reused_instance_gets_fresh_copy_of_shared_cookies(tmp_path):
+    path = tmp_path / "cookies.txt"
+    path.write_text("# Netscape HTTP Cookie File\n.example.com\tTRUE\t/\tFALSE\t0\tsid\tone\n")
+    shared = SharedCookies(lambda: [str(path)], check_interval=60)
+    pool = YoutubeDLPool(FakeYDL, shared_cookies=shared)
+    opts = {"cookiefile": str(path)}
+    with pool.checkout(opts) as ydl:
+        assert "cookiefile" not in ydl.params
+        jar = ydl.cookiejar
+        assert [c.value for c in jar] == ["one"]
+        next(iter(jar)).value = "mutated"
+    with pool.checkout(opts) as again:
+        assert again.cookiejar is jar
+        assert [c.value for c in jar] == ["one"]
+
+
+def test_invalid_format_selector_retires_the_instance():
+    pool = YoutubeDLPool(FakeYDL)
+    with pool.checkout({"format": "best"}) as ydl:
+        pass
+    with pytest.raises(SyntaxError):
+        with pool.checkout({"format": "[broken"}):
+            pass
+    assert ydl.closed is True
+    assert pool.stats()["idle"] == 0 and pool.stats()["retired"] == 1
@@ -0,0 +1,246 @@
+"""Per-request phase timing.
+
+:class:`TracingMiddleware` starts a :class:`Trace` for every API request and
+keeps it in :data:`current_trace`. Endpoint code wraps its phases in
+``with span("extract"):``; the finished spans are sent back as a
+``Server-Timing`` header (those that ended before the response headers went
+out), logged as one structured record carrying the request id when the
+response body is done, and optionally exported to OpenTelemetry.
+
+Without an active trace (tracing disabled, or code running outside a request)
+:func:`span` is a single context variable lookup returning a shared no-op.
+"""
+
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Accepted from clients and proxies as is; anything else gets a fresh id
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+class Span:
+    __slots__ = ("name", "start", "duration", "desc")
+
+    def __init__(self, name: str, start: float, duration: float, desc: Optional[str] = None):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.desc = desc
+
+    def as_dict(self) -> dict:
+        entry = {"name": self.name, "ms": round(self.duration * 1000, 1)}
+        if self.desc:
+            entry["desc"] = self.desc
+        return entry
+
+
+class Trace:
+    """Spans of one request; appended to from the loop and worker threads alike."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.started_ns = time.time_ns()
+        self.spans: List[Span] = []
+
+    def add(self, name: str, seconds: float, desc: Optional[str] = None, start: Optional[float] = None) -> None:
+        if start is None:
+            start = time.perf_counter() - seconds
+        self.spans.append(Span(name, start, seconds, desc))
+
+    def server_timing(self, spans: Optional[Sequence[Span]] = None) -> str:
+        parts = []
+        for s in self.spans if spans is None else spans:
+            part = f"{s.name};dur={s.duration * 1000:.1f}"
+            if s.desc:
+                part += ';desc="' + s.desc.replace("\\", "").replace('"', "") + '"'
+            parts.append(part)
+        return ", ".join(parts)
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("aoi_trace", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ("trace", "name", "desc", "start")
+
+    def __init__(self, trace: Trace, name: str, desc: Optional[str]):
+        self.trace = trace
+        self.name = name
+        self.desc = desc
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        desc = self.desc if exc_type is None else f"{self.desc or ''} {exc_type.__name__}".strip()
+        self.trace.add(self.name, time.perf_counter() - self.start, desc, self.start)
+
+
+def span(name: str, desc: Optional[str] = None):
+    """Time the enclosed block as ``name`` in the current request's trace."""
+    trace = current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _ActiveSpan(trace, name, desc)
+
+
+def record(name: str, seconds: float, desc: Optional[str] = None) -> bool:
+    """Add an already measured phase; False when no trace is active."""
+    trace = current_trace.get()
+    if trace is None:
+        return False
+    trace.add(name, seconds, desc)
+    return True
+
+
+class OpenTelemetryExporter:
+    """Replays finished traces as OpenTelemetry spans.
+
+    Only the ``opentelemetry-api`` package is used; where the spans go is up
+    to the SDK configured by the deployment (for example through
+    ``opentelemetry-instrument``). Spans are created after the request, so
+    the request path itself never calls into OpenTelemetry.
+    """
+
+    def __init__(self, otel_trace):
+        self._otel_trace = otel_trace
+        self._tracer = otel_trace.get_tracer("aoi.server")
+
+    def export(self, trace: Trace, method: str, path: str, status: int, ended: float) -> None:
+        def ns(at: float) -> int:
+            return trace.started_ns + int((at - trace.started) * 1e9)
+
+        root = self._tracer.start_span(
+            f"{method} {path}",
+            start_time=trace.started_ns,
+            attributes={
+                "http.request.method": method,
+                "url.path": path,
+                "http.response.status_code": status,
+                "aoi.request_id": trace.request_id,
+            },
+        )
+        context = self._otel_trace.set_span_in_context(root)
+        for s in trace.spans:
+            child = self._tracer.start_span(s.name, context=context, start_time=ns(s.start))
+            if s.desc:
+                child.set_attribute("aoi.desc", s.desc)
+            child.end(end_time=ns(s.start + s.duration))
+        root.end(end_time=ns(ended))
+
+
+def build_otel_exporter() -> Optional[OpenTelemetryExporter]:
+    """The exporter if ``opentelemetry-api`` is installed, else None."""
+    try:
+        from opentelemetry import trace as otel_trace  # type: ignore
+    except Exception:
+        logger.warning("OpenTelemetry export requested but opentelemetry-api is not installed")
+        return None
+    return OpenTelemetryExporter(otel_trace)
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware tracing requests whose path starts with one of ``prefixes``.
+
+    Streaming bodies pass through untouched; the trace is finished when the
+    last body chunk has been sent (or the request failed).
+    """
+
+    def __init__(self, app, prefixes: Sequence[str] = ("/api/",), exporter: Optional[OpenTelemetryExporter] = None):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers") or ():
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        trace = Trace(request_id)
+        token = current_trace.set(trace)
+        status = 500
+        headers_sent_at: Optional[float] = None
+        finished = False
+
+        async def send_traced(message) -> None:
+            nonlocal status, headers_sent_at, finished
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers_sent_at = time.perf_counter()
+                headers = [(k, v) for k, v in message.get("headers") or () if k.lower() != b"server-timing"]
+                timings = [v.decode("latin-1") for k, v in message.get("headers") or () if k.lower() == b"server-timing"]
+                spans = trace.server_timing()
+                if spans:
+                    timings.append(spans)
+                timings.append(f"app;dur={(headers_sent_at - trace.started) * 1000:.1f}")
+                headers.append((b"server-timing", ", ".join(timings).encode("latin-1")))
+                headers.append((REQUEST_ID_HEADER.lower().encode(), request_id.encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            current_trace.reset(token)
+            self._finish(trace, scope, status if headers_sent_at is not None else 500, headers_sent_at, finished)
+
+    def _finish(self, trace: Trace, scope, status: int, headers_sent_at: Optional[float], finished: bool) -> None:
+        ended = time.perf_counter()
+        method, path = scope["method"], scope["path"]
+        spans = [s.as_dict() for s in trace.spans]
+        logger.info(
+            "%s %s %d %.1fms request_id=%s %s",
+            method,
+            path,
+            status,
+            (ended - trace.started) * 1000,
+            trace.request_id,
+            " ".join(f"{s['name']}={s['ms']}ms" for s in spans),
+            extra={
+                "request_id": trace.request_id,
+                "http_method": method,
+                "http_path": path,
+                "http_status": status,
+                "duration_ms": round((ended - trace.started) * 1000, 1),
+                "ttfb_ms": round((headers_sent_at - trace.started) * 1000, 1) if headers_sent_at is not None else None,
+                "completed": finished,
+                "spans": spans,
+            },
+        )
+        if self.exporter is not None:
+            try:
+                self.exporter.export(trace, method, path, status, ended)
+            except Exception:
+                logger.debug("OpenTelemetry export failed", exc_info=True)
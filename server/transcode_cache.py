@@ -0,0 +1,205 @@
+"""Cache of transcoded output (MP3 conversions).
+
+Encoding is far more expensive than proxying, so finished outputs are kept in a
+:class:`~server.media_cache.DiskCache` and served with ``Content-Length`` and
+``Range`` support. While an encode is running its output is written straight
+to the entry's temporary file; concurrent requests for the same key tail that
+file instead of starting a second encoder.
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Optional
+
+import anyio
+
+from .media_cache import CacheEntry, CacheWriter, DiskCache
+
+logger = logging.getLogger(__name__)
+
+_TAIL_CHUNK = 256 * 1024
+_WRITE_CHUNK = 64 * 1024
+
+
+class TranscodeFailed(Exception):
+    """The encoder exited with an error while its output was being served."""
+
+
+class TranscodeJob:
+    """A running encoder whose stdout is written into a cache entry."""
+
+    def __init__(self, owner: "TranscodeCache", key: str, proc, writer: CacheWriter, on_exit=None):
+        self.owner = owner
+        self.on_exit = on_exit
+        self.key = key
+        self.proc = proc
+        self.writer = writer
+        self.meta = writer.meta
+        self.readers = 0
+        self.finished = False
+        self.error: Optional[str] = None
+        self._changed = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self) -> None:
+        proc = self.proc
+        ok = False
+        try:
+            assert proc.stdout is not None
+            while True:
+                chunk = await proc.stdout.read(_WRITE_CHUNK)
+                if not chunk:
+                    break
+                await self.writer.write(chunk)
+                if self.writer.done:
+                    raise TranscodeFailed("Transcoded output exceeds the cache entry limit")
+                self._notify()
+            returncode = await proc.wait()
+            if returncode != 0:
+                stderr = b""
+                if proc.stderr is not None:
+                    stderr = await proc.stderr.read()
+                raise TranscodeFailed(
+                    f"Encoder exited with status {returncode}: {stderr.decode('utf-8', 'replace').strip()[:200]}"
+                )
+            ok = await self.writer.commit()
+            if not ok:
+                raise TranscodeFailed("Failed to store transcoded output")
+        except asyncio.CancelledError:
+            self.error = "cancelled"
+            raise
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            logger.warning("Transcode %s failed: %s", self.key, self.error)
+        finally:
+            if not ok:
+                try:
+                    if proc.returncode is None:
+                        proc.kill()
+                except Exception:
+                    pass
+                with anyio.CancelScope(shield=True):
+                    try:
+                        await proc.wait()
+                    except Exception:
+                        pass
+                    await self.writer.abort()
+            self.finished = True
+            if self.on_exit is not None:
+                self.on_exit(proc.returncode)
+            self.owner._job_done(self, ok)
+            self._notify()
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._pump())
+
+    def tail(self) -> AsyncIterator[bytes]:
+        """Return an iterator over the whole output, following the encoder until it finishes.
+
+        The reader is counted from this call on, not from its first read, so a
+        response that was created but has not started sending yet keeps the
+        encode alive when every other reader leaves. (A response that is never
+        iterated leaves the encode to finish into the cache.)
+        """
+        self.readers += 1
+        return self._follow()
+
+    async def _follow(self) -> AsyncIterator[bytes]:
+        # The temporary file is opened once; the descriptor stays valid after
+        # the commit renames it into place (or an abort unlinks it)
+        position = 0
+        try:
+            try:
+                fh = await anyio.open_file(self.writer.temp_path, "rb")
+            except FileNotFoundError:
+                # Finished between lookup and the first read
+                if self.error is not None:
+                    raise TranscodeFailed(self.error)
+                fh = await anyio.open_file(self.writer.cache._data_path(self.writer.digest), "rb")
+            async with fh:
+                while True:
+                    changed = self._changed
+                    available = self.writer.flushed
+                    while position < available:
+                        chunk = await fh.read(min(_TAIL_CHUNK, available - position))
+                        if not chunk:
+                            break
+                        position += len(chunk)
+                        yield chunk
+                    if self.finished:
+                        if self.error is not None:
+                            raise TranscodeFailed(self.error)
+                        if position >= self.writer.written:
+                            return
+                        continue
+                    if position >= self.writer.flushed:
+                        await changed.wait()
+        finally:
+            self.readers -= 1
+            if self.readers <= 0 and not self.finished and self._task is not None:
+                # Nobody is listening any more; don't keep encoding into the cache
+                self._task.cancel()
+
+
+class TranscodeCache:
+    """Completed transcodes on disk plus the encodes currently running."""
+
+    def __init__(self, disk: DiskCache):
+        self.disk = disk
+        self._jobs: Dict[str, TranscodeJob] = {}
+        self.tailed = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def lookup(self, key: str) -> Optional[CacheEntry]:
+        return await self.disk.lookup(key)
+
+    def running(self, key: str) -> Optional[TranscodeJob]:
+        """Return the in-progress job for ``key`` (counted as a tailing reader)."""
+        job = self._jobs.get(key)
+        if job is not None and not job.finished:
+            self.tailed += 1
+            return job
+        return None
+
+    async def start(self, key: str, proc, meta: Optional[dict] = None, on_exit=None) -> Optional[TranscodeJob]:
+        """Capture ``proc``'s stdout into the cache; None if it cannot be cached.
+
+        ``on_exit`` is called with the encoder's return code once it is reaped.
+        """
+        if key in self._jobs:
+            return None
+        writer = self.disk.begin_fill(key, None, meta, flush_bytes=_WRITE_CHUNK)
+        if writer is None:
+            return None
+        try:
+            await writer.open()
+        except Exception as e:
+            logger.warning("Cannot create transcode cache file for %s: %s", key, e)
+            await writer.abort()
+            return None
+        job = TranscodeJob(self, key, proc, writer, on_exit)
+        self._jobs[key] = job
+        job.start()
+        return job
+
+    def _job_done(self, job: TranscodeJob, ok: bool) -> None:
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.disk.stats(),
+            "running": len(self._jobs),
+            "tailed": self.tailed,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
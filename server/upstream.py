@@ -0,0 +1,235 @@
+"""Shared upstream HTTP clients.
+
+Creating an ``httpx.AsyncClient`` per request throws its connection pool away
+when the body ends, paying a fresh TLS (and HTTP/2) handshake to the CDN on
+every download. Clients here live for the whole application: httpcore keeps
+keep-alive connections per origin, so repeated downloads from the same CDN host
+reuse warm connections.
+"""
+
+import asyncio
+import re
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from collections import defaultdict, deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+import httpx
+
+_CONTENT_RANGE_RE = re.compile(r"^\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$", re.IGNORECASE)
+
+# Client profiles: media streams have no read timeout, subtitles are small
+_PROFILES = {
+    "media": {"read": None, "http2": True},
+    "subtitle": {"read": 30.0, "http2": True},
+}
+
+
+class UpstreamClients:
+    """Lazily created, application-wide ``httpx.AsyncClient`` instances."""
+
+    def __init__(
+        self,
+        max_connections: int = 200,
+        max_keepalive_connections: int = 50,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 15.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.connect_timeout = connect_timeout
+        self._transport = transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.requests: Dict[str, int] = defaultdict(int)
+        # Counted by our own request hook, independent of httpcore internals
+        self.host_requests: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def get(self, profile: str = "media") -> httpx.AsyncClient:
+        client = self._client(profile)
+        self.requests[profile] += 1
+        return client
+
+    def warm(self) -> None:
+        """Create every profile's client ahead of the first request."""
+        for profile in _PROFILES:
+            self._client(profile)
+
+    def _client(self, profile: str) -> httpx.AsyncClient:
+        client = self._clients.get(profile)
+        if client is None:
+            settings = _PROFILES.get(profile, _PROFILES["media"])
+            client = httpx.AsyncClient(
+                follow_redirects=True,
+                # Shared by every user: never keep upstream Set-Cookie values,
+                # cookies are only sent via each request's own Cookie header
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+                timeout=httpx.Timeout(connect=self.connect_timeout, read=settings["read"], write=30.0, pool=None),
+                http2=settings["http2"],
+                limits=self.limits,
+                event_hooks={"request": [self._request_hook(profile)]},
+                **({"transport": self._transport} if self._transport is not None else {}),
+            )
+            self._clients[profile] = client
+        return client
+
+    def _request_hook(self, profile: str):
+        counts = self.host_requests[profile]
+
+        async def count(request: httpx.Request) -> None:
+            counts[request.url.host] += 1
+
+        return count
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        """Report requests per host and, where available, each pool's connection occupancy."""
+        result: dict = {
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry,
+            },
+            "clients": {},
+        }
+        for profile, client in self._clients.items():
+            entry = {
+                "requests": self.requests.get(profile, 0),
+                "requests_by_host": dict(self.host_requests.get(profile) or {}),
+            }
+            snapshot = _pool_snapshot(client)
+            if snapshot is not None:
+                hosts, queued = snapshot
+                entry.update(
+                    connections=sum(h["connections"] for h in hosts.values()),
+                    queued_requests=queued,
+                    hosts=hosts,
+                )
+            result["clients"][profile] = entry
+        return result
+
+
+def _pool_snapshot(client: httpx.AsyncClient) -> Optional[Tuple[Dict[str, dict], int]]:
+    """Per-host connections and queued requests read from httpcore's pool.
+
+    These are private attributes; if an httpx/httpcore upgrade changes them,
+    this returns None and the stats simply leave the pool details out.
+    """
+    try:
+        pool = client._transport._pool  # type: ignore[attr-defined]
+        hosts: Dict[str, dict] = {}
+        for conn in list(pool.connections):
+            host = conn._origin.host
+            host = host.decode("ascii", "replace") if isinstance(host, bytes) else str(host)
+            entry = hosts.setdefault(host, {"connections": 0, "idle": 0, "active": 0})
+            entry["connections"] += 1
+            entry["idle" if conn.is_idle() else "active"] += 1
+        queued = sum(1 for pool_request in list(pool._requests) if pool_request.is_queued())
+        return hosts, queued
+    except Exception:
+        return None
+
+
+def upstream_byte_span(status_code: int, headers) -> Optional[Tuple[int, int, int]]:
+    """Return ``(start, end, total)`` of an upstream body, or None if unknown."""
+    if status_code == 206:
+        m = _CONTENT_RANGE_RE.match(headers.get("Content-Range") or "")
+        if not m or m.group(3) == "*":
+            return None
+        return int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if status_code == 200:
+        try:
+            length = int(headers.get("Content-Length") or "")
+        except ValueError:
+            return None
+        if length <= 0:
+            return None
+        return 0, length - 1, length
+    return None
+
+
+class SegmentError(Exception):
+    """A ranged segment request did not return the expected bytes."""
+
+
+async def _fetch_segment(
+    client: httpx.AsyncClient, url: str, headers: dict, start: int, end: int, retries: int
+) -> bytes:
+    expected = end - start + 1
+    segment_headers = {k: v for k, v in headers.items() if k.lower() != "range"}
+    segment_headers["Range"] = f"bytes={start}-{end}"
+    for attempt in range(retries + 1):
+        try:
+            resp = await client.send(client.build_request("GET", url, headers=segment_headers), stream=True)
+            try:
+                if resp.status_code != 206:
+                    raise SegmentError(f"Upstream answered {resp.status_code} to a range request")
+                buf = bytearray()
+                async for chunk in resp.aiter_bytes(chunk_size=64 * 1024):
+                    buf += chunk
+                    if len(buf) > expected:
+                        raise SegmentError("Upstream segment longer than requested")
+            finally:
+                await resp.aclose()
+            if len(buf) != expected:
+                raise SegmentError(f"Short segment: got {len(buf)} of {expected} bytes")
+            return bytes(buf)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if attempt >= retries:
+                raise
+            await asyncio.sleep(0.25 * (attempt + 1))
+    raise SegmentError("unreachable")
+
+
+async def iter_segmented(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict,
+    start: int,
+    end: int,
+    segment_size: int = 4 * 1024 * 1024,
+    concurrency: int = 4,
+    retries: int = 2,
+    chunk_size: int = 64 * 1024,
+) -> AsyncIterator[bytes]:
+    """Fetch ``[start, end]`` as concurrent Range requests and yield it in order.
+
+    At most ``concurrency`` segments are in flight while the current one is
+    being yielded, so buffered memory stays below
+    ``(concurrency + 1) * segment_size`` regardless of the body size.
+    """
+    segment_size = max(64 * 1024, int(segment_size))
+    concurrency = max(1, int(concurrency))
+    ranges = ((a, min(a + segment_size - 1, end)) for a in range(start, end + 1, segment_size))
+    in_flight: Deque["asyncio.Task[bytes]"] = deque()
+
+    def _schedule_next() -> None:
+        nxt = next(ranges, None)
+        if nxt is not None:
+            in_flight.append(asyncio.ensure_future(_fetch_segment(client, url, headers, nxt[0], nxt[1], retries)))
+
+    try:
+        for _ in range(concurrency):
+            _schedule_next()
+        while in_flight:
+            data = await in_flight.popleft()
+            _schedule_next()
+            view = memoryview(data)
+            for offset in range(0, len(view), chunk_size):
+                yield bytes(view[offset:offset + chunk_size])
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
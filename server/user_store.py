@@ -0,0 +1,244 @@
+"""SQLite-backed store of registered users.
+
+Lookups by id and by email use indexes and writes touch a single row, so auth
+requests no longer parse and rewrite a JSON file under a global lock. The
+database runs in WAL mode with a busy timeout, which lets several uvicorn
+worker processes share it; the UNIQUE constraint on ``email`` keeps concurrent
+signups for the same address consistent across processes.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class EmailAlreadyRegistered(Exception):
+    pass
+
+
+def _row_to_user(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    if row is None:
+        return None
+    return {"id": row["id"], "email": row["email"], "password_hash": row["password_hash"], "guest": False}
+
+
+class UserStore:
+    """Registered users in a SQLite database at ``path``.
+
+    Each thread uses its own connection. When ``legacy_json_path`` points at
+    an existing ``users.json`` it is imported once and renamed to
+    ``users.json.migrated``.
+
+    Users loaded by id are also kept in memory for ``cache_ttl`` seconds. The
+    cache is dropped whenever this process writes, or when the database or
+    its WAL file changes on disk (another worker wrote). The files are
+    checked at most every ``signature_interval`` seconds, so a deletion by
+    another worker is visible here within that interval.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_json_path: Optional[str] = None,
+        busy_timeout: float = 10.0,
+        cache_ttl: float = 30.0,
+        cache_max_entries: int = 10_000,
+        signature_interval: float = 1.0,
+    ):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cache_ttl = float(cache_ttl)
+        self.cache_max_entries = max(1, int(cache_max_entries))
+        self.signature_interval = max(0.0, float(signature_interval))
+        self._cache: Dict[str, Tuple[float, dict]] = {}
+        self._cache_signature: Optional[tuple] = None
+        self._signature_due = 0.0
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; multi-statement writes use explicit transactions
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _migrate_json(self, json_path: str) -> None:
+        if not os.path.exists(json_path):
+            return
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so only one process imports
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT value FROM store_meta WHERE key = 'migrated_json'").fetchone()
+            if done is not None:
+                conn.execute("COMMIT")
+                return
+            try:
+                with open(json_path, "r", encoding="utf-8") as fh:
+                    payload = json.load(fh) or {}
+            except Exception as e:
+                logger.warning("Cannot read legacy user file %s: %s", json_path, e)
+                payload = {}
+            imported = 0
+            now = time.time()
+            for user in payload.get("users", []) or []:
+                if user.get("guest") or not user.get("id") or not user.get("email"):
+                    continue
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO users (id, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                    (user["id"], user["email"], user.get("password_hash") or "", now),
+                )
+                imported += cur.rowcount
+            conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('migrated_json', ?)", (json.dumps({"at": now}),)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Imported %d users from %s", imported, json_path)
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError:
+            pass
+
+    def _file_signature(self) -> tuple:
+        signature = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _check_signature_locked(self, signature: tuple) -> None:
+        self._signature_due = time.monotonic() + self.signature_interval
+        if signature != self._cache_signature:
+            self._cache.clear()
+            self._cache_signature = signature
+
+    def cached_user(self, user_id: str) -> Tuple[bool, Optional[dict]]:
+        """Return ``(True, user)`` from memory without touching SQLite, else ``(False, None)``.
+
+        Called on the event loop: the database files are only stat'ed when the
+        last check is ``signature_interval`` seconds old.
+        """
+        if self.cache_ttl <= 0:
+            return False, None
+        now = time.monotonic()
+        signature = self._file_signature() if now >= self._signature_due else None
+        with self._cache_lock:
+            if signature is not None:
+                self._check_signature_locked(signature)
+            entry = self._cache.get(user_id)
+            if entry is None or entry[0] < now:
+                self.cache_misses += 1
+                return False, None
+            self.cache_hits += 1
+            return True, entry[1]
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        with self._cache_lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+    def get_by_id(self, user_id: str) -> Optional[dict]:
+        # Captured before the query: a write that lands afterwards changes the
+        # signature and discards whatever we store below
+        signature = self._file_signature() if self.cache_ttl > 0 else None
+        row = self._conn().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        user = _row_to_user(row)
+        if user is not None and signature is not None:
+            with self._cache_lock:
+                if signature == self._file_signature():
+                    self._check_signature_locked(signature)
+                    while len(self._cache) >= self.cache_max_entries:
+                        self._cache.pop(next(iter(self._cache)))
+                    self._cache[user_id] = (time.monotonic() + self.cache_ttl, user)
+        return user
+
+    def get_by_email(self, email: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        return _row_to_user(row)
+
+    def create(self, user_id: str, email: str, password_hash: str) -> dict:
+        try:
+            self._conn().execute(
+                "INSERT INTO users (id, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, email, password_hash, time.time()),
+            )
+        except sqlite3.IntegrityError:
+            raise EmailAlreadyRegistered(email)
+        return {"id": user_id, "email": email, "password_hash": password_hash, "guest": False}
+
+    def update_password_hash(self, user_id: str, password_hash: str) -> bool:
+        cur = self._conn().execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+        self.invalidate(user_id)
+        return cur.rowcount > 0
+
+    def delete(self, user_id: str) -> bool:
+        self.invalidate(user_id)
+        cur = self._conn().execute("DELETE FROM users WHERE id = ?", (user_id,))
+        self.invalidate(user_id)
+        return cur.rowcount > 0
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "ttl_seconds": self.cache_ttl,
+            }
+
+    def count(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0])
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
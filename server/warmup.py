@@ -0,0 +1,72 @@
+"""Startup warm-up steps and readiness state.
+
+The first request after a deploy otherwise pays for importing yt-dlp's
+extractors, parsing the cookie file, opening the user database and creating
+HTTP clients. :class:`Warmup` runs these steps once in the background during
+the application lifespan, times each of them, and reports readiness so a
+load balancer only routes traffic to an instance once it is warm.
+"""
+
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Named steps run in order; blocking steps run on a worker thread."""
+
+    def __init__(self, import_seconds: Optional[float] = None):
+        self._steps: List[Tuple[str, Callable, bool]] = []
+        self.import_seconds = import_seconds
+        self.timings: List[dict] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.ready = False
+
+    def add(self, name: str, fn: Callable, blocking: bool = True) -> None:
+        """Register ``fn``: a plain callable (run in a thread if ``blocking``) or a coroutine function."""
+        self._steps.append((name, fn, blocking))
+
+    async def run(self) -> None:
+        self.started_at = time.time()
+        total_started = time.perf_counter()
+        for name, fn, blocking in self._steps:
+            started = time.perf_counter()
+            error = None
+            try:
+                if blocking:
+                    await anyio.to_thread.run_sync(fn)
+                else:
+                    result = fn()
+                    if hasattr(result, "__await__"):
+                        await result
+            except Exception as e:
+                # A failed step only loses its head start; serving can proceed
+                error = f"{type(e).__name__}: {e}"
+                logger.warning("Warm-up step %s failed: %s", name, error)
+            entry = {"step": name, "seconds": round(time.perf_counter() - started, 4)}
+            if error:
+                entry["error"] = error
+            self.timings.append(entry)
+        self.finished_at = time.time()
+        self.ready = True
+        total = time.perf_counter() - total_started
+        breakdown = ", ".join(f"{t['step']} {t['seconds']:.3f}s" for t in self.timings)
+        if self.import_seconds is not None:
+            breakdown = f"import {self.import_seconds:.3f}s, {breakdown}"
+        logger.info("Warm-up finished in %.3fs (%s)", total, breakdown)
+
+    def mark_ready(self) -> None:
+        """Skip warm-up entirely (for example when disabled by configuration)."""
+        self.ready = True
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming",
+            **({"import_seconds": round(self.import_seconds, 4)} if self.import_seconds is not None else {}),
+            "steps": list(self.timings),
+        }
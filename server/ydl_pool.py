@@ -0,0 +1,226 @@
+"""Pool of warm, reusable ``YoutubeDL`` instances.
+
+Building a ``YoutubeDL`` sets up its output, extractor registry and request
+handlers; the first extraction then instantiates and initializes extractors.
+Reusing an instance keeps all of that. Instances are keyed by a fingerprint of
+their options (user agent, proxy, headers, ...), checked out for exactly one
+extraction at a time and reset before the next one. The format selector
+varies with every request, so it is left out of the fingerprint and applied
+to the instance on checkout instead.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .cookie_jar import SharedCookies, shared_cookies_for, ydl_with_shared_cookies
+
+logger = logging.getLogger(__name__)
+
+
+# Options set on the instance for every checkout instead of being part of the key
+_PER_CALL_OPTS = ("format",)
+
+
+def options_fingerprint(ydl_opts: dict) -> str:
+    keyed = {k: v for k, v in ydl_opts.items() if k not in _PER_CALL_OPTS}
+    encoded = json.dumps(keyed, sort_keys=True, default=repr, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class _Pooled:
+    __slots__ = ("ydl", "uses", "idle_since")
+
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.uses = 0
+        self.idle_since = 0.0
+
+
+def _reset_ydl(ydl, ydl_opts: dict, shared: Optional[SharedCookies]) -> None:
+    """Return a used instance to the state of a freshly built one."""
+    ydl._download_retcode = 0
+    ydl._num_downloads = 0
+    ydl._num_videos = 0
+    ydl._playlist_level = 0
+    ydl._playlist_urls = set()
+    ydl._printed_messages = set()
+    ydl._first_webpage_request = True
+    # Callers may swap the logger for one extraction (see _run_extraction)
+    _set_param(ydl, "logger", ydl_opts.get("logger"))
+    # Compiled up front like YoutubeDL.__init__ does, so a bad selector fails here
+    fmt = ydl_opts.get("format")
+    _set_param(ydl, "format", fmt)
+    ydl.format_selector = fmt if fmt in (None, "-") or callable(fmt) else ydl.build_format_selector(fmt)
+    # Refill the same jar object: request handlers hold a reference to it
+    jar = ydl.cookiejar
+    jar.clear()
+    cookiefile = ydl_opts.get("cookiefile")
+    if cookiefile:
+        snapshot = (shared or shared_cookies_for(cookiefile)).current()
+        if snapshot is not None and snapshot.path == cookiefile:
+            for c in snapshot.jar:
+                jar.set_cookie(copy.copy(c))
+
+
+def _set_param(ydl, name: str, value) -> None:
+    if value is None:
+        ydl.params.pop(name, None)
+    else:
+        ydl.params[name] = value
+
+
+def _close_quietly(ydl) -> None:
+    try:
+        ydl.close()
+    except Exception:
+        pass
+
+
+class YoutubeDLPool:
+    """Idle ``YoutubeDL`` instances per options fingerprint.
+
+    At most ``max_idle_per_key`` instances are kept per fingerprint and
+    ``max_idle`` overall (least recently used fingerprints go first). An
+    instance is retired after ``max_uses`` extractions, after ``max_idle_seconds``
+    unused, or when an extraction with it raised.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[dict], object],
+        shared_cookies: Optional[SharedCookies] = None,
+        max_idle_per_key: int = 2,
+        max_idle: int = 16,
+        max_uses: int = 50,
+        max_idle_seconds: float = 600.0,
+    ):
+        self._factory = factory
+        self._shared_cookies = shared_cookies
+        self.max_idle_per_key = max(0, int(max_idle_per_key))
+        self.max_idle = max(0, int(max_idle))
+        self.max_uses = max(1, int(max_uses))
+        self.max_idle_seconds = float(max_idle_seconds)
+        self._idle: "OrderedDict[str, List[_Pooled]]" = OrderedDict()
+        self._idle_count = 0
+        self._build_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.retired = 0
+        self.build_seconds_total = 0.0
+        self.saved_seconds = 0.0
+
+    def _take(self, key: str) -> Optional[_Pooled]:
+        now = time.monotonic()
+        stale: List[_Pooled] = []
+        taken = None
+        with self._lock:
+            bucket = self._idle.get(key)
+            while bucket:
+                item = bucket.pop()
+                self._idle_count -= 1
+                if now - item.idle_since > self.max_idle_seconds:
+                    stale.append(item)
+                    continue
+                taken = item
+                break
+            if bucket is not None:
+                if bucket:
+                    self._idle.move_to_end(key)
+                else:
+                    del self._idle[key]
+            self.retired += len(stale)
+        for item in stale:
+            _close_quietly(item.ydl)
+        return taken
+
+    def _give_back(self, key: str, item: _Pooled) -> None:
+        evicted: List[_Pooled] = []
+        with self._lock:
+            item.idle_since = time.monotonic()
+            bucket = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(bucket) >= self.max_idle_per_key:
+                evicted.append(item)
+            else:
+                bucket.append(item)
+                self._idle_count += 1
+            while self._idle_count > self.max_idle and self._idle:
+                oldest_key = next(iter(self._idle))
+                oldest = self._idle[oldest_key]
+                evicted.append(oldest.pop(0))
+                self._idle_count -= 1
+                if not oldest:
+                    del self._idle[oldest_key]
+            self.retired += len(evicted)
+        for old in evicted:
+            _close_quietly(old.ydl)
+
+    @contextmanager
+    def checkout(self, ydl_opts: dict) -> Iterator[object]:
+        """Yield a ready ``YoutubeDL`` for ``ydl_opts``, reusing a warm one when possible."""
+        key = options_fingerprint(ydl_opts)
+        item = self._take(key)
+        if item is not None:
+            try:
+                _reset_ydl(item.ydl, ydl_opts, self._shared_cookies)
+            except Exception:
+                with self._lock:
+                    self.retired += 1
+                _close_quietly(item.ydl)
+                raise
+            with self._lock:
+                self.hits += 1
+                self.saved_seconds += self._build_seconds.get(key, 0.0)
+        else:
+            started = time.perf_counter()
+            item = _Pooled(ydl_with_shared_cookies(self._factory, ydl_opts, self._shared_cookies))
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.misses += 1
+                self.build_seconds_total += elapsed
+                previous = self._build_seconds.get(key)
+                self._build_seconds[key] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+                if len(self._build_seconds) > 4 * max(1, self.max_idle):
+                    self._build_seconds.pop(next(iter(self._build_seconds)))
+
+        ok = False
+        try:
+            yield item.ydl
+            ok = True
+        finally:
+            item.uses += 1
+            if ok and item.uses < self.max_uses and self.max_idle_per_key and self.max_idle:
+                self._give_back(key, item)
+            else:
+                with self._lock:
+                    self.retired += 1
+                _close_quietly(item.ydl)
+
+    def clear(self) -> None:
+        with self._lock:
+            buckets, self._idle = list(self._idle.values()), OrderedDict()
+            self._idle_count = 0
+        for bucket in buckets:
+            for item in bucket:
+                _close_quietly(item.ydl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            builds = self.misses
+            return {
+                "idle": self._idle_count,
+                "fingerprints": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "retired": self.retired,
+                "avg_build_seconds": round(self.build_seconds_total / builds, 6) if builds else None,
+                "build_seconds_saved": round(self.saved_seconds, 6),
+            }
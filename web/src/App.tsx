@@ -30,6 +30,7 @@ export type Format = {
   direct_url?: string
   is_audio_only: boolean
   protocol?: string
+  stream_token?: string | null
 }
 
 type ExtractResponse = {
@@ -43,11 +44,37 @@ type ExtractResponse = {
   subtitles?: { lang: string, ext?: string | null, url?: string | null, auto?: boolean }[]
 }
 
-async function extract(url: string, signal?: AbortSignal): Promise<ExtractResponse> {
+function newJobId(): string {
+  try {
+    return crypto.randomUUID()
+  } catch {
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+  }
+}
+
+// Follows /api/progress/{jobId}; returns a function that stops listening
+function followProgress(jobId: string, onEvent: (event: { type: string, [key: string]: any }) => void): () => void {
+  if (typeof EventSource === 'undefined') return () => {}
+  const source = new EventSource(`/api/progress/${encodeURIComponent(jobId)}`)
+  const handle = (e: MessageEvent) => {
+    try {
+      const event = JSON.parse(e.data)
+      onEvent(event)
+      if (event?.final) source.close()
+    } catch {}
+  }
+  for (const type of ['extract', 'transcode', 'stream', 'done', 'error']) {
+    source.addEventListener(type, handle as EventListener)
+  }
+  source.onerror = () => source.close()
+  return () => source.close()
+}
+
+async function extract(url: string, signal?: AbortSignal, jobId?: string): Promise<ExtractResponse> {
   const res = await fetch('/api/extract', {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ url }),
+    body: JSON.stringify(jobId ? { url, job_id: jobId } : { url }),
     signal,
   })
   if (!res.ok) {
@@ -97,6 +124,7 @@ export default function App() {
   const [active, setActive] = useState(PLATFORMS[0].key)
   const [url, setUrl] = useState('')
   const [loading, setLoading] = useState(false)
+  const [phase, setPhase] = useState<string | null>(null)
   const [error, setError] = useState<string | null>(null)
   const [data, setData] = useState<ExtractResponse | null>(null)
   const [lastSource, setLastSource] = useState<string | null>(null)
@@ -204,6 +232,8 @@ export default function App() {
       return
     }
     setLoading(true)
+    setPhase(null)
+    let stopProgress = () => {}
     try {
       const normalized = normalizeInputUrl(url)
       if (!normalized) {
@@ -223,7 +253,11 @@ export default function App() {
       aborter?.abort()
       const controller = new AbortController()
       setAborter(controller)
-      const res = await extract(src, controller.signal)
+      const jobId = newJobId()
+      stopProgress = followProgress(jobId, (event) => {
+        if (event.type === 'extract' && event.message) setPhase(String(event.message))
+      })
+      const res = await extract(src, controller.signal, jobId)
       setLastSource(src)
       setData(res)
       // Save to history
@@ -239,6 +273,8 @@ export default function App() {
       }
       setError(err?.message ?? 'Failed to extract')
     } finally {
+      stopProgress()
+      setPhase(null)
       setLoading(false)
       setAborter(null)
     }
@@ -270,6 +306,10 @@ export default function App() {
     const params = new URLSearchParams()
     params.set('source', src)
     params.set('format_id', String(pick.format_id))
+    if (pick.stream_token) {
+      params.set('token', pick.stream_token)
+      return `/api/stream?${params.toString()}`
+    }
     return `/api/download?${params.toString()}`
   }, [lastSource, recommended, filteredVideos, filteredAudios])
 
@@ -449,7 +489,7 @@ export default function App() {
                     aria-busy={loading}
                     disabled={loading}
                   >
-                    {loading ? (<><Loader2 className="h-4 w-4 animate-spin" aria-hidden="true"/> Analyzing...</>) : (<><Sparkles className="h-4 w-4" aria-hidden="true"/> Analyze</>)}
+                    {loading ? (<><Loader2 className="h-4 w-4 animate-spin" aria-hidden="true"/> <span className="max-w-[14rem] truncate" title={phase ?? undefined}>{phase ?? 'Analyzing...'}</span></>) : (<><Sparkles className="h-4 w-4" aria-hidden="true"/> Analyze</>)}
                   </Button>
                 </div>
               </div>
@@ -847,10 +887,15 @@ export function FormatRow({ format, source }: { format: Format, source: string |
     if (source && format.format_id) {
       urlParams.set('source', source)
       urlParams.set('format_id', String(format.format_id))
+      // Token links skip re-extraction; source/format_id are the fallback once it expires
+      if (format.stream_token) {
+        urlParams.set('token', format.stream_token)
+        return `/api/stream?${urlParams.toString()}`
+      }
       return `/api/download?${urlParams.toString()}`
     }
     return format.direct_url ?? undefined
-  }, [source, format.format_id, format.direct_url])
+  }, [source, format.format_id, format.direct_url, format.stream_token])
 
   const [copyStatus, setCopyStatus] = React.useState<'idle' | 'success' | 'error'>('idle')
   const copyTimeoutRef = React.useRef<number | null>(null)